@@ -2,6 +2,8 @@ from flask import Flask, render_template, request, jsonify
 from flask_cors import CORS
 
 import os
+import io
+import csv
 import json
 from datetime import datetime
 from supabase import create_client, Client
@@ -10,11 +12,15 @@ from datetime import date as _date
 from datetime import datetime, timezone
 from datetime import datetime, timedelta
 import base64, hmac, hashlib, time
+import threading
+from collections import OrderedDict
 from urllib.parse import urlencode
 from flask import make_response
 
 import psycopg2
-from pdi_module import register_pdi_routes
+from pdi_module import invalidate_pdi_eligibility, register_pdi_routes
+from query_instrumentation import ContextThreadPoolExecutor, InstrumentedConnection, install_query_instrumentation
+from response_layer import install_response_layer
 
 
 DEMO_WORKFLOW_MARKER = 'HRK_DEMO_WORKFLOW_RESET_V1'
@@ -167,6 +173,11 @@ ADMIN_WINDOW_CODE = os.getenv('ADMIN_WINDOW_CODE', '').strip()  # usado em PUTs
 
 supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
 
+# Instrumentação de consultas e camada de resposta (JSON rápido + gzip/br).
+# Registradas antes dos demais hooks: rodam por último no after_request.
+install_query_instrumentation(app, supabase)
+install_response_layer(app, lambda payload: _require_rh_code(payload))
+
 
 from datetime import datetime, timezone, date
 
@@ -234,22 +245,29 @@ def _get_actor():
         return "admin"
 
 
-def _save_employee_history(employee_id: int, data_snapshot: dict, action: str, round_code: str | None = None, competence: _date | None = None):
-    """
-    Grava um snapshot no employee_history.
-    Se competence for informada, usa ela; senão tenta ler do request (fallback: mês atual).
-    """
-    comp = competence if competence is not None else _competence_from_request()
-    payload = {
+def _employee_history_payload(employee_id: int, data_snapshot: dict, action: str, round_code: str | None, comp: _date, actor: str):
+    """Linha de employee_history (usada no cadastro individual e na importação em lote)."""
+    return {
         "employee_id": employee_id,
-        "competence": comp.isoformat(),        
+        "competence": comp.isoformat(),
         "round_code": round_code,
         "action": action,
         "changed_at": datetime.now(timezone.utc).isoformat(),
-        "changed_by": _get_actor(),
+        "changed_by": actor,
         "data": data_snapshot
     }
+
+
+def _save_employee_history(employee_id: int, data_snapshot: dict, action: str, round_code: str | None = None, competence: _date | None = None):
+    """
+    Grava um snapshot no employee_history.
+    Se competence for informada, usa ela; senão tenta ler do request (fallback: mês atual).
+    """
+    comp = competence if competence is not None else _competence_from_request()
+    payload = _employee_history_payload(employee_id, data_snapshot, action, round_code, comp, _get_actor())
     supabase.table("employee_history").insert(payload).execute()
+    # competência fechada só recebe escrita com admin_code: o histórico cacheado deixa de valer
+    _immutable_cache_purge(f"competence:{comp.isoformat()}")
 
 
 
@@ -305,9 +323,63 @@ def _month_start(d: _date) -> _date:
     """Normaliza para o 1º dia do mês."""
     return _date(d.year, d.month, 1)
 
+# ---------- Cache do status de travamento ----------
+# Status só muda por /api/competence/close, /finalize e /reopen, que limpam a
+# competência afetada. O TTL cobre os demais workers do gunicorn.
+COMPETENCE_LOCK_CACHE_TTL_SECONDS = 60
+COMPETENCE_CONTEXT_LEVELS = ["cliente", "holding", "empresa", "filial"]
+_COMPETENCE_LOCK_CACHE = {}
+_COMPETENCE_LOCK_CACHE_LOCK = threading.Lock()
+
+
+def _competence_lock_key(comp: _date, nivel_contexto: str, ctx: dict):
+    """Chave (competência, nível, ids até o nível). Nível vazio = trava global antiga."""
+    if nivel_contexto not in COMPETENCE_CONTEXT_LEVELS:
+        return (comp.isoformat(), nivel_contexto or "global")
+    depth = COMPETENCE_CONTEXT_LEVELS.index(nivel_contexto) + 1
+    ids = tuple(str(ctx.get(f"{level}_id") or "").strip() for level in COMPETENCE_CONTEXT_LEVELS[:depth])
+    return (comp.isoformat(), nivel_contexto) + ids
+
+
+def _competence_lock_ancestor_keys(comp: _date, nivel_contexto: str, ctx: dict):
+    """Chaves dos níveis acima (cliente → holding → empresa) presentes no contexto."""
+    if nivel_contexto not in COMPETENCE_CONTEXT_LEVELS:
+        return []
+    keys = []
+    for level in COMPETENCE_CONTEXT_LEVELS[:COMPETENCE_CONTEXT_LEVELS.index(nivel_contexto)]:
+        if level != "cliente" and not str(ctx.get(f"{level}_id") or "").strip():
+            continue
+        keys.append(_competence_lock_key(comp, level, ctx))
+    return keys
+
+
+def _competence_lock_cache_get(key):
+    with _COMPETENCE_LOCK_CACHE_LOCK:
+        entry = _COMPETENCE_LOCK_CACHE.get(key)
+    if not entry or time.monotonic() - entry[1] > COMPETENCE_LOCK_CACHE_TTL_SECONDS:
+        return None
+    return entry[0]
+
+
+def _competence_lock_cache_set(key, closed: bool):
+    with _COMPETENCE_LOCK_CACHE_LOCK:
+        _COMPETENCE_LOCK_CACHE[key] = (closed, time.monotonic())
+
+
+def _invalidate_competence_lock_cache(*comps: _date):
+    comp_isos = {_month_start(c).isoformat() for c in comps if c}
+    with _COMPETENCE_LOCK_CACHE_LOCK:
+        for key in [k for k in _COMPETENCE_LOCK_CACHE if k[0] in comp_isos]:
+            _COMPETENCE_LOCK_CACHE.pop(key, None)
+
+
 def _is_competence_closed(comp: _date) -> bool:
     """Retorna True se a competência estiver CLOSED."""
     comp = _month_start(comp)
+    key = _competence_lock_key(comp, "", {})
+    cached = _competence_lock_cache_get(key)
+    if cached is not None:
+        return cached
     try:
         r = (
             supabase.table("competence_locks")
@@ -317,16 +389,18 @@ def _is_competence_closed(comp: _date) -> bool:
             .execute()
         )
         row = r.data
-        return bool(row and (row.get("status") == "CLOSED"))
+        closed = bool(row and (row.get("status") == "CLOSED"))
+        _competence_lock_cache_set(key, closed)
+        return closed
     except Exception:
         # se der erro de consulta, por segurança NÃO bloqueia aqui
         # (vamos enxergar no log e corrigir depois)
         return False
 
-def _assert_competence_open_or_admin(comp: _date):
+def _assert_competence_open_or_admin(comp: _date, admin_code: str = ""):
     """
     Bloqueia se competência estiver fechada.
-    Exceção: se veio um admin_code válido no request (header ou query/body).
+    Exceção: se veio um admin_code válido (argumento, ou no request: header ou query/body).
     """
     comp = _month_start(comp)
 
@@ -335,11 +409,12 @@ def _assert_competence_open_or_admin(comp: _date):
         return
 
     # 2) Se estiver fechada, só libera com admin_code
-    admin_code = ""
-    try:
-        admin_code = (request.headers.get("X-Admin-Code") or "").strip()
-    except Exception:
-        pass
+    admin_code = str(admin_code or "").strip()
+    if not admin_code:
+        try:
+            admin_code = (request.headers.get("X-Admin-Code") or "").strip()
+        except Exception:
+            pass
 
     if not admin_code:
         # tenta querystring
@@ -487,6 +562,16 @@ def _is_competence_context_closed(comp: _date, ctx: dict) -> bool:
     if not nivel_contexto or not cliente_id:
         return False
 
+    # Um nível acima já fechado (ex.: holding) implica empresas/filiais fechadas.
+    for ancestor_key in _competence_lock_ancestor_keys(comp, nivel_contexto, ctx):
+        if _competence_lock_cache_get(ancestor_key):
+            return True
+
+    key = _competence_lock_key(comp, nivel_contexto, ctx)
+    cached = _competence_lock_cache_get(key)
+    if cached is not None:
+        return cached
+
     try:
         r = supabase.rpc("get_competence_context_status", {
             "p_competence": comp.isoformat(),
@@ -502,10 +587,12 @@ def _is_competence_context_closed(comp: _date, ctx: dict) -> bool:
         if isinstance(data, list) and len(data) == 1:
             data = data[0]
 
+        closed = False
         if isinstance(data, dict):
-            return str(data.get("status") or "OPEN").upper() == "CLOSED"
+            closed = str(data.get("status") or "OPEN").upper() == "CLOSED"
 
-        return False
+        _competence_lock_cache_set(key, closed)
+        return closed
 
     except Exception as e:
         print("[_is_competence_context_closed] erro:", e)
@@ -522,7 +609,7 @@ def _assert_competence_context_open_or_admin(comp: _date, body: dict):
 
     # Se não veio contexto, mantém compatibilidade com a regra antiga.
     if not ctx.get("nivel_contexto") or not ctx.get("cliente_id"):
-        _assert_competence_open_or_admin(comp)
+        _assert_competence_open_or_admin(comp, (body or {}).get("admin_code"))
         return
 
     if not _is_competence_context_closed(comp, ctx):
@@ -546,6 +633,215 @@ def _assert_competence_context_open_or_admin(comp: _date, body: dict):
 
 
 
+# ===================== Cache de resultados imutáveis =====================
+# Avaliações com ciência do profissional e competências CLOSED não mudam mais.
+# As leituras dessas telas ficam em memória (LRU) e, se IMMUTABLE_CACHE_DIR
+# estiver configurado, também em disco. Só são descartadas por reabertura de
+# competência, por gravação no histórico da competência (admin_code) ou por
+# movimentação do workflow da avaliação.
+# Disco: <dir>/<key>.json + índice <dir>/tags/<sha(tag)>/<key> (purge sem ler
+# as entradas), limitado a IMMUTABLE_CACHE_DISK_MAX_ITEMS (sai o mais antigo).
+# Com disco, um hit de memória só vale se o arquivo ainda existe: o purge de
+# outro worker apaga o arquivo. Sem disco, o cache é por processo.
+IMMUTABLE_CACHE_DIR = os.getenv('IMMUTABLE_CACHE_DIR', '').strip()
+IMMUTABLE_CACHE_MAX_ITEMS = int(os.getenv('IMMUTABLE_CACHE_MAX_ITEMS', '2000'))
+IMMUTABLE_CACHE_DISK_MAX_ITEMS = int(os.getenv('IMMUTABLE_CACHE_DISK_MAX_ITEMS', '10000'))
+IMMUTABLE_CACHE_DISK_SWEEP_EVERY = 100  # gravações entre duas verificações do limite do disco
+FINAL_WORKFLOW_STATUSES = {'ciencia_do_profissional'}
+_IMMUTABLE_CACHE = OrderedDict()
+_IMMUTABLE_CACHE_TAGS = {}
+_IMMUTABLE_CACHE_LOCK = threading.Lock()
+_IMMUTABLE_CACHE_DISK_WRITES = 0
+
+
+def _immutable_cache_key(namespace: str, params: dict) -> str:
+    raw = json.dumps({'ns': namespace, 'params': params}, sort_keys=True, default=str, separators=(',', ':'))
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def _immutable_cache_path(key: str):
+    return os.path.join(IMMUTABLE_CACHE_DIR, f'{key}.json') if IMMUTABLE_CACHE_DIR else None
+
+
+def _immutable_cache_tag_dir(tag: str) -> str:
+    return os.path.join(IMMUTABLE_CACHE_DIR, 'tags', hashlib.sha256(tag.encode('utf-8')).hexdigest())
+
+
+def _immutable_cache_forget(key: str):
+    with _IMMUTABLE_CACHE_LOCK:
+        entry = _IMMUTABLE_CACHE.pop(key, None)
+        for tag in (entry or {}).get('tags') or []:
+            _IMMUTABLE_CACHE_TAGS.get(tag, set()).discard(key)
+
+
+def _immutable_cache_get(namespace: str, params: dict):
+    key = _immutable_cache_key(namespace, params)
+    path = _immutable_cache_path(key)
+    with _IMMUTABLE_CACHE_LOCK:
+        entry = _IMMUTABLE_CACHE.get(key)
+        if entry is not None:
+            _IMMUTABLE_CACHE.move_to_end(key)
+
+    if entry is not None:
+        if not path or os.path.exists(path):
+            return entry['value']
+        # purgado (ou despejado) por outro worker
+        _immutable_cache_forget(key)
+        return None
+
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as fh:
+            entry = json.load(fh)
+    except Exception as e:
+        print('[immutable-cache] erro leitura disco:', e)
+        return None
+    _immutable_cache_remember(key, entry)
+    return entry.get('value')
+
+
+def _immutable_cache_remember(key: str, entry: dict):
+    with _IMMUTABLE_CACHE_LOCK:
+        _IMMUTABLE_CACHE[key] = entry
+        _IMMUTABLE_CACHE.move_to_end(key)
+        for tag in entry.get('tags') or []:
+            _IMMUTABLE_CACHE_TAGS.setdefault(tag, set()).add(key)
+        while len(_IMMUTABLE_CACHE) > IMMUTABLE_CACHE_MAX_ITEMS:
+            old_key, old_entry = _IMMUTABLE_CACHE.popitem(last=False)
+            for tag in old_entry.get('tags') or []:
+                _IMMUTABLE_CACHE_TAGS.get(tag, set()).discard(old_key)
+
+
+def _immutable_cache_remove_file(key: str, tags=None):
+    """Apaga a entrada do disco e suas marcas no índice de tags."""
+    path = _immutable_cache_path(key)
+    if tags is None:
+        try:
+            with open(path, 'r', encoding='utf-8') as fh:
+                tags = json.load(fh).get('tags') or []
+        except Exception:
+            tags = []
+    for candidate in [path] + [os.path.join(_immutable_cache_tag_dir(tag), key) for tag in tags]:
+        try:
+            os.remove(candidate)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print('[immutable-cache] erro remoção disco:', e)
+
+
+def _immutable_cache_sweep_disk():
+    """Mantém o disco em IMMUTABLE_CACHE_DISK_MAX_ITEMS, removendo os mais antigos."""
+    try:
+        entries = [
+            (entry.stat().st_mtime, entry.name[:-5])
+            for entry in os.scandir(IMMUTABLE_CACHE_DIR)
+            if entry.is_file() and entry.name.endswith('.json')
+        ]
+    except Exception as e:
+        print('[immutable-cache] erro varredura disco:', e)
+        return
+    excess = len(entries) - IMMUTABLE_CACHE_DISK_MAX_ITEMS
+    if excess <= 0:
+        return
+    entries.sort()
+    for _, key in entries[:excess]:
+        _immutable_cache_remove_file(key)
+
+
+def _immutable_cache_set(namespace: str, params: dict, value, tags: list):
+    global _IMMUTABLE_CACHE_DISK_WRITES
+    key = _immutable_cache_key(namespace, params)
+    entry = {'namespace': namespace, 'tags': list(tags), 'value': value}
+    _immutable_cache_remember(key, entry)
+
+    path = _immutable_cache_path(key)
+    if not path:
+        return
+    try:
+        # índice antes da entrada: um purge concorrente nunca deixa entrada sem marca
+        for tag in entry['tags']:
+            tag_dir = _immutable_cache_tag_dir(tag)
+            os.makedirs(tag_dir, exist_ok=True)
+            open(os.path.join(tag_dir, key), 'a').close()
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as fh:
+            json.dump(entry, fh, default=str)
+        os.replace(tmp_path, path)
+    except Exception as e:
+        print('[immutable-cache] erro gravação disco:', e)
+        return
+
+    with _IMMUTABLE_CACHE_LOCK:
+        _IMMUTABLE_CACHE_DISK_WRITES += 1
+        sweep = _IMMUTABLE_CACHE_DISK_WRITES % IMMUTABLE_CACHE_DISK_SWEEP_EVERY == 0
+    if sweep:
+        _immutable_cache_sweep_disk()
+
+
+def _immutable_cache_purge(*tags: str):
+    """Remove tudo que carrega alguma das tags (memória e disco, via índice de tags)."""
+    tags = {t for t in tags if t}
+    if not tags:
+        return
+    with _IMMUTABLE_CACHE_LOCK:
+        keys = set()
+        for tag in tags:
+            keys |= _IMMUTABLE_CACHE_TAGS.pop(tag, set())
+        for key in keys:
+            _IMMUTABLE_CACHE.pop(key, None)
+
+    if not IMMUTABLE_CACHE_DIR:
+        return
+    for tag in tags:
+        tag_dir = _immutable_cache_tag_dir(tag)
+        try:
+            disk_keys = os.listdir(tag_dir)
+        except FileNotFoundError:
+            continue
+        except Exception as e:
+            print('[immutable-cache] erro purge disco:', e)
+            continue
+        for key in disk_keys:
+            _immutable_cache_remove_file(key)
+
+
+def _is_final_workflow(workflow_row) -> bool:
+    return bool(
+        workflow_row
+        and workflow_row.get('status_workflow') in FINAL_WORKFLOW_STATUSES
+        and workflow_row.get('employee_acknowledged_at')
+    )
+
+
+# Qualquer transição de workflow (inclusive devoluções) invalida a avaliação.
+WORKFLOW_MUTATION_ENDPOINTS = {
+    'api_workflow_submit_manager',
+    'api_workflow_committee_approve',
+    'api_workflow_committee_return',
+    'api_workflow_committee_finish_calibration',
+    'api_workflow_resubmit_manager',
+    'api_workflow_manager_feedback',
+    'api_workflow_employee_acknowledge',
+}
+
+
+@app.after_request
+def purge_immutable_cache_after_workflow_change(resp):
+    try:
+        if request.method == 'POST' and request.endpoint in WORKFLOW_MUTATION_ENDPOINTS and resp.status_code < 400:
+            _immutable_cache_purge(f"evaluation:{(request.view_args or {}).get('evaluation_id')}")
+            invalidate_pdi_eligibility()
+        elif request.method == 'POST' and request.endpoint == 'api_reset_workflow_demo_kit' and resp.status_code < 400:
+            _immutable_cache_purge('evaluation:*')
+            invalidate_pdi_eligibility()
+            _invalidate_rounds_catalog()
+    except Exception as e:
+        print('[immutable-cache] erro purge workflow:', e)
+    return resp
+
+
 # ===== CORS simples sem dependências =====
 ALLOWED_ORIGINS = os.getenv('ALLOWED_ORIGINS', 'https://gestor.thehrkey.tech').split(',')
 
@@ -683,6 +979,172 @@ def _turnover_rpc_context():
     }
 
 
+def _turnover_month(value):
+    """Aceita YYYY-MM ou YYYY-MM-DD e devolve o 1º dia do mês (ou None)."""
+    value = str(value or '').strip()
+    if len(value) == 7:
+        value = f'{value}-01'
+    try:
+        return _month_start(datetime.fromisoformat(value[:10]).date())
+    except (ValueError, TypeError):
+        return None
+
+
+# Série mensal de turnover particionada por mês. Cada combinação
+# (RPC, contexto, filtros de dimensão) guarda as linhas por competência:
+# meses até a última competência CLOSED são imutáveis; os demais expiram
+# em TURNOVER_OPEN_MONTHS_TTL_SECONDS. Trocar o período do dashboard ou
+# recalcular o YTD não custa RPC quando os meses já estão carregados.
+# As séries ficam num LRU de TURNOVER_SERIES_MAX_KEYS combinações.
+TURNOVER_OPEN_MONTHS_TTL_SECONDS = 300
+TURNOVER_SERIES_MAX_KEYS = 256
+# Coluna de mês esperada nas linhas das RPCs hrkey_turnover_* (a definição
+# das RPCs não está versionada aqui). RPC que devolve linhas sem mês legível
+# não é particionada: a resposta volta direto da RPC, sem cache.
+TURNOVER_MONTH_FIELD = 'month'
+_TURNOVER_SERIES = OrderedDict()
+_TURNOVER_UNPARTITIONED_RPCS = set()
+_TURNOVER_SERIES_LOCK = threading.Lock()
+
+
+def _turnover_months_between(start: _date, end: _date):
+    months = []
+    cur = start
+    while cur <= end:
+        months.append(cur)
+        cur = _next_month(cur)
+    return months
+
+
+def _turnover_row_month(row):
+    return _turnover_month(row.get(TURNOVER_MONTH_FIELD))
+
+
+def _turnover_closed_months(start: _date, end: _date) -> set:
+    """Competências CLOSED em [start, end], numa consulta só."""
+    try:
+        rows = (
+            supabase.table('competence_locks')
+            .select('competence, status')
+            .gte('competence', start.isoformat())
+            .lte('competence', end.isoformat())
+            .execute()
+        ).data or []
+    except Exception as e:
+        print('[turnover] erro competence_locks:', e)
+        return set()
+    return {
+        _turnover_month(row.get('competence'))
+        for row in rows
+        if row.get('status') == 'CLOSED'
+    }
+
+
+def _invalidate_turnover_series():
+    with _TURNOVER_SERIES_LOCK:
+        _TURNOVER_SERIES.clear()
+
+
+def _turnover_rpc_rows(rpc_name, params):
+    """
+    Linhas da RPC de turnover para [p_start_month, p_end_month].
+    Busca na RPC só o intervalo de meses que falta (ou expirou) e monta
+    a resposta a partir das partições mensais.
+    """
+    start = _turnover_month(params.get('p_start_month'))
+    end = _turnover_month(params.get('p_end_month'))
+    if not start or not end or start > end or rpc_name in _TURNOVER_UNPARTITIONED_RPCS:
+        return supabase.rpc(rpc_name, params).execute().data or []
+
+    series_key = json.dumps(
+        [rpc_name, {k: v for k, v in params.items() if k not in ('p_start_month', 'p_end_month')}],
+        sort_keys=True
+    )
+    months = _turnover_months_between(start, end)
+    now = time.monotonic()
+
+    with _TURNOVER_SERIES_LOCK:
+        series = _TURNOVER_SERIES.setdefault(series_key, {})
+        _TURNOVER_SERIES.move_to_end(series_key)
+        missing = [
+            m for m in months
+            if m not in series
+            or (not series[m]['immutable'] and now - series[m]['loaded_at'] >= TURNOVER_OPEN_MONTHS_TTL_SECONDS)
+        ]
+
+    if missing:
+        fetch_params = dict(params)
+        fetch_params['p_start_month'] = min(missing).isoformat()
+        fetch_params['p_end_month'] = max(missing).isoformat()
+        rows = supabase.rpc(rpc_name, fetch_params).execute().data or []
+
+        by_month = {}
+        for row in rows:
+            month = _turnover_row_month(row)
+            if month is None:
+                print(f'[turnover] {rpc_name} sem coluna {TURNOVER_MONTH_FIELD} legível; série sem cache')
+                with _TURNOVER_SERIES_LOCK:
+                    _TURNOVER_UNPARTITIONED_RPCS.add(rpc_name)
+                    for key in [k for k in _TURNOVER_SERIES if json.loads(k)[0] == rpc_name]:
+                        _TURNOVER_SERIES.pop(key, None)
+                if len(missing) == len(months):
+                    return rows
+                # só parte do intervalo foi buscada: uma leitura do intervalo pedido
+                return supabase.rpc(rpc_name, params).execute().data or []
+            by_month.setdefault(month, []).append(row)
+
+        fetched = _turnover_months_between(min(missing), max(missing))
+        current_month = _month_start(_date.today())
+        closed = _turnover_closed_months(fetched[0], fetched[-1])
+        partitions = {
+            m: {'rows': by_month.get(m, []), 'immutable': m < current_month and m in closed, 'loaded_at': now}
+            for m in fetched
+        }
+        with _TURNOVER_SERIES_LOCK:
+            series = _TURNOVER_SERIES.setdefault(series_key, {})
+            series.update(partitions)
+            _TURNOVER_SERIES.move_to_end(series_key)
+            while len(_TURNOVER_SERIES) > TURNOVER_SERIES_MAX_KEYS:
+                _TURNOVER_SERIES.popitem(last=False)
+
+    out = []
+    for m in months:
+        out.extend((series.get(m) or {}).get('rows') or [])
+    return out
+
+
+def _turnover_number(value):
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _turnover_ytd(rows):
+    """YTD por ano: sum(saidas) / sum(base_calculo), agregado localmente."""
+    by_year = {}
+    for row in rows:
+        month = _turnover_row_month(row)
+        if month is None:
+            continue
+        saidas = _turnover_number(row.get('saidas'))
+        if row.get('base_calculo') is not None:
+            base = _turnover_number(row.get('base_calculo'))
+        else:
+            base = _turnover_number(row.get('ativos_fim_mes')) + saidas
+        acc = by_year.setdefault(month.year, {'year': month.year, 'saidas': 0.0, 'base_calculo': 0.0, 'months': 0})
+        acc['saidas'] += saidas
+        acc['base_calculo'] += base
+        acc['months'] += 1
+
+    out = []
+    for year in sorted(by_year):
+        acc = by_year[year]
+        acc['turnover'] = round(acc['saidas'] / acc['base_calculo'], 6) if acc['base_calculo'] else None
+        out.append(acc)
+    return out
+
+
 @app.route('/api/turnover/monthly', methods=['GET'])
 def api_turnover_monthly():
     try:
@@ -690,7 +1152,7 @@ def api_turnover_monthly():
         params['p_start_month'] = _turnover_arg('start_month')
         params['p_end_month'] = _turnover_arg('end_month')
 
-        rows = supabase.rpc('hrkey_turnover_monthly', params).execute().data or []
+        rows = _turnover_rpc_rows('hrkey_turnover_monthly', params)
         return jsonify({
             'items': rows,
             'count': len(rows),
@@ -706,7 +1168,14 @@ def api_turnover_selection_success():
         params = _turnover_rpc_context()
         params['p_reference_date'] = _turnover_arg('reference_date')
 
-        rows = supabase.rpc('hrkey_selection_success', params).execute().data or []
+        # Data de referência num mês passado e CLOSED: resultado imutável.
+        month = _turnover_month(params['p_reference_date'])
+        cacheable = bool(month and month < _month_start(_date.today()) and _is_competence_closed(month))
+        rows = _immutable_cache_get('turnover_selection_success', params) if cacheable else None
+        if rows is None:
+            rows = supabase.rpc('hrkey_selection_success', params).execute().data or []
+            if cacheable:
+                _immutable_cache_set('turnover_selection_success', params, rows, [f'competence:{month.isoformat()}'])
         return jsonify({
             'items': rows,
             'count': len(rows),
@@ -732,12 +1201,13 @@ def api_turnover_timeseries():
             'p_termination_root_cause': _turnover_arg('termination_root_cause'),
         })
 
-        rows = supabase.rpc('hrkey_turnover_timeseries', params).execute().data or []
+        rows = _turnover_rpc_rows('hrkey_turnover_timeseries', params)
         return jsonify({
             'items': rows,
             'count': len(rows),
             'formula': 'saidas / (ativos_fim_mes + saidas)',
-            'ytd_formula': 'sum(saidas) / sum(base_calculo)'
+            'ytd_formula': 'sum(saidas) / sum(base_calculo)',
+            'ytd': _turnover_ytd(rows)
         }), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -1450,12 +1920,30 @@ def get_employees_by_manager():
     """
     Retorna apenas os funcionários cujo campo manager_name corresponde ao nome passado na querystring.
     Exemplo de uso: GET /api/employees/by-manager?manager_name=Maria%20Silva
+    Com &include_subtree=true devolve todos os níveis abaixo do gestor.
     """
     try:
         manager_name = request.args.get('manager_name', '').strip()
         if not manager_name:
             return jsonify({'error': 'Parâmetro manager_name é obrigatório'}), 400
 
+        if _wants_subtree():
+            hierarchy, manager_id = _org_locate_manager(
+                (request.args.get('cliente_id') or '').strip(), manager_name=manager_name
+            )
+            ids = _org_subtree_ids(hierarchy, manager_id) if manager_id is not None else []
+            rows = []
+            for i in range(0, len(ids), ORG_IN_CHUNK_SIZE):
+                rows.extend(
+                    supabase.table('employees')
+                    .select('*')
+                    .in_('id', ids[i:i + ORG_IN_CHUNK_SIZE])
+                    .execute()
+                    .data or []
+                )
+            position = hierarchy['tin'] if hierarchy else {}
+            return jsonify(sorted(rows, key=lambda row: position.get(row.get('id'), 0)))
+
         # Busca case-insensitive (exato). Se quiser “contém”, troque eq -> ilike e use f'%{manager_name}%'
         r = supabase.table('employees') \
             .select('*') \
@@ -1526,6 +2014,241 @@ def create_employee():
         return jsonify({'error': str(e)}), 500
 
 
+# ===================== Importação em lote de colaboradores =====================
+EMPLOYEE_BULK_BATCH_SIZE = 200
+EMPLOYEE_CONTEXT_KEYS = ["nivel_contexto", "cliente_id", "holding_id", "empresa_id", "filial_id", "contexto_nome"]
+
+
+def _iter_employee_upload_rows(file_storage):
+    """Lê o CSV enviado linha a linha (o werkzeug mantém o upload em disco)."""
+    stream = io.TextIOWrapper(file_storage.stream, encoding="utf-8-sig", newline="")
+    for row in csv.DictReader(stream):
+        yield {
+            str(k).strip(): v.strip()
+            for k, v in row.items()
+            if k and isinstance(v, str) and v.strip() != ""
+        }
+
+
+def _employee_empresa_index(cliente_ids):
+    """
+    Pré-carrega empresa → ids (cliente/holding/empresa/filial) por cliente, no
+    mesmo critério de _hydrate_employee_context_from_existing, em uma leitura.
+    """
+    index = {}
+    cliente_ids = [c for c in set(cliente_ids) if c]
+    if not cliente_ids:
+        return index
+
+    rows = []
+    page_size = 1000
+    offset = 0
+    while True:
+        page = (
+            supabase.table("employees")
+            .select("cliente_id,holding_id,empresa_id,filial_id,holding,company_name,empresa")
+            .in_("cliente_id", cliente_ids)
+            .order("id", desc=False)
+            .range(offset, offset + page_size - 1)
+            .execute()
+        ).data or []
+        rows.extend(page)
+        if len(page) < page_size:
+            break
+        offset += page_size
+    for row in rows:
+        row_empresa = str(row.get("empresa") or row.get("company_name") or "").strip().upper()
+        if not row_empresa or not row.get("empresa_id"):
+            continue
+        cliente_id = str(row.get("cliente_id") or "").strip()
+        holding_id = str(row.get("holding_id") or "").strip()
+        index.setdefault((cliente_id, "", row_empresa), row)
+        if holding_id:
+            index.setdefault((cliente_id, holding_id, row_empresa), row)
+    return index
+
+
+def _hydrate_employee_context_from_index(data: dict, index: dict):
+    cliente_id = str(data.get("cliente_id") or "").strip()
+    holding_id = str(data.get("holding_id") or "").strip()
+    empresa_nome = str(data.get("empresa") or data.get("company_name") or "").strip().upper()
+    if not cliente_id or not empresa_nome or data.get("empresa_id"):
+        return data
+
+    best = index.get((cliente_id, holding_id, empresa_nome))
+    if not best:
+        return data
+    data["cliente_id"] = data.get("cliente_id") or best.get("cliente_id")
+    data["holding_id"] = data.get("holding_id") or best.get("holding_id")
+    data["empresa_id"] = data.get("empresa_id") or best.get("empresa_id")
+    if not data.get("filial_id") and best.get("filial_id"):
+        data["filial_id"] = best.get("filial_id")
+    return data
+
+
+@app.route('/api/employees/bulk', methods=['POST', 'OPTIONS'])
+def bulk_create_employees():
+    """
+    POST /api/employees/bulk?competence=YYYY-MM-01
+
+    Aceita:
+    - JSON: lista de colaboradores, ou {"employees": [...], "admin_code": "...", <contexto>}
+    - multipart/form-data: arquivo CSV em "file" + admin_code/contexto no form
+
+    A trava de competência é verificada uma vez por contexto, o contexto de
+    empresa é completado por um índice pré-carregado, os inserts e o
+    histórico CREATE são gravados em lotes. Retorna um relatório por linha.
+    """
+    if request.method == 'OPTIONS':
+        return ('', 204)
+
+    try:
+        comp = _competence_from_request()
+
+        upload = request.files.get("file")
+        if upload:
+            defaults = request.form.to_dict()
+            rows = _iter_employee_upload_rows(upload)
+        else:
+            body = request.get_json(silent=True)
+            if isinstance(body, list):
+                defaults, rows = {}, body
+            else:
+                defaults = body or {}
+                rows = defaults.get("employees") or []
+            if not isinstance(rows, list) or not rows:
+                return jsonify({"error": "EMPLOYEES_REQUIRED", "message": "Envie a lista de colaboradores ou um CSV em file."}), 400
+
+        admin_code = str(defaults.get("admin_code") or "").strip()
+        shared_ctx = {k: defaults.get(k) for k in EMPLOYEE_CONTEXT_KEYS if defaults.get(k)}
+        batch_size = max(1, min(1000, int(defaults.get("batch_size") or EMPLOYEE_BULK_BATCH_SIZE)))
+        actor = _get_actor()
+
+        report = []
+        lock_by_context = {}
+        empresa_index = {}
+        indexed_clientes = set()
+        pending = []
+
+        def flush(batch):
+            # PostgREST exige as mesmas chaves em todas as linhas de um insert multi-linha.
+            by_columns = {}
+            for p in batch:
+                by_columns.setdefault(tuple(sorted(p["data"])), []).append(p)
+            for pending_rows in by_columns.values():
+                insert_rows(pending_rows)
+
+        def insert_rows(pending_rows):
+            payloads = [p["data"] for p in pending_rows]
+            try:
+                created = supabase.table("employees").insert(payloads).execute().data or []
+            except Exception as e:
+                for p in pending_rows:
+                    report.append({"row": p["row"], "status": "error", "error": str(e)})
+                return
+            if len(created) != len(pending_rows):
+                for p in pending_rows:
+                    report.append({"row": p["row"], "status": "error", "error": "Retorno do Supabase não corresponde ao lote."})
+                return
+
+            # Código gerado só entra no relatório/histórico se o update devolver a linha gravada.
+            coded_by_id = {}
+            for row in created:
+                if not row.get("id") or str(row.get("employee_code") or "").strip():
+                    continue
+                try:
+                    coded = (
+                        supabase.table("employees")
+                        .update({"employee_code": f"EMP-{int(row['id']):06d}"})
+                        .eq("id", row["id"])
+                        .execute()
+                    ).data or []
+                    if coded:
+                        coded_by_id[row["id"]] = coded[0]
+                except Exception as e:
+                    print("[bulk_create_employees] erro employee_code:", e)
+            if coded_by_id:
+                created = [coded_by_id.get(row.get("id"), row) for row in created]
+
+            history = [
+                _employee_history_payload(int(row["id"]), row, "CREATE", p["data"].get("round_code") or None, comp, actor)
+                for p, row in zip(pending_rows, created)
+                if row.get("id")
+            ]
+            try:
+                if history:
+                    supabase.table("employee_history").insert(history).execute()
+                    _immutable_cache_purge(f"competence:{comp.isoformat()}")
+            except Exception as e:
+                print("[bulk_create_employees] erro histórico:", e)
+
+            for p, row in zip(pending_rows, created):
+                entry = {
+                    "row": p["row"],
+                    "status": "created",
+                    "employee_id": row.get("id"),
+                    "employee_code": row.get("employee_code"),
+                    "nome": row.get("nome")
+                }
+                if not str(row.get("employee_code") or "").strip():
+                    entry["warning"] = "employee_code não gerado"
+                report.append(entry)
+
+        for row_number, raw in enumerate(rows, start=1):
+            if not isinstance(raw, dict) or not raw:
+                report.append({"row": row_number, "status": "skipped", "error": "Linha vazia ou inválida."})
+                continue
+            data = {**shared_ctx, **raw}
+            ctx = _extract_competence_context_from_body(data)
+            # admin_code da própria linha vale sobre o do lote
+            row_admin_code = str(raw.get("admin_code") or "").strip() or admin_code
+            lock_key = (tuple(ctx.get(k) for k in EMPLOYEE_CONTEXT_KEYS if k != "contexto_nome"), row_admin_code)
+
+            if lock_key not in lock_by_context:
+                try:
+                    _assert_competence_context_open_or_admin(comp, {**data, "admin_code": row_admin_code})
+                    lock_by_context[lock_key] = None
+                except PermissionError as e:
+                    lock_by_context[lock_key] = str(e)
+            if lock_by_context[lock_key]:
+                report.append({"row": row_number, "status": "locked", "error": lock_by_context[lock_key]})
+                continue
+
+            _remove_context_fields_from_employee_payload(data)
+            data.pop("competence", None)
+            data.pop("admin_code", None)
+            cliente_id = str(data.get("cliente_id") or "").strip()
+            if cliente_id and not data.get("empresa_id") and cliente_id not in indexed_clientes:
+                empresa_index.update(_employee_empresa_index([cliente_id]))
+                indexed_clientes.add(cliente_id)
+            data = _hydrate_employee_context_from_index(data, empresa_index)
+
+            pending.append({"row": row_number, "data": data})
+            if len(pending) >= batch_size:
+                flush(pending)
+                pending = []
+
+        if pending:
+            flush(pending)
+
+        report.sort(key=lambda r: r["row"])
+        counts = {}
+        for r in report:
+            counts[r["status"]] = counts.get(r["status"], 0) + 1
+
+        return jsonify({
+            "competence": comp.isoformat(),
+            "total": len(report),
+            "counts": counts,
+            "results": report
+        }), 201 if counts.get("created") else 200
+
+    except ValueError as e:
+        return jsonify({"error": "INVALID_INPUT", "message": str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
 # ===================== Salary Grades =====================
 @app.route('/api/salary-grades', methods=['GET'])
 def get_salary_grades():
@@ -1545,6 +2268,141 @@ def get_evaluation_criteria():
         return jsonify({'error': str(e)}), 500
 
 
+# ===================== Cache do formulário de avaliação =====================
+# Com política contratual 'unificada', todos os profissionais de um mesmo
+# contexto (cliente/holding/empresa/filial) caem no mesmo modelo ativo; nas
+# políticas separadas (PJ / Sócio / CLT) o modelo depende do profissional.
+# Todos de uma mesma versao_modelo_id recebem as mesmas afirmativas.
+# Resolução em dois níveis:
+#   employee_id -> contexto -> modelo ativo   (cache por contexto se 'unificada',
+#                                              senão por employee_id)
+#   versao_modelo_id -> critérios             (cache por versão)
+# Um gestor abrindo 40 formulários do mesmo contexto faz uma única busca
+# de critérios; o save (create_evaluation) reaproveita o mesmo mapa.
+EVALUATION_FORM_CACHE_TTL_SECONDS = 300
+_EVALUATION_FORM_LOCK = threading.Lock()
+_EMPLOYEE_FORM_CONTEXT = {}   # employee_id -> (ts, ctx_key)
+_CONTEXT_FORM_MODEL = {}      # ctx_key -> (ts, model), só política 'unificada'
+_EMPLOYEE_FORM_MODEL = {}     # employee_id -> (ts, model), políticas separadas
+_VERSION_FORM_CRITERIA = {}   # (ctx_key, versao_modelo_id) -> (ts, rows)
+
+
+def _evaluation_form_cache_get(cache: dict, key):
+    with _EVALUATION_FORM_LOCK:
+        hit = cache.get(key)
+    if hit and (time.monotonic() - hit[0]) < EVALUATION_FORM_CACHE_TTL_SECONDS:
+        return hit[1]
+    return None
+
+
+def _evaluation_form_cache_set(cache: dict, key, value):
+    with _EVALUATION_FORM_LOCK:
+        cache[key] = (time.monotonic(), value)
+
+
+def _invalidate_evaluation_form_cache():
+    """Critérios/modelos/política alterados: descarta modelos (contexto e profissional) e critérios por versão."""
+    with _EVALUATION_FORM_LOCK:
+        _CONTEXT_FORM_MODEL.clear()
+        _EMPLOYEE_FORM_MODEL.clear()
+        _VERSION_FORM_CRITERIA.clear()
+
+
+def _employee_form_context_key(employee_id: int):
+    ctx_key = _evaluation_form_cache_get(_EMPLOYEE_FORM_CONTEXT, employee_id)
+    if ctx_key is not None:
+        return ctx_key
+
+    r = (
+        supabase.table('employees')
+        .select('cliente_id, holding_id, empresa_id, filial_id')
+        .eq('id', employee_id)
+        .limit(1)
+        .execute()
+    )
+    rows = r.data or []
+    if not rows or not rows[0].get('cliente_id'):
+        return None
+
+    row = rows[0]
+    ctx_key = tuple(str(row.get(k) or '') for k in ('cliente_id', 'holding_id', 'empresa_id', 'filial_id'))
+    _evaluation_form_cache_set(_EMPLOYEE_FORM_CONTEXT, employee_id, ctx_key)
+    return ctx_key
+
+
+def _form_model_shared_by_context(ctx_key) -> bool:
+    """Só a política 'unificada' garante o mesmo modelo para todo o contexto."""
+    if ctx_key is None:
+        return False
+    try:
+        ctx = dict(zip(('cliente_id', 'holding_id', 'empresa_id', 'filial_id'), ctx_key))
+        policy = _get_best_contract_policy(ctx) or {}
+    except Exception as e:
+        print('[evaluation-form] erro ao ler política contratual:', e)
+        return False
+    return (policy.get('policy_mode') or 'unificada') == 'unificada'
+
+
+def _get_active_evaluation_model(employee_id: int):
+    """Modelo ativo do profissional (RPC só na primeira vez de cada contexto, ou de cada profissional)."""
+    ctx_key = _employee_form_context_key(employee_id)
+    if _form_model_shared_by_context(ctx_key):
+        cache, cache_key = _CONTEXT_FORM_MODEL, ctx_key
+    else:
+        cache, cache_key = _EMPLOYEE_FORM_MODEL, employee_id
+
+    model = _evaluation_form_cache_get(cache, cache_key)
+    if model is not None:
+        return model
+
+    r_model = supabase.rpc(
+        'get_active_evaluation_model_for_employee',
+        {'p_employee_id': employee_id}
+    ).execute()
+
+    model_rows = r_model.data or []
+    model = model_rows[0] if model_rows else None
+
+    if model:
+        _evaluation_form_cache_set(cache, cache_key, model)
+    return model
+
+
+def _get_active_evaluation_criteria(employee_id: int, model=None):
+    """Linhas da RPC de critérios, reaproveitadas por contexto + versao_modelo_id."""
+    if model is None:
+        model = _get_active_evaluation_model(employee_id)
+
+    # Sem contexto conhecido, o reaproveitamento fica restrito ao próprio profissional.
+    scope = _employee_form_context_key(employee_id) or employee_id
+    version_id = (model or {}).get('versao_modelo_id')
+    if version_id:
+        rows = _evaluation_form_cache_get(_VERSION_FORM_CRITERIA, (scope, str(version_id)))
+        if rows is not None:
+            return rows
+
+    r_criteria = supabase.rpc(
+        'get_active_evaluation_criteria_for_employee',
+        {'p_employee_id': employee_id}
+    ).execute()
+    rows = r_criteria.data or []
+
+    version_id = version_id or (rows[0].get('versao_modelo_id') if rows else None)
+    if rows and version_id:
+        _evaluation_form_cache_set(_VERSION_FORM_CRITERIA, (scope, str(version_id)), rows)
+    return rows
+
+
+def _get_active_criteria_map(employee_id: int) -> dict:
+    """{criterio_id: linha} do modelo ativo, usado no save para rastreabilidade."""
+    criteria_map = {}
+    for row in _get_active_evaluation_criteria(employee_id):
+        cid = row.get('criterio_id')
+        if cid is not None:
+            criteria_map[int(cid)] = row
+    return criteria_map
+
+
 @app.route('/api/evaluation-form/active', methods=['GET'])
 def get_active_evaluation_form():
     try:
@@ -1557,29 +2415,17 @@ def get_active_evaluation_form():
             }), 400
 
         # 1) Descobre qual modelo ativo vale para este funcionário
-        r_model = supabase.rpc(
-            'get_active_evaluation_model_for_employee',
-            {'p_employee_id': employee_id}
-        ).execute()
+        model = _get_active_evaluation_model(employee_id)
 
-        model_rows = r_model.data or []
-
-        if not model_rows:
+        if not model:
             return jsonify({
                 'error': 'NO_ACTIVE_EVALUATION_MODEL',
                 'message': 'Nenhum modelo de avaliação ativo encontrado para o contexto deste profissional.',
                 'employee_id': employee_id
             }), 404
 
-        model = model_rows[0]
-
-        # 2) Busca critérios/afirmativas pela função SQL segura
-        r_criteria = supabase.rpc(
-            'get_active_evaluation_criteria_for_employee',
-            {'p_employee_id': employee_id}
-        ).execute()
-
-        rows = r_criteria.data or []
+        # 2) Busca critérios/afirmativas pela função SQL segura (cache por versão)
+        rows = _get_active_evaluation_criteria(employee_id, model)
 
         if not rows:
             return jsonify({
@@ -1628,6 +2474,7 @@ def create_evaluation_criteria():
     try:
         data = request.get_json()
         r = supabase.table('evaluation_criteria').insert(data).execute()
+        _invalidate_evaluation_form_cache()
         return jsonify(r.data)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -1637,6 +2484,7 @@ def update_evaluation_criteria(criteria_id):
     try:
         data = request.get_json()
         r = supabase.table('evaluation_criteria').update(data).eq('id', criteria_id).execute()
+        _invalidate_evaluation_form_cache()
         return jsonify(r.data)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -2237,6 +3085,9 @@ def api_competence_close():
             if "out_next_competence" in data:
                 data["next_competence"] = data.pop("out_next_competence")
 
+        _invalidate_employee_state(comp)
+        _invalidate_competence_lock_cache(comp, _next_month(comp))
+
         return jsonify(data), 200
 
     except Exception as e:
@@ -2363,6 +3214,9 @@ def api_competence_finalize():
             if "out_next_competence" in data:
                 data["next_competence"] = data.pop("out_next_competence")
 
+        _invalidate_employee_state(comp)
+        _invalidate_competence_lock_cache(comp, _next_month(comp))
+
         return jsonify(data), 200
 
     except Exception as e:
@@ -2477,6 +3331,11 @@ def api_competence_reopen():
             if "out_competence" in data:
                 data["competence"] = data.pop("out_competence")
         
+        _invalidate_employee_state(comp)
+        _invalidate_competence_lock_cache(comp, _next_month(comp))
+        _immutable_cache_purge(f'competence:{comp.isoformat()}')
+        _invalidate_turnover_series()
+
         return jsonify(data), 200
 
     except Exception as e:
@@ -2584,10 +3443,16 @@ def create_evaluation():
         if existing_eval_id and is_update:
             evaluation_id = int(existing_eval_id)
             print(f"DEBUG: Atualizando avaliação existente ID: {evaluation_id}")
+            previous = supabase.table('evaluations').select('round_code,evaluation_year').eq('id', evaluation_id).execute().data or []
             supabase.table('evaluations').update(evaluation_data).eq('id', evaluation_id).execute()
+            if previous:
+                _rounds_catalog_move_evaluation(
+                    (previous[0].get('round_code'), previous[0].get('evaluation_year')),
+                    (evaluation_data.get('round_code'), evaluation_data.get('evaluation_year'))
+                )
         else:
             # Buscar avaliação existente por employee_id + round_code
-            query = supabase.table('evaluations').select('id').eq('employee_id', data['employee_id'])
+            query = supabase.table('evaluations').select('id,round_code,evaluation_year').eq('employee_id', data['employee_id'])
             
             if round_code:
                 query = query.eq('round_code', round_code)
@@ -2602,12 +3467,17 @@ def create_evaluation():
                 evaluation_id = existing_eval.data[0]['id']
                 print(f"DEBUG: Avaliação {evaluation_id} encontrada e atualizada (employee_id={data['employee_id']}, round_code={round_code})")
                 supabase.table('evaluations').update(evaluation_data).eq('id', evaluation_id).execute()
+                _rounds_catalog_move_evaluation(
+                    (existing_eval.data[0].get('round_code'), existing_eval.data[0].get('evaluation_year')),
+                    (evaluation_data.get('round_code'), evaluation_data.get('evaluation_year'))
+                )
             else:
                 # Criar nova avaliação
                 evaluation_response = supabase.table('evaluations').insert(evaluation_data).execute()
                 if not evaluation_response.data:
                     return jsonify({'error': 'Erro ao criar avaliação'}), 500
                 evaluation_id = evaluation_response.data[0]['id']
+                _rounds_catalog_move_evaluation(None, (evaluation_data.get('round_code'), evaluation_data.get('evaluation_year')))
                 print(f"DEBUG: Nova avaliação {evaluation_id} criada (employee_id={data['employee_id']}, round_code={round_code})")
 
         # ✅ CORREÇÃO: Deletar respostas antigas antes de inserir novas (para não acumular)
@@ -2623,15 +3493,7 @@ def create_evaluation():
         criteria_map = {}
 
         try:
-            r_crit = supabase.rpc(
-                'get_active_evaluation_criteria_for_employee',
-                {'p_employee_id': int(data['employee_id'])}
-            ).execute()
-
-            for row in (r_crit.data or []):
-                cid = row.get('criterio_id')
-                if cid is not None:
-                    criteria_map[int(cid)] = row
+            criteria_map = _get_active_criteria_map(int(data['employee_id']))
 
             print(f"DEBUG: criteria_map carregado com {len(criteria_map)} critérios")
 
@@ -2680,11 +3542,12 @@ def create_evaluation():
             print(f"DEBUG: {len(responses)} respostas inseridas para avaliação {evaluation_id}")
             
         # ✅ CORREÇÃO: Deletar apenas as metas desta avaliação específica (não todas do funcionário)
+        deleted_goals = []
         try:
             delete_query = supabase.table('individual_goals').delete().eq('evaluation_id', evaluation_id)
             if round_code:
                 delete_query = delete_query.eq('round_code', round_code)
-            delete_query.execute()
+            deleted_goals = delete_query.execute().data or []
             print(f"DEBUG: Metas antigas deletadas para avaliação {evaluation_id} (employee_id={data['employee_id']}, round_code={round_code})")
         except Exception as e:
             print(f"DEBUG: Erro ao deletar metas antigas: {e}")
@@ -2718,8 +3581,12 @@ def create_evaluation():
                     'rating': int(goal.get('rating', 0)) if goal.get('rating') else None
                 })
             if goals_to_save:
-                supabase.table('individual_goals').insert(goals_to_save).execute()
-                print(f"DEBUG: {len(goals_to_save)} metas inseridas para avaliação {evaluation_id}")    
+                inserted_goals = supabase.table('individual_goals').insert(goals_to_save).execute().data or []
+                print(f"DEBUG: {len(goals_to_save)} metas inseridas para avaliação {evaluation_id}")
+                deleted_goals.extend(inserted_goals)
+
+        # ✅ KRs que dependem dessas metas (okr_links) têm o progresso recalculado
+        _okr_progress_on_individual_goals([g.get('id') for g in deleted_goals])
                         
         try:
             scores = calculate_evaluation_scores(
@@ -2733,6 +3600,9 @@ def create_evaluation():
         except Exception as calc_error:
             print(f"Erro ao calcular scores: {calc_error}")
 
+        _immutable_cache_purge(f'evaluation:{evaluation_id}')
+        invalidate_pdi_eligibility(round_code or None)
+
         return jsonify({'id': evaluation_id, 'evaluation_id': evaluation_id, 'message': 'Avaliação salva com sucesso!'})
 
     except Exception as e:
@@ -2879,22 +3749,17 @@ def get_dimension_weights():
 
             return jsonify(out_old), 200
 
-        # ✅ Descobre o modelo/versão ativos do contexto usando função SQL segura
-        r_model = supabase.rpc(
-            'get_active_evaluation_model_for_context',
-            {
-                'p_cliente_id': cliente_id,
-                'p_holding_id': holding_id or None,
-                'p_empresa_id': empresa_id or None,
-                'p_filial_id': filial_id or None,
-                'p_nivel_contexto': nivel_contexto or None,
-                'p_contexto_nome': contexto_nome or None
-            }
-        ).execute()
-
-        model_rows = r_model.data or []
+        # ✅ Modelo/versão ativos e pesos do contexto (funções SQL seguras, resolvidas via cache)
+        out = _resolve_dimension_weights(
+            cliente_id,
+            holding_id,
+            empresa_id,
+            filial_id,
+            nivel_contexto,
+            contexto_nome
+        )
 
-        if not model_rows:
+        if out is None:
             return jsonify({
                 'error': 'NO_ACTIVE_MODEL_FOR_CONTEXT',
                 'message': 'Nenhum modelo ativo encontrado para o contexto selecionado.',
@@ -2908,49 +3773,6 @@ def get_dimension_weights():
                 }
             }), 404
 
-        modelo_id = model_rows[0].get('modelo_avaliacao_id')
-        versao_id = model_rows[0].get('versao_modelo_id')
-
-        
-        # ✅ Busca pesos contextualizados usando função SQL segura
-        r_weights = supabase.rpc(
-            'get_dimension_weights_for_context',
-            {
-                'p_cliente_id': cliente_id,
-                'p_holding_id': holding_id or None,
-                'p_empresa_id': empresa_id or None,
-                'p_filial_id': filial_id or None,
-                'p_nivel_contexto': nivel_contexto or None,
-                'p_contexto_nome': contexto_nome or None
-            }
-        ).execute()
-
-        rows = r_weights.data or []
-
-        rows = r_weights.data or []
-
-        out = {
-            'institutional': None,
-            'functional': None,
-            'individual': None,
-            'metas': None,
-            'modelo_avaliacao_id': modelo_id,
-            'versao_modelo_id': versao_id
-        }
-
-        for row in rows:
-            dim = str(row.get('dimension') or '').upper()
-            val = row.get('weight')
-
-            if dim == 'INSTITUCIONAL':
-                out['institutional'] = val
-            elif dim == 'FUNCIONAL':
-                out['functional'] = val
-            elif dim == 'INDIVIDUAL':
-                out['individual'] = val
-            elif dim == 'METAS':
-                out['metas'] = val
-
         return jsonify(out), 200
 
     except Exception as e:
@@ -3010,6 +3832,8 @@ def update_dimension_weights():
         ).execute()
 
         rows = r.data or []
+        _invalidate_policy_resolver(cliente_id)
+        _invalidate_evaluation_form_cache()
 
         return jsonify({
             'message': 'Pesos do contexto atualizados com sucesso.',
@@ -3246,6 +4070,7 @@ def update_evaluation_contract_model_weights():
 
         if rows:
             supabase.table('evaluation_contract_model_weights').insert(rows).execute()
+        _invalidate_evaluation_form_cache()
 
         return jsonify({
             'ok': True,
@@ -3287,19 +4112,6 @@ def _contract_policy_context_from_payload(data):
     }
 
 
-def _contract_row_matches_context(row, ctx):
-    for key in ['holding_id', 'empresa_id', 'filial_id']:
-        row_value = _clean_contract_context_value(row.get(key))
-        ctx_value = _clean_contract_context_value(ctx.get(key))
-        if row_value and row_value != ctx_value:
-            return False
-    return True
-
-
-def _contract_context_specificity(row):
-    return sum(1 for key in ['holding_id', 'empresa_id', 'filial_id'] if _clean_contract_context_value(row.get(key)))
-
-
 def _apply_exact_contract_context_filter(query, ctx):
     for key in ['holding_id', 'empresa_id', 'filial_id']:
         value = _clean_contract_context_value(ctx.get(key))
@@ -3310,45 +4122,159 @@ def _apply_exact_contract_context_filter(query, ctx):
     return query
 
 
-def _get_best_contract_policy(ctx):
-    if not ctx.get('cliente_id'):
-        return None
+# ===================== Resolver de políticas por contexto =====================
+# Políticas contratuais, referências (INSS_TETO) e pesos de dimensão mudam
+# só pelos PUTs do painel. Cada cliente é carregado uma vez num índice
+# {(holding_id, empresa_id, filial_id): linha}, com '' para "vale para todos".
+# Resolver um contexto é olhar as 8 generalizações dele (cada nível fixo ou
+# vazio) e ficar com a mais específica, sem varrer as linhas do cliente.
+POLICY_RESOLVER_TTL_SECONDS = 600
+CONTRACT_CONTEXT_LEVELS = ['holding_id', 'empresa_id', 'filial_id']
+_POLICY_RESOLVER = {}
+_POLICY_RESOLVER_LOCK = threading.Lock()
 
-    r = (
+
+def _contract_context_tuple(row):
+    return tuple(_clean_contract_context_value(row.get(k)) or '' for k in CONTRACT_CONTEXT_LEVELS)
+
+
+def _build_context_index(rows):
+    """Mantém, por tupla de contexto, a linha de maior id (mesmo desempate do sort antigo)."""
+    index = {}
+    for row in rows:
+        key = _contract_context_tuple(row)
+        current = index.get(key)
+        if current is None or int(row.get('id') or 0) > int(current.get('id') or 0):
+            index[key] = row
+    return {'by_context': index, 'count': len(rows), 'only': rows[0] if len(rows) == 1 else None}
+
+
+def _resolve_from_context_index(index, ctx):
+    ctx_key = _contract_context_tuple(ctx)
+    best = None
+    best_rank = None
+    for mask in range(1 << len(CONTRACT_CONTEXT_LEVELS)):
+        key = tuple(v if mask & (1 << i) else '' for i, v in enumerate(ctx_key))
+        row = index['by_context'].get(key)
+        if row is None:
+            continue
+        rank = (sum(1 for v in key if v), int(row.get('id') or 0))
+        if best_rank is None or rank > best_rank:
+            best, best_rank = row, rank
+
+    if best is None and not any(ctx_key) and index['count'] == 1:
+        best = index['only']
+    return best
+
+
+def _policy_resolver_for_cliente(cliente_id):
+    now = time.monotonic()
+    with _POLICY_RESOLVER_LOCK:
+        entry = _POLICY_RESOLVER.get(cliente_id)
+        if entry and (now - entry['loaded_at']) < POLICY_RESOLVER_TTL_SECONDS:
+            return entry
+
+    policies = (
         supabase.table('evaluation_contract_policies')
         .select('*')
-        .eq('cliente_id', ctx['cliente_id'])
+        .eq('cliente_id', cliente_id)
         .eq('active', True)
         .execute()
-    )
+    ).data or []
+    inss_refs = (
+        supabase.table('evaluation_reference_values')
+        .select('*')
+        .eq('cliente_id', cliente_id)
+        .eq('reference_key', 'INSS_TETO')
+        .eq('active', True)
+        .execute()
+    ).data or []
 
-    all_rows = r.data or []
-    rows = [row for row in all_rows if _contract_row_matches_context(row, ctx)]
-    if not rows and not any(_clean_contract_context_value(ctx.get(k)) for k in ['holding_id', 'empresa_id', 'filial_id']) and len(all_rows) == 1:
-        rows = all_rows
-    rows.sort(key=lambda row: (_contract_context_specificity(row), int(row.get('id') or 0)), reverse=True)
-    return rows[0] if rows else None
+    entry = {
+        'loaded_at': now,
+        'policies': _build_context_index(policies),
+        'inss': _build_context_index(inss_refs),
+        'weights': {},
+    }
+    with _POLICY_RESOLVER_LOCK:
+        _POLICY_RESOLVER[cliente_id] = entry
+    return entry
 
 
-def _get_best_inss_reference(ctx):
+def _invalidate_policy_resolver(cliente_id=None):
+    with _POLICY_RESOLVER_LOCK:
+        if cliente_id:
+            _POLICY_RESOLVER.pop(cliente_id, None)
+        else:
+            _POLICY_RESOLVER.clear()
+
+
+def _resolve_dimension_weights(cliente_id, holding_id, empresa_id, filial_id, nivel_contexto, contexto_nome):
+    """
+    Modelo ativo + pesos do contexto. A regra de herança fica nas funções SQL
+    (get_active_evaluation_model_for_context / get_dimension_weights_for_context);
+    aqui o resultado resolvido é guardado no índice do cliente.
+    Retorna None quando não há modelo ativo.
+    """
+    entry = _policy_resolver_for_cliente(cliente_id)
+    weights_key = (holding_id, empresa_id, filial_id, nivel_contexto, contexto_nome)
+    with _POLICY_RESOLVER_LOCK:
+        cached = entry['weights'].get(weights_key)
+    if cached is not None:
+        return dict(cached)
+
+    rpc_params = {
+        'p_cliente_id': cliente_id,
+        'p_holding_id': holding_id or None,
+        'p_empresa_id': empresa_id or None,
+        'p_filial_id': filial_id or None,
+        'p_nivel_contexto': nivel_contexto or None,
+        'p_contexto_nome': contexto_nome or None
+    }
+
+    model_rows = supabase.rpc('get_active_evaluation_model_for_context', rpc_params).execute().data or []
+    if not model_rows:
+        return None
+
+    rows = supabase.rpc('get_dimension_weights_for_context', rpc_params).execute().data or []
+
+    out = {
+        'institutional': None,
+        'functional': None,
+        'individual': None,
+        'metas': None,
+        'modelo_avaliacao_id': model_rows[0].get('modelo_avaliacao_id'),
+        'versao_modelo_id': model_rows[0].get('versao_modelo_id')
+    }
+
+    for row in rows:
+        dim = str(row.get('dimension') or '').upper()
+        val = row.get('weight')
+
+        if dim == 'INSTITUCIONAL':
+            out['institutional'] = val
+        elif dim == 'FUNCIONAL':
+            out['functional'] = val
+        elif dim == 'INDIVIDUAL':
+            out['individual'] = val
+        elif dim == 'METAS':
+            out['metas'] = val
+
+    with _POLICY_RESOLVER_LOCK:
+        entry['weights'][weights_key] = out
+    return dict(out)
+
+
+def _get_best_contract_policy(ctx):
     if not ctx.get('cliente_id'):
         return None
+    return _resolve_from_context_index(_policy_resolver_for_cliente(ctx['cliente_id'])['policies'], ctx)
 
-    r = (
-        supabase.table('evaluation_reference_values')
-        .select('*')
-        .eq('cliente_id', ctx['cliente_id'])
-        .eq('reference_key', 'INSS_TETO')
-        .eq('active', True)
-        .execute()
-    )
 
-    all_rows = r.data or []
-    rows = [row for row in all_rows if _contract_row_matches_context(row, ctx)]
-    if not rows and not any(_clean_contract_context_value(ctx.get(k)) for k in ['holding_id', 'empresa_id', 'filial_id']) and len(all_rows) == 1:
-        rows = all_rows
-    rows.sort(key=lambda row: (_contract_context_specificity(row), int(row.get('id') or 0)), reverse=True)
-    return rows[0] if rows else None
+def _get_best_inss_reference(ctx):
+    if not ctx.get('cliente_id'):
+        return None
+    return _resolve_from_context_index(_policy_resolver_for_cliente(ctx['cliente_id'])['inss'], ctx)
 
 
 @app.route('/api/evaluation-contract-policy', methods=['GET'])
@@ -3479,6 +4405,9 @@ def put_evaluation_contract_policy():
                 'notes': 'Atualizado pelo painel de desempenho.'
             }).execute()
 
+        _invalidate_policy_resolver(ctx['cliente_id'])
+        _invalidate_evaluation_form_cache()
+
         return jsonify({
             'message': 'Configuracao contratual salva com sucesso.',
             'policy': (inserted.data or [payload])[0]
@@ -3897,6 +4826,12 @@ def classificar_colaborador(ratings: dict, final_rating: float,
     return 'NEUTRO'
 
 
+# db-max-rows corta cada resposta em 1000: avaliações são paginadas e os
+# colaboradores lidos em lotes de ids.
+AVALIACOES_BRUTAS_PAGE_SIZE = 1000
+AVALIACOES_BRUTAS_IN_CHUNK_SIZE = 200
+
+
 def buscar_avaliacoes_brutas(
     round_code: str | None = None,
     empresa: str | None = None,
@@ -3921,21 +4856,30 @@ def buscar_avaliacoes_brutas(
 
     # 1) Buscar avaliações
     try:
-        query = (
-            supabase
-            .table('evaluations')
-            .select(
-                'id,employee_id,round_code,'
-                'institucional_avg,funcional_avg,individual_avg,metas_avg,'
-                'final_rating'
+        eval_rows = []
+        while True:
+            query = (
+                supabase
+                .table('evaluations')
+                .select(
+                    'id,employee_id,round_code,'
+                    'institucional_avg,funcional_avg,individual_avg,metas_avg,'
+                    'final_rating'
+                )
             )
-        )
 
-        if round_code:
-            query = query.eq('round_code', round_code)
+            if round_code:
+                query = query.eq('round_code', round_code)
 
-        r_eval = query.execute()
-        eval_rows = r_eval.data or []
+            page = (
+                query
+                .order('id')
+                .range(len(eval_rows), len(eval_rows) + AVALIACOES_BRUTAS_PAGE_SIZE - 1)
+                .execute()
+            ).data or []
+            eval_rows.extend(page)
+            if len(page) < AVALIACOES_BRUTAS_PAGE_SIZE:
+                break
 
     except Exception as e:
         print('[buscar_avaliacoes_brutas] erro ao buscar evaluations:', e)
@@ -3956,42 +4900,44 @@ def buscar_avaliacoes_brutas(
 
     # 3) Buscar dados dos colaboradores
     try:
-        emp_query = (
-            supabase
-            .table('employees')
-            .select(
-                'id,'
-                
-                'nome,cargo,empresa,cliente_id,holding_id,'
-                
-                'empresa_id,filial_id,'
-                'company_name,branch_name,department_name,'
-                'manager_name,manager_code'
-            )
-            .in_('id', employee_ids)
-        )
+        emp_rows = []
+        for start in range(0, len(employee_ids), AVALIACOES_BRUTAS_IN_CHUNK_SIZE):
+            emp_query = (
+                supabase
+                .table('employees')
+                .select(
+                    'id,'
 
-        # Filtro antigo textual por empresa, mantido por compatibilidade
-        if empresa:
-            emp_query = emp_query.eq('empresa', empresa)
+                    'nome,cargo,empresa,cliente_id,holding_id,'
 
-        # Filtro novo por contexto
-        nivel = (nivel_contexto or '').strip().lower()
+                    'empresa_id,filial_id,'
+                    'company_name,branch_name,department_name,'
+                    'manager_name,manager_code'
+                )
+                .in_('id', employee_ids[start:start + AVALIACOES_BRUTAS_IN_CHUNK_SIZE])
+            )
 
-        if nivel == 'empresa' and empresa_id:
-            emp_query = emp_query.eq('empresa_id', empresa_id)
+            # Filtro antigo textual por empresa, mantido por compatibilidade
+            if empresa:
+                emp_query = emp_query.eq('empresa', empresa)
 
-        elif nivel == 'filial':
-            if empresa_id:
+            # Filtro novo por contexto
+            nivel = (nivel_contexto or '').strip().lower()
+
+            if nivel == 'empresa' and empresa_id:
                 emp_query = emp_query.eq('empresa_id', empresa_id)
-            if filial_id:
-                emp_query = emp_query.eq('filial_id', filial_id)
 
-        elif nivel == 'holding' and holding_id:
-            emp_query = emp_query.eq('holding_id', holding_id)
+            elif nivel == 'filial':
+                if empresa_id:
+                    emp_query = emp_query.eq('empresa_id', empresa_id)
+                if filial_id:
+                    emp_query = emp_query.eq('filial_id', filial_id)
 
-        r_emp = emp_query.execute()
-        emp_rows = r_emp.data or []
+            elif nivel == 'holding' and holding_id:
+                emp_query = emp_query.eq('holding_id', holding_id)
+
+            r_emp = emp_query.execute()
+            emp_rows.extend(r_emp.data or [])
 
     except Exception as e:
         print('[buscar_avaliacoes_brutas] erro ao buscar employees:', e)
@@ -4127,43 +5073,7 @@ def api_relatorio_pdi_dimensoes():
         
         # Se vier year e NÃO vier round_code, tenta mapear para um round_code existente
         if (not round_code) and year:
-            # tenta formatos comuns primeiro
-            candidatos = [f'YE{year}', f'Start{year}']
-            encontrado = None
-        
-            for cod in candidatos:
-                try:
-                    r_test = (
-                        supabase
-                        .table('evaluations')
-                        .select('id')
-                        .eq('round_code', cod)
-                        .limit(1)
-                        .execute()
-                    )
-                    if r_test.data:
-                        encontrado = cod
-                        break
-                except Exception as e:
-                    print('[api_relatorio_pdi_dimensoes] erro ao testar round_code', cod, e)
-        
-            # fallback: pegar o round_code mais frequente daquele evaluation_year
-            if not encontrado:
-                try:
-                    r_all = (
-                        supabase
-                        .table('evaluations')
-                        .select('round_code')
-                        .eq('evaluation_year', year)
-                        .execute()
-                    )
-                    rows = r_all.data or []
-                    from collections import Counter
-                    cnt = Counter([r.get('round_code') for r in rows if r.get('round_code')])
-                    if cnt:
-                        encontrado = cnt.most_common(1)[0][0]
-                except Exception as e:
-                    print('[api_relatorio_pdi_dimensoes] erro ao buscar round_code por evaluation_year:', e)
+            encontrado = _resolve_round_code_for_year(year)
 
             # ✅ Se pediu um year e não existe round_code para esse ano, NÃO usar active_round_code
             if year and not encontrado:
@@ -4232,12 +5142,7 @@ def api_relatorio_pdi_dimensoes():
                 employee_ref_id = avaliacoes[0].get('employee_id')
 
             if employee_ref_id:
-                r_criteria = supabase.rpc(
-                    'get_active_evaluation_criteria_for_employee',
-                    {'p_employee_id': int(employee_ref_id)}
-                ).execute()
-
-                criteria_rows = r_criteria.data or []
+                criteria_rows = _get_active_evaluation_criteria(int(employee_ref_id))
 
                 dim_label_map = {
                     'FUNCIONAL': 'Funcional',
@@ -4311,10 +5216,12 @@ def api_ninebox():
     GET /api/ninebox?round_code=YE2025&manager_name=FULANO
     - round_code opcional: se não vier, usa system_config.active_round_code
     - manager_name opcional: filtra o 9box por gestor (nome)
+    - include_subtree=true: gestor vê toda a subárvore, não só os diretos
     """
     try:
         round_code = (request.args.get('round_code') or '').strip()
         manager_name = (request.args.get('manager_name') or '').strip()
+        include_subtree = _wants_subtree()
 
         # se não vier round_code, pega a rodada ativa
         if not round_code:
@@ -4334,33 +5241,56 @@ def api_ninebox():
                 print('[api_ninebox] erro ao ler active_round_code:', e)
 
         # consulta a VIEW v_ninebox_items
-        q = (
-            supabase
-            .table('v_ninebox_items')
-            .select(
-                'employee_id,employee_name,cargo,empresa,department_name,'
-                'manager_name,manager_code,'
-                'final_rating,performance_rating,potential_rating,nine_box_position,'
-                'round_code,evaluation_year,evaluation_date,created_at'
+        def ninebox_query():
+            q = (
+                supabase
+                .table('v_ninebox_items')
+                .select(
+                    'employee_id,employee_name,cargo,empresa,department_name,'
+                    'manager_name,manager_code,'
+                    'final_rating,performance_rating,potential_rating,nine_box_position,'
+                    'round_code,evaluation_year,evaluation_date,created_at'
+                )
             )
-        )
-
-        if round_code:
-            q = q.eq('round_code', round_code)
-
-        # filtro por gestor via URL (compatível com o seu link atual ?manager_name=...)
-        if manager_name:
-            q = q.eq('manager_name', manager_name)
+            if round_code:
+                q = q.eq('round_code', round_code)
+            return q
 
         # (opcional) se estiver usando /team?t=TOKEN, isso reforça segurança por manager_code
         referer = (request.headers.get('Referer') or '')
         from_manager_panel = '/manager' in referer
         mc = (request.cookies.get('manager_access') or '').strip()
-        if mc and not from_manager_panel:
-            q = q.eq('manager_code', mc)
+        restrict_code = mc if (mc and not from_manager_panel) else ''
+        include_subtree = include_subtree and bool(manager_name or restrict_code)
+
+        if include_subtree:
+            # subárvore resolvida na hierarquia do cliente; a VIEW é lida só para esses ids
+            cliente_id = (request.args.get('cliente_id') or '').strip()
+            subtree_ids = None
+            for manager in (
+                {'manager_name': manager_name} if manager_name else None,
+                {'manager_code': restrict_code} if restrict_code else None,
+            ):
+                if manager:
+                    hierarchy, manager_id = _org_locate_manager(cliente_id, **manager)
+                    ids = set(_org_subtree_ids(hierarchy, manager_id)) if manager_id is not None else set()
+                    subtree_ids = ids if subtree_ids is None else subtree_ids & ids
+            subtree_ids = sorted(subtree_ids)
+            items = []
+            for i in range(0, len(subtree_ids), ORG_IN_CHUNK_SIZE):
+                items.extend(
+                    ninebox_query().in_('employee_id', subtree_ids[i:i + ORG_IN_CHUNK_SIZE]).execute().data or []
+                )
+        else:
+            q = ninebox_query()
+            # filtro por gestor via URL (compatível com o seu link atual ?manager_name=...)
+            if manager_name:
+                q = q.eq('manager_name', manager_name)
+            if restrict_code:
+                q = q.eq('manager_code', restrict_code)
 
-        r = q.execute()
-        items = r.data or []
+            r = q.execute()
+            items = r.data or []
 
         # agregado por posição 1..9
         counts = {str(i): 0 for i in range(1, 10)}
@@ -4526,19 +5456,192 @@ def api_ninebox_contexto():
 
 
 
+# ===== Catálogo de rodadas =====
+# round_code -> anos, contagem de avaliações e status da rodada. Uma leitura
+# leve de evaluations (round_code, evaluation_year) agregada aqui, mais
+# evaluation_rounds e a rodada ativa; ?year= vira lookup em memória.
+# Avaliação nova (ou que muda de rodada/ano) ajusta as contagens do catálogo
+# quente sem reler evaluations; com o catálogo frio, ?year= usa sondas limit(1).
+ROUNDS_CATALOG_TTL_SECONDS = 600
+ROUNDS_CATALOG_PAGE_SIZE = 1000
+_ROUNDS_CATALOG = {}
+_ROUNDS_CATALOG_LOCK = threading.Lock()
+
+
+def _rounds_catalog_derive(catalog):
+    """Recalcula contagens por rodada e o índice por ano a partir de catalog['counts']."""
+    rounds = catalog['rounds']
+    by_year = {}
+    for code, entry in rounds.items():
+        years = catalog['counts'].get(code) or {}
+        entry['evaluations'] = sum(years.values())
+        entry['evaluation_years'] = sorted(y for y, n in years.items() if y is not None and n > 0)
+        entry['active'] = code == catalog['active_round_code']
+        for year, n in years.items():
+            if year is not None and n > 0:
+                by_year.setdefault(int(year), []).append((n, code))
+    # ano -> códigos do mais frequente para o menos frequente
+    catalog['by_year'] = {
+        year: [code for _, code in sorted(pairs, key=lambda p: (-p[0], p[1]))]
+        for year, pairs in by_year.items()
+    }
+    return catalog
+
+
+def _load_rounds_catalog():
+    counts = {}
+    start = 0
+    while True:
+        rows = (
+            supabase.table('evaluations')
+            .select('round_code,evaluation_year')
+            .order('id')
+            .range(start, start + ROUNDS_CATALOG_PAGE_SIZE - 1)
+            .execute()
+        ).data or []
+        for row in rows:
+            code = (row.get('round_code') or '').strip()
+            if code:
+                years = counts.setdefault(code, {})
+                years[row.get('evaluation_year')] = years.get(row.get('evaluation_year'), 0) + 1
+        if len(rows) < ROUNDS_CATALOG_PAGE_SIZE:
+            break
+        start += ROUNDS_CATALOG_PAGE_SIZE
+
+    registered = (
+        supabase.table('evaluation_rounds')
+        .select('code,status,opened_at,closed_at')
+        .order('opened_at', desc=True)
+        .execute()
+    ).data or []
+    try:
+        active = (_get_active_round_code() or '').strip() or None
+    except Exception as e:
+        print('[rounds-catalog] erro ao ler active_round_code:', e)
+        active = None
+
+    rounds = {}
+    for row in registered:
+        rounds[row.get('code')] = {
+            'code': row.get('code'),
+            'status': row.get('status'),
+            'opened_at': row.get('opened_at'),
+            'closed_at': row.get('closed_at'),
+            'registered': True,
+        }
+    for code in counts:
+        rounds.setdefault(code, {
+            'code': code, 'status': None, 'opened_at': None, 'closed_at': None, 'registered': False,
+        })
+
+    return _rounds_catalog_derive({
+        'loaded_at': time.monotonic(),
+        'active_round_code': active,
+        'rounds': rounds,
+        'counts': counts,
+        'order': [row.get('code') for row in registered],
+    })
+
+
+def _rounds_catalog_peek():
+    """Catálogo em memória se ainda válido; não carrega."""
+    now = time.monotonic()
+    with _ROUNDS_CATALOG_LOCK:
+        catalog = _ROUNDS_CATALOG.get('catalog')
+        if catalog and (now - catalog['loaded_at']) < ROUNDS_CATALOG_TTL_SECONDS:
+            return catalog
+    return None
+
+
+def _rounds_catalog():
+    catalog = _rounds_catalog_peek()
+    if catalog:
+        return catalog
+    catalog = _load_rounds_catalog()
+    with _ROUNDS_CATALOG_LOCK:
+        _ROUNDS_CATALOG['catalog'] = catalog
+    return catalog
+
+
+def _invalidate_rounds_catalog():
+    with _ROUNDS_CATALOG_LOCK:
+        _ROUNDS_CATALOG.clear()
+
+
+def _rounds_catalog_move_evaluation(old_key, new_key):
+    """
+    Ajusta as contagens do catálogo quente quando uma avaliação entra
+    (old_key=None) ou troca de (round_code, evaluation_year). Catálogo frio
+    não precisa de ajuste: a próxima carga já lê o estado novo.
+    """
+    def norm(key):
+        if not key:
+            return None
+        code = (key[0] or '').strip()
+        return (code, key[1]) if code else None
+
+    old_key, new_key = norm(old_key), norm(new_key)
+    if old_key == new_key:
+        return
+    with _ROUNDS_CATALOG_LOCK:
+        catalog = _ROUNDS_CATALOG.get('catalog')
+        if not catalog:
+            return
+        for key, delta in ((old_key, -1), (new_key, 1)):
+            if not key:
+                continue
+            code, year = key
+            years = catalog['counts'].setdefault(code, {})
+            years[year] = max(0, years.get(year, 0) + delta)
+            catalog['rounds'].setdefault(code, {
+                'code': code, 'status': None, 'opened_at': None, 'closed_at': None, 'registered': False,
+            })
+        _rounds_catalog_derive(catalog)
+
+
+def _resolve_round_code_for_year(year):
+    """YE{ano} ou Start{ano} se existirem avaliações; senão a rodada mais frequente do evaluation_year."""
+    if not year:
+        return None
+    catalog = _rounds_catalog_peek()
+    if catalog is None:
+        # catálogo frio: sondas limit(1) resolvem o caso comum sem varrer evaluations
+        for code in (f'YE{year}', f'Start{year}'):
+            try:
+                probe = (
+                    supabase.table('evaluations')
+                    .select('id')
+                    .eq('round_code', code)
+                    .limit(1)
+                    .execute()
+                )
+                if probe.data:
+                    return code
+            except Exception as e:
+                print('[rounds-catalog] erro ao testar round_code', code, e)
+        try:
+            catalog = _rounds_catalog()
+        except Exception as e:
+            print('[rounds-catalog] erro ao carregar catálogo:', e)
+            return None
+    for code in (f'YE{year}', f'Start{year}'):
+        if catalog['rounds'].get(code, {}).get('evaluations'):
+            return code
+    codes = catalog['by_year'].get(int(year)) or []
+    return codes[0] if codes else None
+
+
 @app.route('/api/rounds/list', methods=['GET'], endpoint='api_rounds_list_v2')
 def api_rounds_list_v2():
     """
     Lista rodadas cadastradas em evaluation_rounds para o dropdown do 9box.
     """
     try:
-        r = (
-            supabase.table('evaluation_rounds')
-            .select('code,status,opened_at,closed_at')
-            .order('opened_at', desc=True)
-            .execute()
-        )
-        return jsonify({'items': r.data or []}), 200
+        catalog = _rounds_catalog()
+        return jsonify({
+            'items': [catalog['rounds'][code] for code in catalog['order']],
+            'active_round_code': catalog['active_round_code'],
+        }), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -4570,6 +5673,7 @@ def update_system_config():
             'config_value': round_code,
             'description': f'Código da rodada ativa: {round_code}'
         }, on_conflict='config_key').execute()
+        _invalidate_rounds_catalog()
         
         return jsonify({'message': 'Configuração atualizada com sucesso'})
     except Exception as e:
@@ -4607,7 +5711,10 @@ try:
 except Exception as e:
     print('[job_architecture] erro ao registrar rotas:', e)
 
-register_pdi_routes(app, supabase, buscar_avaliacoes_brutas, _get_active_round_code, _require_rh_code)
+register_pdi_routes(
+    app, supabase, buscar_avaliacoes_brutas, _get_active_round_code, _require_rh_code,
+    resolve_round_code_for_year=_resolve_round_code_for_year,
+)
     
 
 
@@ -4667,6 +5774,7 @@ def api_rounds_close_active():
             'status': 'CLOSED',
             'closed_at': datetime.now(timezone.utc).isoformat()
         }, on_conflict='code').execute()
+        _invalidate_rounds_catalog()
 
         return jsonify({'message': f'Rodada {active} fechada (somente leitura).'}), 200
     except Exception as e:
@@ -4699,6 +5807,7 @@ def api_rounds_open():
             'config_value': new_code,
             'description': f'Código da rodada ativa: {new_code}'
         }, on_conflict='config_key').execute()
+        _invalidate_rounds_catalog()
 
         return jsonify({'message': f'Rodada ativa atualizada para {new_code}'}), 200
     except Exception as e:
@@ -4722,7 +5831,7 @@ def get_db_connection():
         raise RuntimeError("DATABASE_URL não configurada no servidor")
 
     # Em ambientes como Supabase/Render, normalmente precisa de SSL
-    return psycopg2.connect(DATABASE_URL, sslmode="require")
+    return psycopg2.connect(DATABASE_URL, sslmode="require", connection_factory=InstrumentedConnection)
 
 
 
@@ -4867,13 +5976,28 @@ def load_merit_rows():
     return rows
 
 
+def _merit_rows_for_request():
+    """load_merit_rows() restrito à subárvore de ?manager_code=/?manager_name= quando include_subtree=true."""
+    rows = load_merit_rows()
+    manager_code = (request.args.get("manager_code") or "").strip()
+    manager_name = (request.args.get("manager_name") or "").strip()
+    if _wants_subtree() and (manager_code or manager_name):
+        in_subtree = _org_subtree_predicate(
+            (request.args.get("cliente_id") or "").strip(),
+            manager_code=manager_code,
+            manager_name=manager_name,
+        )
+        rows = [r for r in rows if in_subtree(r.get("employee_id"))]
+    return rows
+
+
 @app.route("/api/merit-simulation", methods=["GET"])
 def api_merit_simulation():
     """
     Continua igual: retorna a lista plana (um registro por colaborador),
     com impactos e percentuais de mérito.
     """
-    rows = load_merit_rows()
+    rows = _merit_rows_for_request()
     return jsonify({
         "count": len(rows),
         "items": rows
@@ -4913,7 +6037,7 @@ def api_relatorio_merito():
       ...
     ]
     """
-    rows = load_merit_rows()
+    rows = _merit_rows_for_request()
 
     grupos = {}  # chave = nome do gestor
 
@@ -5240,20 +6364,30 @@ def _okr_actor():
         return "admin"
 
 
+def _okr_history_row(company_id: int, cycle_id: int, entity_type: str, entity_id: int, action: str, data: dict):
+    return {
+        "company_id": company_id,
+        "cycle_id": cycle_id,
+        "entity_type": entity_type,
+        "entity_id": entity_id,
+        "action": action,
+        "changed_at": datetime.now(timezone.utc).isoformat(),
+        "changed_by": _okr_actor(),
+        "data": data or {}
+    }
+
+
 def _okr_log(company_id: int, cycle_id: int, entity_type: str, entity_id: int, action: str, data: dict):
     """Grava histórico em okr_history (audit trail)."""
+    _okr_log_many([_okr_history_row(company_id, cycle_id, entity_type, entity_id, action, data)])
+
+
+def _okr_log_many(payloads: list):
+    """Grava várias linhas de okr_history num único insert."""
+    if not payloads:
+        return
     try:
-        payload = {
-            "company_id": company_id,
-            "cycle_id": cycle_id,
-            "entity_type": entity_type,
-            "entity_id": entity_id,
-            "action": action,
-            "changed_at": datetime.now(timezone.utc).isoformat(),
-            "changed_by": _okr_actor(),
-            "data": data or {}
-        }
-        supabase.table("okr_history").insert(payload).execute()
+        supabase.table("okr_history").insert(payloads).execute()
     except Exception as e:
         print("[OKR_HISTORY] erro ao gravar histórico:", e)
 
@@ -5561,6 +6695,7 @@ def api_okr_objectives_create():
 
         obj = rows[0]
         _okr_log(company_id, cycle_id, "OBJECTIVE", int(obj["id"]), "CREATE", obj)
+        _okr_invalidate_cycle_state(company_id, cycle_id)
 
         return jsonify({"created": True, "objective": obj}), 201
     except Exception as e:
@@ -5612,6 +6747,7 @@ def api_okr_objectives_update(objective_id: int):
         ).data
 
         _okr_log(company_id, cycle_id, "OBJECTIVE", objective_id, "UPDATE", {"before": cur, "after": updated})
+        _okr_invalidate_cycle_state(company_id, cycle_id)
         return jsonify({"updated": True, "objective": updated}), 200
 
     except Exception as e:
@@ -5636,6 +6772,7 @@ def api_okr_objectives_delete(objective_id: int):
 
         supabase.table("okr_objectives").delete().eq("id", objective_id).execute()
         _okr_log(company_id, cycle_id, "OBJECTIVE", objective_id, "DELETE", cur)
+        _okr_invalidate_cycle_state(company_id, cycle_id)
 
         return jsonify({"deleted": True}), 200
     except Exception as e:
@@ -5727,6 +6864,7 @@ def api_okr_krs_create():
 
         kr = rows[0]
         _okr_log(company_id, cycle_id, "KR", int(kr["id"]), "CREATE", kr)
+        _okr_invalidate_cycle_state(company_id, cycle_id)
 
         return jsonify({"created": True, "kr": kr}), 201
     except Exception as e:
@@ -5769,6 +6907,7 @@ def api_okr_krs_update(kr_id: int):
         ).data
 
         _okr_log(company_id, cycle_id, "KR", kr_id, "UPDATE", {"before": cur, "after": updated})
+        _okr_invalidate_cycle_state(company_id, cycle_id)
         return jsonify({"updated": True, "kr": updated}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -5792,6 +6931,7 @@ def api_okr_krs_delete(kr_id: int):
 
         supabase.table("okr_key_results").delete().eq("id", kr_id).execute()
         _okr_log(company_id, cycle_id, "KR", kr_id, "DELETE", cur)
+        _okr_invalidate_cycle_state(company_id, cycle_id)
 
         return jsonify({"deleted": True}), 200
     except Exception as e:
@@ -5829,6 +6969,57 @@ def api_okr_links_list():
         return jsonify({"error": str(e)}), 500
 
 
+# Chaves únicas de okr_links por tipo (índices únicos no banco; usadas no
+# on_conflict do bulk e na checagem de existência do POST unitário).
+OKR_LINK_CONFLICT_KEYS = {
+    "INDIVIDUAL_GOAL_TO_KR": "company_id,cycle_id,link_type,from_individual_goal_id,to_kr_id",
+    "GOAL_TO_KR": "company_id,cycle_id,link_type,from_goal_id,to_kr_id",
+    "GOAL_TO_GOAL": "company_id,cycle_id,link_type,from_goal_id,to_goal_id",
+}
+OKR_BULK_BATCH_SIZE = 500
+
+
+def _okr_link_row(company_id: int, cycle_id: int, body: dict):
+    """Valida e monta a linha de okr_links. Retorna (row, erro)."""
+    link_type = str(body.get("link_type") or "").strip()
+    if link_type not in OKR_LINK_CONFLICT_KEYS:
+        return None, "link_type inválido"
+
+    try:
+        row = {
+            "company_id": company_id,
+            "cycle_id": cycle_id,
+            "link_type": link_type,
+            "weight": float(body.get("weight", 1) or 1),
+            "note": body.get("note")
+        }
+
+        # ===================== 1) INDIVIDUAL_GOAL_TO_KR =====================
+        if link_type == "INDIVIDUAL_GOAL_TO_KR":
+            if not body.get("from_individual_goal_id") or not body.get("to_kr_id"):
+                return None, "from_individual_goal_id e to_kr_id são obrigatórios"
+            row["from_individual_goal_id"] = int(body["from_individual_goal_id"])
+            row["to_kr_id"] = int(body["to_kr_id"])
+
+        # ===================== 2) GOAL_TO_KR =====================
+        elif link_type == "GOAL_TO_KR":
+            if not body.get("from_goal_id") or not body.get("to_kr_id"):
+                return None, "from_goal_id e to_kr_id são obrigatórios"
+            row["from_goal_id"] = int(body["from_goal_id"])
+            row["to_kr_id"] = int(body["to_kr_id"])
+
+        # ===================== 3) GOAL_TO_GOAL =====================
+        else:
+            if not body.get("from_goal_id") or not body.get("to_goal_id"):
+                return None, "from_goal_id e to_goal_id são obrigatórios"
+            row["from_goal_id"] = int(body["from_goal_id"])
+            row["to_goal_id"] = int(body["to_goal_id"])
+
+        return row, None
+    except (TypeError, ValueError) as e:
+        return None, f"valor inválido: {e}"
+
+
 @app.route("/api/okr/links", methods=["POST"])
 def api_okr_links_create():
     """
@@ -5849,120 +7040,85 @@ def api_okr_links_create():
         cycle_id = int(body.get("cycle_id") or 0)
         link_type = (body.get("link_type") or "").strip()
 
-        from_goal_id = body.get("from_goal_id")
-        to_goal_id = body.get("to_goal_id")
-        to_kr_id = body.get("to_kr_id")
-
-        # ✅ novo campo
-        from_individual_goal_id = body.get("from_individual_goal_id")
-
-        weight = body.get("weight", 1)
-        note = body.get("note")
-
         if not company_id or not cycle_id or not link_type:
             return jsonify({"error": "company_id, cycle_id e link_type são obrigatórios"}), 400
 
-        if link_type not in ("GOAL_TO_KR", "GOAL_TO_GOAL", "INDIVIDUAL_GOAL_TO_KR"):
-            return jsonify({"error": "link_type inválido"}), 400
-
-        # ===================== 1) INDIVIDUAL_GOAL_TO_KR =====================
-        if link_type == "INDIVIDUAL_GOAL_TO_KR":
-            if not from_individual_goal_id or not to_kr_id:
-                return jsonify({"error": "from_individual_goal_id e to_kr_id são obrigatórios"}), 400
+        row, error = _okr_link_row(company_id, cycle_id, body)
+        if error:
+            return jsonify({"error": error}), 400
 
-            r_exist = (
-                supabase.table("okr_links")
-                .select("*")
-                .eq("company_id", company_id)
-                .eq("cycle_id", cycle_id)
-                .eq("link_type", link_type)
-                .eq("from_individual_goal_id", int(from_individual_goal_id))
-                .eq("to_kr_id", int(to_kr_id))
-                .limit(1)
-                .execute()
-            )
-            ex = r_exist.data or []
-            if ex:
-                return jsonify({"created": False, "link": ex[0]}), 200
+        q_exist = supabase.table("okr_links").select("*")
+        for col in OKR_LINK_CONFLICT_KEYS[link_type].split(","):
+            q_exist = q_exist.eq(col, row[col])
+        ex = q_exist.limit(1).execute().data or []
+        if ex:
+            return jsonify({"created": False, "link": ex[0]}), 200
 
-            row = {
-                "company_id": company_id,
-                "cycle_id": cycle_id,
-                "link_type": link_type,
-                "from_individual_goal_id": int(from_individual_goal_id),
-                "to_kr_id": int(to_kr_id),
-                "weight": float(weight or 1),
-                "note": note
-            }
+        ins = supabase.table("okr_links").insert(row).execute()
+        rows = ins.data or []
+        if not rows:
+            return jsonify({"error": "Falha ao criar link"}), 500
 
-        # ===================== 2) GOAL_TO_KR =====================
-        elif link_type == "GOAL_TO_KR":
-            if not from_goal_id or not to_kr_id:
-                return jsonify({"error": "from_goal_id e to_kr_id são obrigatórios"}), 400
-
-            r_exist = (
-                supabase.table("okr_links")
-                .select("*")
-                .eq("company_id", company_id)
-                .eq("cycle_id", cycle_id)
-                .eq("link_type", link_type)
-                .eq("from_goal_id", int(from_goal_id))
-                .eq("to_kr_id", int(to_kr_id))
-                .limit(1)
-                .execute()
-            )
-            ex = r_exist.data or []
-            if ex:
-                return jsonify({"created": False, "link": ex[0]}), 200
+        link = rows[0]
+        _okr_log(company_id, cycle_id, "LINK", int(link["id"]), "CREATE", link)
+        _okr_invalidate_cycle_state(company_id, cycle_id)
+        return jsonify({"created": True, "link": link}), 201
 
-            row = {
-                "company_id": company_id,
-                "cycle_id": cycle_id,
-                "link_type": link_type,
-                "from_goal_id": int(from_goal_id),
-                "to_kr_id": int(to_kr_id),
-                "weight": float(weight or 1),
-                "note": note
-            }
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
 
-        # ===================== 3) GOAL_TO_GOAL =====================
-        else:
-            if not from_goal_id or not to_goal_id:
-                return jsonify({"error": "from_goal_id e to_goal_id são obrigatórios"}), 400
 
-            r_exist = (
-                supabase.table("okr_links")
-                .select("*")
-                .eq("company_id", company_id)
-                .eq("cycle_id", cycle_id)
-                .eq("link_type", link_type)
-                .eq("from_goal_id", int(from_goal_id))
-                .eq("to_goal_id", int(to_goal_id))
-                .limit(1)
-                .execute()
-            )
-            ex = r_exist.data or []
-            if ex:
-                return jsonify({"created": False, "link": ex[0]}), 200
+@app.route("/api/okr/links/bulk", methods=["POST"])
+def api_okr_links_bulk_upsert():
+    """
+    POST /api/okr/links/bulk
+    Body: {"company_id":1,"cycle_id":1,"items":[{link_type, from_*, to_*, weight, note}, ...]}
+    Upsert pelos índices únicos de okr_links (sem SELECT prévio); weight/note
+    de links existentes são atualizados. Histórico gravado num único insert.
+    """
+    try:
+        body = request.get_json(silent=True) or {}
+        company_id = int(body.get("company_id") or 0)
+        cycle_id = int(body.get("cycle_id") or 0)
+        items = body.get("items") or []
 
-            row = {
-                "company_id": company_id,
-                "cycle_id": cycle_id,
-                "link_type": link_type,
-                "from_goal_id": int(from_goal_id),
-                "to_goal_id": int(to_goal_id),
-                "weight": float(weight or 1),
-                "note": note
-            }
+        if not company_id or not cycle_id:
+            return jsonify({"error": "company_id e cycle_id obrigatórios"}), 400
+        if not isinstance(items, list) or not items:
+            return jsonify({"error": "items deve ser uma lista não vazia"}), 400
+
+        errors = []
+        rows_by_type = {}
+        for i, item in enumerate(items):
+            if not isinstance(item, dict):
+                errors.append({"index": i, "error": "item deve ser um objeto"})
+                continue
+            row, error = _okr_link_row(company_id, cycle_id, item)
+            if error:
+                errors.append({"index": i, "error": error})
+                continue
+            key = tuple(row.get(col) for col in OKR_LINK_CONFLICT_KEYS[row["link_type"]].split(","))
+            rows_by_type.setdefault(row["link_type"], {})[key] = row  # último vence
+
+        saved = []
+        for link_type, rows in rows_by_type.items():
+            rows = list(rows.values())
+            for i in range(0, len(rows), OKR_BULK_BATCH_SIZE):
+                r = (
+                    supabase.table("okr_links")
+                    .upsert(rows[i:i + OKR_BULK_BATCH_SIZE], on_conflict=OKR_LINK_CONFLICT_KEYS[link_type])
+                    .execute()
+                )
+                saved.extend(r.data or [])
 
-        ins = supabase.table("okr_links").insert(row).execute()
-        rows = ins.data or []
-        if not rows:
-            return jsonify({"error": "Falha ao criar link"}), 500
+        _okr_log_many([
+            _okr_history_row(company_id, cycle_id, "LINK", int(link["id"]), "UPSERT", link)
+            for link in saved if link.get("id") is not None
+        ])
+        if saved:
+            _okr_invalidate_cycle_state(company_id, cycle_id)
 
-        link = rows[0]
-        _okr_log(company_id, cycle_id, "LINK", int(link["id"]), "CREATE", link)
-        return jsonify({"created": True, "link": link}), 201
+        return jsonify({"saved": len(saved), "links": saved, "errors": errors}), 200 if not errors else 207
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -5987,6 +7143,7 @@ def api_okr_links_delete(link_id: int):
 
         supabase.table("okr_links").delete().eq("id", link_id).execute()
         _okr_log(company_id, cycle_id, "LINK", link_id, "DELETE", row)
+        _okr_invalidate_cycle_state(company_id, cycle_id)
         return jsonify({"deleted": True}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -6061,6 +7218,7 @@ def api_okr_kr_checkpoint_upsert(kr_id: int):
 
         saved = rows[0]
         _okr_log(company_id, cycle_id, "KR_CHECKPOINT", int(saved["id"]), "UPSERT", saved)
+        _okr_progress_on_checkpoint(company_id, cycle_id, saved)
 
         return jsonify({"saved": True, "checkpoint": saved}), 201
 
@@ -6068,6 +7226,82 @@ def api_okr_kr_checkpoint_upsert(kr_id: int):
         return jsonify({"error": str(e)}), 500
 
 
+@app.route("/api/okr/checkpoints/bulk", methods=["POST"])
+def api_okr_checkpoints_bulk_upsert():
+    """
+    POST /api/okr/checkpoints/bulk
+    Body:
+      {
+        "company_id":1,
+        "cycle_id":1,
+        "items":[{"kr_id":1,"month":"2026-02","actual":8,"forecast":7,"status":"MEDIUM","comment":"..."}, ...]
+      }
+    Upsert em lote por (kr_id, competence); histórico num único insert e
+    progresso materializado recalculado uma vez para os KRs afetados.
+    """
+    try:
+        body = request.get_json(silent=True) or {}
+        company_id = int(body.get("company_id") or 0)
+        cycle_id = int(body.get("cycle_id") or 0)
+        items = body.get("items") or []
+
+        if not company_id or not cycle_id:
+            return jsonify({"error": "company_id e cycle_id obrigatórios"}), 400
+        if not isinstance(items, list) or not items:
+            return jsonify({"error": "items deve ser uma lista não vazia"}), 400
+
+        now_iso = datetime.now(timezone.utc).isoformat()
+        errors = []
+        rows = {}
+        for i, item in enumerate(items):
+            try:
+                if not isinstance(item, dict):
+                    raise ValueError("item deve ser um objeto")
+                kr_id = int(item.get("kr_id") or 0)
+                if not kr_id:
+                    raise ValueError("kr_id obrigatório")
+                competence = _month_start_str(str(item.get("month") or item.get("competence") or ""))
+                status = item.get("status") or "MEDIUM"
+                if not isinstance(status, str):
+                    raise ValueError("status deve ser texto")
+            except (ValueError, TypeError) as e:
+                errors.append({"index": i, "error": str(e)})
+                continue
+
+            rows[(kr_id, competence)] = {
+                "company_id": company_id,
+                "cycle_id": cycle_id,
+                "kr_id": kr_id,
+                "competence": competence,
+                "actual": item.get("actual"),
+                "forecast": item.get("forecast"),
+                "status": status.strip().upper(),
+                "comment": item.get("comment"),
+                "updated_at": now_iso
+            }
+
+        rows = list(rows.values())
+        saved = []
+        for i in range(0, len(rows), OKR_BULK_BATCH_SIZE):
+            r = (
+                supabase.table("okr_kr_checkpoints")
+                .upsert(rows[i:i + OKR_BULK_BATCH_SIZE], on_conflict="kr_id,competence")
+                .execute()
+            )
+            saved.extend(r.data or [])
+
+        _okr_log_many([
+            _okr_history_row(company_id, cycle_id, "KR_CHECKPOINT", int(cp["id"]), "UPSERT", cp)
+            for cp in saved if cp.get("id") is not None
+        ])
+        _okr_progress_on_checkpoints(company_id, cycle_id, saved)
+
+        return jsonify({"saved": len(saved), "checkpoints": saved, "errors": errors}), 200 if not errors else 207
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
 def _calc_progress_percent(baseline, target, actual, direction: str):
     """
     Retorna progresso 0..100 (float).
@@ -6368,6 +7602,7 @@ def api_okr_settings_put():
             return jsonify({"error": "Falha ao salvar settings (sem retorno após re-busca)"}), 500
 
         _okr_log(company_id, cycle_id, "SETTINGS", int(saved["id"]), "UPSERT", saved)
+        _okr_invalidate_cycle_state(company_id, cycle_id)
 
         return jsonify({"saved": True, "settings": saved}), 200
 
@@ -6513,6 +7748,446 @@ def api_okr_kr_progress_auto(kr_id: int):
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+# ===================== OKR Module: Rollup do ciclo =====================
+# Um dashboard de ciclo chamava /progress e /progress-auto para cada KR.
+# Aqui o ciclo inteiro é carregado em um número fixo de consultas
+# (objetivos, KRs, checkpoints, links, settings em paralelo; depois metas
+# individuais e okr_goals referenciadas pelos links) e a árvore é
+# calculada em memória.
+OKR_ROLLUP_WORKERS = 5
+OKR_IN_CHUNK_SIZE = 200
+
+
+def _okr_select_all(build_query, page_size: int = 1000):
+    """Pagina um select (build_query devolve uma query nova a cada chamada)."""
+    out = []
+    start = 0
+    while True:
+        rows = build_query().range(start, start + page_size - 1).execute().data or []
+        out.extend(rows)
+        if len(rows) < page_size:
+            return out
+        start += page_size
+
+
+def _okr_select_in(table: str, columns: str, ids):
+    ids = sorted({int(x) for x in ids if x is not None})
+    out = []
+    for i in range(0, len(ids), OKR_IN_CHUNK_SIZE):
+        chunk = ids[i:i + OKR_IN_CHUNK_SIZE]
+        out.extend(supabase.table(table).select(columns).in_("id", chunk).execute().data or [])
+    return out
+
+
+def _okr_load_cycle(company_id: int, cycle_id: int) -> dict:
+    def scoped(table, order_col="id", desc=False):
+        return lambda: _okr_select_all(
+            lambda: (
+                supabase.table(table)
+                .select("*")
+                .eq("company_id", company_id)
+                .eq("cycle_id", cycle_id)
+                .order(order_col, desc=desc)
+            )
+        )
+
+    loaders = {
+        "objectives": scoped("okr_objectives"),
+        "krs": scoped("okr_key_results"),
+        "checkpoints": scoped("okr_kr_checkpoints", "competence", True),
+        "links": scoped("okr_links"),
+        "settings": lambda: (
+            supabase.table("okr_settings")
+            .select("*")
+            .eq("company_id", company_id)
+            .eq("cycle_id", cycle_id)
+            .limit(1)
+            .execute()
+        ).data or [],
+    }
+
+    with ContextThreadPoolExecutor(max_workers=OKR_ROLLUP_WORKERS) as pool:
+        futures = {name: pool.submit(fn) for name, fn in loaders.items()}
+        data = {name: fut.result() for name, fut in futures.items()}
+
+        links = data["links"]
+        individual_goal_ids = [l.get("from_individual_goal_id") for l in links if l.get("link_type") == "INDIVIDUAL_GOAL_TO_KR"]
+        okr_goal_ids = (
+            [l.get("from_goal_id") for l in links if l.get("link_type") in ("GOAL_TO_KR", "GOAL_TO_GOAL")]
+            + [l.get("to_goal_id") for l in links if l.get("link_type") == "GOAL_TO_GOAL"]
+        )
+
+        f_ind = pool.submit(_okr_select_in, "individual_goals", "id,employee_id,goal_name,weight,rating", individual_goal_ids)
+        f_okr = pool.submit(_okr_select_in, "okr_goals", "*", okr_goal_ids)
+        data["individual_goals"] = f_ind.result()
+        data["okr_goals"] = f_okr.result()
+
+    data["settings"] = data["settings"][0] if data["settings"] else _okr_settings_default_row(company_id, cycle_id)
+    return data
+
+
+def _okr_weighted_percent(pairs, clamp: bool):
+    """pairs: [(percent|None, weight)] -> média ponderada (ou None)."""
+    total_w = 0.0
+    sum_w = 0.0
+    for pct, w in pairs:
+        if pct is not None:
+            total_w += w
+            sum_w += pct * w
+    if total_w <= 0:
+        return None
+    progress = round(sum_w / total_w, 2)
+    if clamp and progress > 100:
+        progress = 100.0
+    return progress
+
+
+def _okr_goal_progress(okr_goals, links, settings):
+    """
+    Progresso de okr_goals com propagação GOAL_TO_GOAL (from -> to).
+    Meta com rating próprio usa o rating; senão herda a média ponderada das
+    metas que empurram para ela. Ciclos de links são ignorados.
+    """
+    clamp = bool(settings.get("clamp_over_100", True))
+    goals_by_id = {int(g["id"]): g for g in okr_goals if g.get("id") is not None}
+
+    incoming = {}
+    for l in links:
+        if l.get("link_type") == "GOAL_TO_GOAL" and l.get("from_goal_id") is not None and l.get("to_goal_id") is not None:
+            incoming.setdefault(int(l["to_goal_id"]), []).append((int(l["from_goal_id"]), float(l.get("weight") or 1.0)))
+
+    progress = {}
+    visiting = set()
+
+    def resolve(goal_id):
+        if goal_id in progress:
+            return progress[goal_id]
+        if goal_id in visiting:
+            return None
+        visiting.add(goal_id)
+
+        rating = (goals_by_id.get(goal_id) or {}).get("rating")
+        pct = _rating_to_percent_from_settings(rating, settings) if rating is not None else None
+        if pct is None:
+            pct = _okr_weighted_percent([(resolve(src), w) for src, w in incoming.get(goal_id, [])], clamp)
+
+        visiting.discard(goal_id)
+        progress[goal_id] = pct
+        return pct
+
+    for goal_id in set(goals_by_id) | set(incoming):
+        resolve(goal_id)
+    return progress
+
+
+def _okr_kr_progress_from(kr, last_cp, kr_links, individual_goals_by_id, goal_progress, settings):
+    """Progresso de um KR: checkpoint (manual), metas linkadas (auto) e o efetivo."""
+    clamp = bool(settings.get("clamp_over_100", True))
+
+    manual = None
+    if last_cp and last_cp.get("actual") is not None:
+        manual = _calc_progress_percent(kr.get("baseline"), kr.get("target"), last_cp.get("actual"), kr.get("direction"))
+
+    contributions = []
+    for l in kr_links:
+        w = float(l.get("weight") or 1.0)
+        if l.get("link_type") == "INDIVIDUAL_GOAL_TO_KR" and l.get("from_individual_goal_id") is not None:
+            rating = (individual_goals_by_id.get(int(l["from_individual_goal_id"])) or {}).get("rating")
+            pct = _rating_to_percent_from_settings(rating, settings) if rating is not None else None
+        elif l.get("link_type") == "GOAL_TO_KR" and l.get("from_goal_id") is not None:
+            pct = goal_progress.get(int(l["from_goal_id"]))
+        else:
+            continue
+        contributions.append((pct, w))
+
+    auto = _okr_weighted_percent(contributions, clamp)
+    return {
+        "progress_percent": manual,
+        "progress_percent_auto": auto,
+        "progress_effective": manual if manual is not None else auto,
+    }
+
+
+def _okr_compute_rollup(data: dict) -> dict:
+    settings = data["settings"]
+    links = data["links"]
+    individual_goals_by_id = {int(g["id"]): g for g in data["individual_goals"] if g.get("id") is not None}
+    goal_progress = _okr_goal_progress(data["okr_goals"], links, settings)
+
+    last_cp_by_kr = {}
+    for cp in data["checkpoints"]:  # competence desc: o primeiro é o último
+        if cp.get("kr_id") is not None:
+            last_cp_by_kr.setdefault(int(cp["kr_id"]), cp)
+
+    links_by_kr = {}
+    for l in links:
+        if l.get("to_kr_id") is not None:
+            links_by_kr.setdefault(int(l["to_kr_id"]), []).append(l)
+
+    krs_by_objective = {}
+    for kr in data["krs"]:
+        kr_id = int(kr["id"])
+        node = {
+            **kr,
+            "last_checkpoint": last_cp_by_kr.get(kr_id),
+            "links_count": len(links_by_kr.get(kr_id, [])),
+            **_okr_kr_progress_from(
+                kr,
+                last_cp_by_kr.get(kr_id),
+                links_by_kr.get(kr_id, []),
+                individual_goals_by_id,
+                goal_progress,
+                settings
+            ),
+        }
+        krs_by_objective.setdefault(kr.get("objective_id"), []).append(node)
+
+    objectives = []
+    for obj in data["objectives"]:
+        kr_nodes = krs_by_objective.get(obj.get("id"), [])
+        values = [k["progress_effective"] for k in kr_nodes if k["progress_effective"] is not None]
+        objectives.append({
+            **obj,
+            "progress_percent": round(sum(values) / len(values), 2) if values else None,
+            "key_results": kr_nodes,
+        })
+
+    values = [o["progress_percent"] for o in objectives if o["progress_percent"] is not None]
+    return {
+        "settings": settings,
+        "progress_percent": round(sum(values) / len(values), 2) if values else None,
+        "objectives": objectives,
+        "goals_progress": {str(k): v for k, v in goal_progress.items()},
+    }
+
+
+@app.route("/api/okr/rollup", methods=["GET"])
+def api_okr_cycle_rollup():
+    """
+    GET /api/okr/rollup?company_id=1&cycle_id=1
+    Árvore do ciclo: objetivos -> KRs com último checkpoint, progresso manual,
+    automático (metas linkadas, inclusive GOAL_TO_GOAL) e progresso do objetivo.
+    """
+    try:
+        company_id = request.args.get("company_id", type=int)
+        cycle_id = request.args.get("cycle_id", type=int)
+        if not company_id or not cycle_id:
+            return jsonify({"error": "company_id e cycle_id obrigatórios"}), 400
+
+        rollup = _okr_compute_rollup(_okr_load_cycle(company_id, cycle_id))
+        return jsonify({"company_id": company_id, "cycle_id": cycle_id, **rollup}), 200
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+# ===================== OKR Module: Progresso materializado =====================
+# okr_progress guarda o progresso calculado de cada KR e objetivo
+# (entity_type, entity_id únicos). Ele é mantido incrementalmente:
+# checkpoint salvo ou rating de meta individual alterado recalcula só os KRs
+# afetados (via índice reverso sobre okr_links) e os objetivos desses KRs.
+# Leituras viram um select em okr_progress.
+OKR_PROGRESS_TABLE = "okr_progress"
+OKR_CYCLE_STATE_TTL_SECONDS = 600
+_OKR_CYCLE_STATE = {}
+_OKR_CYCLE_STATE_LOCK = threading.Lock()
+
+
+def _okr_reverse_index(data: dict) -> dict:
+    """individual_goal_id -> KRs e kr_id -> objective_id."""
+    krs_by_individual_goal = {}
+    for l in data["links"]:
+        if l.get("link_type") == "INDIVIDUAL_GOAL_TO_KR" and l.get("from_individual_goal_id") is not None and l.get("to_kr_id") is not None:
+            krs_by_individual_goal.setdefault(int(l["from_individual_goal_id"]), set()).add(int(l["to_kr_id"]))
+
+    return {
+        "krs_by_individual_goal": krs_by_individual_goal,
+        "objective_by_kr": {int(kr["id"]): kr.get("objective_id") for kr in data["krs"]},
+    }
+
+
+def _okr_cycle_state(company_id: int, cycle_id: int) -> dict:
+    key = (int(company_id), int(cycle_id))
+    now = time.monotonic()
+    with _OKR_CYCLE_STATE_LOCK:
+        state = _OKR_CYCLE_STATE.get(key)
+        if state and (now - state["loaded_at"]) < OKR_CYCLE_STATE_TTL_SECONDS:
+            return state
+
+    data = _okr_load_cycle(company_id, cycle_id)
+    state = {"loaded_at": now, "data": data, "index": _okr_reverse_index(data)}
+    with _OKR_CYCLE_STATE_LOCK:
+        _OKR_CYCLE_STATE[key] = state
+    return state
+
+
+def _okr_invalidate_cycle_state(company_id: int, cycle_id: int):
+    """Estrutura do ciclo mudou (objetivo/KR/link/settings): recarrega e rematerializa tudo."""
+    with _OKR_CYCLE_STATE_LOCK:
+        _OKR_CYCLE_STATE.pop((int(company_id), int(cycle_id)), None)
+    try:
+        _okr_materialize_progress(company_id, cycle_id)
+    except Exception as e:
+        print("[OKR_PROGRESS] erro ao rematerializar ciclo:", e)
+
+
+def _okr_materialize_progress(company_id: int, cycle_id: int, kr_ids=None):
+    """
+    Recalcula e grava o progresso de kr_ids (None = ciclo inteiro) e dos
+    objetivos a que eles pertencem. Retorna as linhas gravadas.
+    """
+    state = _okr_cycle_state(company_id, cycle_id)
+    data = state["data"]
+
+    if kr_ids is None:
+        scoped = data
+    else:
+        objective_by_kr = state["index"]["objective_by_kr"]
+        objective_ids = {objective_by_kr.get(int(k)) for k in kr_ids if int(k) in objective_by_kr}
+        if not objective_ids:
+            return []
+        scoped = {
+            **data,
+            "objectives": [o for o in data["objectives"] if o.get("id") in objective_ids],
+            "krs": [k for k in data["krs"] if k.get("objective_id") in objective_ids],
+        }
+
+    rollup = _okr_compute_rollup(scoped)
+    now_iso = datetime.now(timezone.utc).isoformat()
+    rows = []
+    for obj in rollup["objectives"]:
+        rows.append({
+            "company_id": company_id,
+            "cycle_id": cycle_id,
+            "entity_type": "OBJECTIVE",
+            "entity_id": int(obj["id"]),
+            "progress_percent": obj["progress_percent"],
+            "progress_percent_auto": None,
+            "progress_effective": obj["progress_percent"],
+            "updated_at": now_iso,
+        })
+        for kr in obj["key_results"]:
+            rows.append({
+                "company_id": company_id,
+                "cycle_id": cycle_id,
+                "entity_type": "KR",
+                "entity_id": int(kr["id"]),
+                "progress_percent": kr["progress_percent"],
+                "progress_percent_auto": kr["progress_percent_auto"],
+                "progress_effective": kr["progress_effective"],
+                "updated_at": now_iso,
+            })
+
+    if rows:
+        supabase.table(OKR_PROGRESS_TABLE).upsert(rows, on_conflict="entity_type,entity_id").execute()
+    if kr_ids is None:
+        # Ciclo inteiro: o que não foi regravado agora é de KR/objetivo removido.
+        (
+            supabase.table(OKR_PROGRESS_TABLE)
+            .delete()
+            .eq("company_id", company_id)
+            .eq("cycle_id", cycle_id)
+            .lt("updated_at", now_iso)
+            .execute()
+        )
+    return rows
+
+
+def _okr_progress_on_checkpoint(company_id: int, cycle_id: int, checkpoint: dict):
+    _okr_progress_on_checkpoints(company_id, cycle_id, [checkpoint])
+
+
+def _okr_progress_on_checkpoints(company_id: int, cycle_id: int, checkpoints: list):
+    if not checkpoints:
+        return
+    try:
+        state = _okr_cycle_state(company_id, cycle_id)
+        saved_keys = {(int(cp["kr_id"]), cp.get("competence")) for cp in checkpoints}
+        with _OKR_CYCLE_STATE_LOCK:
+            cps = [
+                cp for cp in state["data"]["checkpoints"]
+                if (cp.get("kr_id"), cp.get("competence")) not in saved_keys
+            ]
+            cps.extend(checkpoints)
+            cps.sort(key=lambda cp: str(cp.get("competence") or ""), reverse=True)
+            state["data"]["checkpoints"] = cps
+        _okr_materialize_progress(company_id, cycle_id, {k for k, _ in saved_keys})
+    except Exception as e:
+        print("[OKR_PROGRESS] erro ao atualizar progresso do checkpoint:", e)
+
+
+def _okr_progress_on_individual_goals(goal_ids):
+    """Rating de metas individuais mudou: recalcula só os KRs que dependem delas."""
+    goal_ids = sorted({int(g) for g in (goal_ids or []) if g is not None})
+    if not goal_ids:
+        return
+    try:
+        affected = {}
+        for i in range(0, len(goal_ids), OKR_IN_CHUNK_SIZE):
+            rows = (
+                supabase.table("okr_links")
+                .select("company_id,cycle_id")
+                .eq("link_type", "INDIVIDUAL_GOAL_TO_KR")
+                .in_("from_individual_goal_id", goal_ids[i:i + OKR_IN_CHUNK_SIZE])
+                .execute()
+            ).data or []
+            for r in rows:
+                affected[(int(r["company_id"]), int(r["cycle_id"]))] = True
+        if not affected:
+            return
+
+        fresh = {int(g["id"]): g for g in _okr_select_in("individual_goals", "id,employee_id,goal_name,weight,rating", goal_ids)}
+
+        for company_id, cycle_id in affected:
+            state = _okr_cycle_state(company_id, cycle_id)
+            kr_ids = set()
+            for gid in goal_ids:
+                kr_ids |= state["index"]["krs_by_individual_goal"].get(gid, set())
+            with _OKR_CYCLE_STATE_LOCK:
+                goals = [g for g in state["data"]["individual_goals"] if int(g["id"]) not in goal_ids]
+                goals.extend(g for gid, g in fresh.items() if gid in state["index"]["krs_by_individual_goal"])
+                state["data"]["individual_goals"] = goals
+            if kr_ids:
+                _okr_materialize_progress(company_id, cycle_id, kr_ids)
+    except Exception as e:
+        print("[OKR_PROGRESS] erro ao atualizar progresso das metas:", e)
+
+
+@app.route("/api/okr/progress", methods=["GET"])
+def api_okr_progress_materialized():
+    """
+    GET /api/okr/progress?company_id=1&cycle_id=1[&entity_type=KR]
+    Progresso materializado do ciclo (um select). Se o ciclo ainda não foi
+    materializado, calcula e grava na primeira leitura.
+    """
+    try:
+        company_id = request.args.get("company_id", type=int)
+        cycle_id = request.args.get("cycle_id", type=int)
+        entity_type = (request.args.get("entity_type") or "").strip().upper()
+        if not company_id or not cycle_id:
+            return jsonify({"error": "company_id e cycle_id obrigatórios"}), 400
+
+        q = (
+            supabase.table(OKR_PROGRESS_TABLE)
+            .select("*")
+            .eq("company_id", company_id)
+            .eq("cycle_id", cycle_id)
+        )
+        if entity_type:
+            q = q.eq("entity_type", entity_type)
+        rows = q.execute().data or []
+
+        if not rows:
+            rows = _okr_materialize_progress(company_id, cycle_id)
+            if entity_type:
+                rows = [r for r in rows if r["entity_type"] == entity_type]
+
+        return jsonify({"company_id": company_id, "cycle_id": cycle_id, "items": rows}), 200
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
 def _build_company_tree(rows):
     """
     rows: lista de dicts de okr_companies
@@ -6768,6 +8443,392 @@ def _apply_movements_to_snapshot(base_snapshot: list, movements: list):
     return snapshot
 
 
+# ---------- Motor de estado mensal (checkpoint + deltas) ----------
+# Estado da competência = MONTH_SNAPSHOT (ou replay do mês anterior) + CREATE/UPDATE.
+# A marca d'água (through_changed_at) é o maior changed_at efetivamente lido,
+# nunca o relógio local; os deltas são relidos com uma janela de sobreposição
+# (changed_at é carimbado antes do insert e os hosts não têm o mesmo relógio)
+# e o conjunto `seen` descarta o que já foi aplicado. Um movimento novo com
+# changed_at até a marca d'água chegou fora de ordem: o replay é refeito do
+# zero, como em _build_employee_state.
+# Checkpoints ficam em employee_state_checkpoints (uma linha por competência:
+# competence PK, through_changed_at, state jsonb, updated_at), gravados só
+# pelos caminhos de escrita de colaboradores; o GET apenas lê. O state do
+# checkpoint guarda só o snapshot, a marca d'água e as chaves dos movimentos
+# dentro da janela de sobreposição (os movimentos da resposta são relidos).
+EMPLOYEE_STATE_MOVEMENT_ACTIONS = ['CREATE', 'UPDATE']
+EMPLOYEE_STATE_CHECKPOINT_TABLE = 'employee_state_checkpoints'
+EMPLOYEE_STATE_OVERLAP_SECONDS = 300
+EMPLOYEE_STATE_CHECKPOINT_INTERVAL_SECONDS = 300
+EMPLOYEE_STATE_PAGE_SIZE = 1000
+EMPLOYEE_STATE_CACHE_MAX_MONTHS = 24
+EMPLOYEE_STATE_CACHE_TTL_SECONDS = 600
+_EMPLOYEE_STATE_CACHE = OrderedDict()  # competence -> (monotonic, estado com movimentos)
+_EMPLOYEE_STATE_CHECKPOINTED_AT = {}  # competence -> monotonic do último checkpoint gravado
+_EMPLOYEE_STATE_LOCK = threading.Lock()
+
+
+def _previous_month(comp: _date) -> _date:
+    if comp.month == 1:
+        return comp.replace(year=comp.year - 1, month=12, day=1)
+    return comp.replace(month=comp.month - 1, day=1)
+
+
+def _next_month(comp: _date) -> _date:
+    if comp.month == 12:
+        return comp.replace(year=comp.year + 1, month=1, day=1)
+    return comp.replace(month=comp.month + 1, day=1)
+
+
+def _history_json(value):
+    """employee_history.data pode vir como dict ou string JSON."""
+    if isinstance(value, str):
+        try:
+            value = json.loads(value) if value else {}
+        except Exception:
+            return None
+    return value if isinstance(value, dict) else None
+
+
+def _month_snapshot_rows_with_mark(comp: _date):
+    """
+    Linhas MONTH_SNAPSHOT da competência já no formato do frontend, mais o
+    maior changed_at lido (marca usada para detectar um snapshot novo).
+    """
+    out = []
+    mark = None
+    offset = 0
+    while True:
+        page = (
+            supabase.table('employee_history')
+            .select('employee_id, changed_at, data')
+            .eq('competence', comp.isoformat())
+            .eq('action', 'MONTH_SNAPSHOT')
+            .order('id', desc=False)
+            .range(offset, offset + EMPLOYEE_STATE_PAGE_SIZE - 1)
+            .execute()
+        ).data or []
+        for row in page:
+            changed_at = str(row.get('changed_at') or '')
+            if changed_at and (mark is None or changed_at > mark):
+                mark = changed_at
+            d = _history_json(row.get('data'))
+            if d is None:
+                continue
+            d = dict(d)
+            d['employee_id'] = row.get('employee_id')
+            if d.get('id') is None:
+                d['id'] = row.get('employee_id')
+            out.append(d)
+        if len(page) < EMPLOYEE_STATE_PAGE_SIZE:
+            return out, mark
+        offset += EMPLOYEE_STATE_PAGE_SIZE
+
+
+def _load_month_snapshot_rows(comp: _date):
+    """Lê as linhas MONTH_SNAPSHOT da competência já no formato do frontend."""
+    return _month_snapshot_rows_with_mark(comp)[0]
+
+
+def _load_history_changes(competences: list, actions: list, since: str | None = None):
+    """Lê employee_history em lotes de 1000, ordenado por changed_at."""
+    rows = []
+    offset = 0
+    while True:
+        q = (
+            supabase.table('employee_history')
+            .select('employee_id, competence, action, changed_at, changed_by, data')
+            .in_('competence', competences)
+            .in_('action', actions)
+        )
+        if since:
+            q = q.gt('changed_at', since)
+        page = (
+            q.order('changed_at', desc=False)
+            .order('id', desc=False)
+            .range(offset, offset + EMPLOYEE_STATE_PAGE_SIZE - 1)
+            .execute()
+        ).data or []
+        rows.extend(page)
+        if len(page) < EMPLOYEE_STATE_PAGE_SIZE:
+            break
+        offset += EMPLOYEE_STATE_PAGE_SIZE
+    return rows
+
+
+def _state_overlap_since(watermark):
+    """Marca d'água recuada pela janela de sobreposição (None = ler tudo)."""
+    if not watermark:
+        return None
+    try:
+        moment = datetime.fromisoformat(str(watermark).replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    return (moment - timedelta(seconds=EMPLOYEE_STATE_OVERLAP_SECONDS)).isoformat()
+
+
+def _max_changed_at(*values):
+    values = [str(v) for v in values if v]
+    return max(values) if values else None
+
+
+def _history_movement(row):
+    d = _history_json(row.get('data'))
+    return {
+        'employee_id': row.get('employee_id'),
+        'action': row.get('action'),
+        'changed_at': row.get('changed_at'),
+        'changed_by': row.get('changed_by'),
+        'data': d or {},
+        'previous_data': None
+    }
+
+
+def _replay_movements(base: dict, movements: list):
+    """CREATE substitui o estado do colaborador; UPDATE mescla campos não nulos."""
+    for m in movements:
+        eid = m.get('employee_id')
+        data = m.get('data') or {}
+        if eid is None:
+            continue
+        if m.get('action') != 'CREATE' and eid in base:
+            base[eid] = {**base[eid], **{k: v for k, v in data.items() if v is not None}}
+            continue
+        data = dict(data)
+        data['id'] = data.get('id') or eid
+        data['employee_id'] = eid
+        base[eid] = data
+    return base
+
+
+def _build_employee_state(comp: _date):
+    """
+    Estado completo da competência:
+    - MONTH_SNAPSHOT gravado, quando existir;
+    - senão, vigentes = MONTH_SNAPSHOT do mês anterior + CREATE/UPDATE do mês.
+    """
+    comp_iso = comp.isoformat()
+    snapshot, mark = _month_snapshot_rows_with_mark(comp)
+    snapshot_marks = {comp_iso: mark} if mark else {}
+    movements = [
+        _history_movement(row)
+        for row in _load_history_changes([comp_iso], EMPLOYEE_STATE_MOVEMENT_ACTIONS)
+    ]
+    source = 'month_snapshot' if snapshot else 'empty'
+    if not snapshot and movements:
+        previous = _previous_month(comp)
+        base_rows, previous_mark = _month_snapshot_rows_with_mark(previous)
+        if previous_mark:
+            snapshot_marks[previous.isoformat()] = previous_mark
+        base = {row['employee_id']: row for row in base_rows if row.get('employee_id') is not None}
+        snapshot = list(_replay_movements(base, movements).values())
+        source = 'replay'
+    return {
+        'competence': comp_iso,
+        'source': source,
+        'through_changed_at': _max_changed_at(*[m.get('changed_at') for m in movements]),
+        'snapshot_marks': snapshot_marks,
+        'snapshot': snapshot,
+        'movements': movements
+    }
+
+
+def _has_new_month_snapshot(comp: _date, state: dict) -> bool:
+    """
+    Algum MONTH_SNAPSHOT que o estado não leu? Só importam o da competência e,
+    no replay, o do mês anterior (base do replay). Uma consulta limit(1) por mês.
+    """
+    competences = [comp]
+    if state.get('source') == 'replay':
+        competences.append(_previous_month(comp))
+    marks = state.get('snapshot_marks') or {}
+    for c in competences:
+        mark = marks.get(c.isoformat())
+        q = (
+            supabase.table('employee_history')
+            .select('changed_at')
+            .eq('competence', c.isoformat())
+            .eq('action', 'MONTH_SNAPSHOT')
+        )
+        if mark:
+            q = q.gt('changed_at', mark)
+        if q.limit(1).execute().data:
+            return True
+    return False
+
+
+def _movement_key(m):
+    return (m.get('employee_id'), m.get('action'), m.get('changed_at'))
+
+
+def _apply_employee_state_delta(state: dict, movements: list, delta: list):
+    """
+    Estado com `delta` aplicado. None quando é preciso reconstruir: snapshot
+    vazio ou movimento fora de ordem (changed_at até a marca d'água) num replay.
+    """
+    if not delta:
+        return {**state, 'movements': movements}
+    source = state.get('source')
+    if source == 'empty':
+        return None
+    through = state.get('through_changed_at')
+    snapshot = state.get('snapshot') or []
+    if source == 'replay':
+        if through and any(str(m.get('changed_at') or '') <= str(through) for m in delta):
+            return None
+        base = {row.get('employee_id'): dict(row) for row in snapshot if row.get('employee_id') is not None}
+        snapshot = list(_replay_movements(base, delta).values())
+
+    return {
+        **state,
+        'through_changed_at': _max_changed_at(through, *[m.get('changed_at') for m in delta]),
+        'snapshot': snapshot,
+        'movements': sorted(movements + delta, key=lambda m: str(m.get('changed_at') or ''))
+    }
+
+
+def _advance_employee_state(comp: _date, state: dict):
+    """
+    Aplica só os movimentos gravados a partir da marca d'água (menos a janela
+    de sobreposição). Retorna None quando um MONTH_SNAPSHOT novo ou um
+    movimento fora de ordem exige reconstrução.
+    """
+    if _has_new_month_snapshot(comp, state):
+        return None
+
+    changes = _load_history_changes(
+        [comp.isoformat()],
+        EMPLOYEE_STATE_MOVEMENT_ACTIONS,
+        since=_state_overlap_since(state.get('through_changed_at'))
+    )
+    movements = state.get('movements') or []
+    seen = {_movement_key(m) for m in movements}
+    delta = [_history_movement(row) for row in changes if _movement_key(row) not in seen]
+    return _apply_employee_state_delta(state, movements, delta)
+
+
+def _resume_employee_state(comp: _date, checkpoint: dict):
+    """
+    Checkpoint -> estado completo. Relê os movimentos da competência (a resposta
+    os devolve); os que o snapshot do checkpoint ainda não cobre viram delta.
+    """
+    if _has_new_month_snapshot(comp, checkpoint):
+        return None
+    movements = [
+        _history_movement(row)
+        for row in _load_history_changes([comp.isoformat()], EMPLOYEE_STATE_MOVEMENT_ACTIONS)
+    ]
+    # sem marca d'água o checkpoint não cobriu movimento nenhum
+    since = _state_overlap_since(checkpoint.get('through_changed_at'))
+    covered = {tuple(key) for key in checkpoint.get('overlap_keys') or []}
+    applied, delta = [], []
+    for m in movements:
+        pending = since is None or (
+            str(m.get('changed_at') or '') >= since and _movement_key(m) not in covered
+        )
+        (delta if pending else applied).append(m)
+    return _apply_employee_state_delta(checkpoint, applied, delta)
+
+
+def _load_employee_state_checkpoint(comp: _date):
+    try:
+        rows = (
+            supabase.table(EMPLOYEE_STATE_CHECKPOINT_TABLE)
+            .select('state')
+            .eq('competence', comp.isoformat())
+            .limit(1)
+            .execute()
+        ).data or []
+        return _history_json(rows[0].get('state')) if rows else None
+    except Exception as e:
+        print('[employee-history] erro _load_employee_state_checkpoint:', e)
+        return None
+
+
+def _get_employee_month_state(comp: _date):
+    """
+    Estado da competência servido de memória (LRU com TTL) ou do checkpoint;
+    só os deltas desde a marca d'água são aplicados. Não grava nada.
+    """
+    comp_iso = comp.isoformat()
+    now = time.monotonic()
+    with _EMPLOYEE_STATE_LOCK:
+        hit = _EMPLOYEE_STATE_CACHE.get(comp_iso)
+    # o TTL conta da última carga completa, não de cada avanço
+    loaded_at = now
+    state = None
+    if hit and now - hit[0] < EMPLOYEE_STATE_CACHE_TTL_SECONDS:
+        state = _advance_employee_state(comp, hit[1])
+        if state is not None:
+            loaded_at = hit[0]
+    else:
+        checkpoint = _load_employee_state_checkpoint(comp)
+        if checkpoint:
+            state = _resume_employee_state(comp, checkpoint)
+    if state is None:
+        state = _build_employee_state(comp)
+
+    with _EMPLOYEE_STATE_LOCK:
+        _EMPLOYEE_STATE_CACHE[comp_iso] = (loaded_at, state)
+        _EMPLOYEE_STATE_CACHE.move_to_end(comp_iso)
+        while len(_EMPLOYEE_STATE_CACHE) > EMPLOYEE_STATE_CACHE_MAX_MONTHS:
+            _EMPLOYEE_STATE_CACHE.popitem(last=False)
+    return state
+
+
+def _employee_state_checkpoint(state: dict) -> dict:
+    """Recorte gravado no checkpoint: snapshot, marcas e chaves da janela de sobreposição."""
+    since = _state_overlap_since(state.get('through_changed_at'))
+    return {
+        'competence': state.get('competence'),
+        'source': state.get('source'),
+        'through_changed_at': state.get('through_changed_at'),
+        'snapshot_marks': state.get('snapshot_marks') or {},
+        'snapshot': state.get('snapshot') or [],
+        'overlap_keys': [
+            list(_movement_key(m))
+            for m in state.get('movements') or []
+            if since is not None and str(m.get('changed_at') or '') >= since
+        ]
+    }
+
+
+def _refresh_employee_state_checkpoint(comp: _date, force: bool = False):
+    """
+    Chamado depois de gravar movimentos: atualiza o checkpoint da competência
+    (no máximo um a cada EMPLOYEE_STATE_CHECKPOINT_INTERVAL_SECONDS por worker).
+    """
+    comp_iso = comp.isoformat()
+    now = time.monotonic()
+    with _EMPLOYEE_STATE_LOCK:
+        last = _EMPLOYEE_STATE_CHECKPOINTED_AT.get(comp_iso)
+        if not force and last is not None and now - last < EMPLOYEE_STATE_CHECKPOINT_INTERVAL_SECONDS:
+            return
+        _EMPLOYEE_STATE_CHECKPOINTED_AT[comp_iso] = now
+    try:
+        state = _get_employee_month_state(comp)
+        supabase.table(EMPLOYEE_STATE_CHECKPOINT_TABLE).upsert({
+            'competence': comp_iso,
+            'through_changed_at': state.get('through_changed_at'),
+            'state': _employee_state_checkpoint(state),
+            'updated_at': datetime.now(timezone.utc).isoformat()
+        }, on_conflict='competence').execute()
+    except Exception as e:
+        print('[employee-history] erro _refresh_employee_state_checkpoint:', e)
+
+
+def _invalidate_employee_state(comp: _date):
+    """Fechar/reabrir mexe em MONTH_SNAPSHOT: descarta o mês e o seguinte (que usa o anterior como base)."""
+    for c in (comp, _next_month(comp)):
+        with _EMPLOYEE_STATE_LOCK:
+            _EMPLOYEE_STATE_CACHE.pop(c.isoformat(), None)
+            _EMPLOYEE_STATE_CHECKPOINTED_AT.pop(c.isoformat(), None)
+        try:
+            supabase.table(EMPLOYEE_STATE_CHECKPOINT_TABLE).delete().eq('competence', c.isoformat()).execute()
+        except Exception as e:
+            print('[employee-history] erro _invalidate_employee_state:', e)
+
+
 @app.route('/api/employee-history', methods=['GET'])
 def api_employee_history():
     """
@@ -6776,6 +8837,8 @@ def api_employee_history():
     Retorna:
     - snapshot: MONTH_SNAPSHOT da competência OU, se vazio, vigentes = mês anterior + movimentos do mês
     - movements: CREATE e UPDATE da competência
+
+    O estado vem de _get_employee_month_state (memória / checkpoint + deltas).
     """
     try:
         comp_str = (request.args.get('competence') or '').strip()
@@ -6789,144 +8852,255 @@ def api_employee_history():
         except (ValueError, TypeError):
             return jsonify({'error': 'competence inválida'}), 400
 
-        comp_iso = comp.isoformat()
+        cached = _immutable_cache_get('employee_history', {'competence': comp.isoformat()})
+        if cached is not None:
+            return jsonify(cached), 200
 
-        # 1) Snapshot: MONTH_SNAPSHOT da competência
-        snapshot = []
-        try:
-            r_snap = (
-                supabase.table('employee_history')
-                .select('employee_id, data')
-                .eq('competence', comp_iso)
-                .eq('action', 'MONTH_SNAPSHOT')
+        state = _get_employee_month_state(comp)
+        result = {
+            'competence': comp.isoformat(),
+            'snapshot': state.get('snapshot') or [],
+            'movements': state.get('movements') or []
+        }
+
+        if _is_competence_closed(comp):
+            _immutable_cache_set('employee_history', {'competence': comp.isoformat()}, result, [f'competence:{comp.isoformat()}'])
+
+        return jsonify(result), 200
+
+    except Exception as e:
+        return jsonify({'error': 'HISTORY_FAILED', 'details': str(e)}), 500
+
+# ===================== Read model da avaliação (summary/readonly) =====================
+# As duas telas leem o mesmo documento. Em vez da cadeia sequencial
+# avaliação → profissional → workflow → respostas → critérios → metas,
+# tudo que depende só do evaluation_id sai numa leva paralela e o que
+# depende do resultado (profissional e critérios) numa segunda leva.
+EVALUATION_READ_MODEL_WORKERS = 4
+
+EVALUATION_SUMMARY_COLUMNS = (
+    'id, employee_id, evaluator_id, evaluation_year, evaluation_date, status, '
+    'final_rating, nine_box_position, performance_rating, potential_rating, '
+    'round_code, cliente_id, empresa_id, filial_id, modelo_avaliacao_id, '
+    'versao_modelo_id, ciclo_avaliacao_id, evaluation_origem_id, created_at'
+)
+EVALUATION_READONLY_COLUMNS = EVALUATION_SUMMARY_COLUMNS + ', dimension_weights, dimension_averages, goals_average, metas_avg'
+EVALUATION_EMPLOYEE_COLUMNS = (
+    'id, nome, cargo, empresa, company_name, branch_name, department_name, '
+    'manager_name, email, emailLider, employee_code, manager_code, '
+    'holding, business_line, nivel, cliente_id, holding_id, empresa_id, filial_id'
+)
+EVALUATION_RATING_LABELS = {
+    1: 'Excelente',
+    2: 'Superou',
+    3: 'Atendeu',
+    4: 'Não Atendeu',
+    5: 'Insuficiente'
+}
+
+
+def _first_row(query):
+    rows = query.limit(1).execute().data or []
+    return rows[0] if rows else None
+
+
+def _load_evaluation_read_model(evaluation_id: int, include_details: bool = True) -> dict:
+    """
+    Carrega avaliação, workflow, profissional e (se include_details) respostas,
+    critérios e metas em duas levas paralelas.
+    """
+    loaders = {
+        'evaluation': lambda: _first_row(
+            supabase.table('evaluations')
+            .select(EVALUATION_READONLY_COLUMNS if include_details else EVALUATION_SUMMARY_COLUMNS)
+            .eq('id', evaluation_id)
+        ),
+        'workflow': lambda: _first_row(
+            supabase.table('evaluation_workflows')
+            .select('*')
+            .eq('evaluation_id', evaluation_id)
+        ),
+    }
+    if include_details:
+        loaders['responses'] = lambda: (
+            supabase.table('evaluation_responses')
+            .select(
+                'id, evaluation_id, criteria_id, rating, goal_id, manager_comment, '
+                'peso_usado, eixo_9box_usado, afirmativa_avaliacao_id'
+            )
+            .eq('evaluation_id', evaluation_id)
+            .order('id', desc=False)
+            .execute()
+            .data or []
+        )
+        loaders['goals'] = lambda: (
+            supabase.table('individual_goals')
+            .select(
+                'id, evaluation_id, employee_id, round_code, goal_name, goal_description, '
+                'weight, rating, rating_1_criteria, rating_2_criteria, rating_3_criteria, '
+                'rating_4_criteria, rating_5_criteria, goal_origem_id'
+            )
+            .eq('evaluation_id', evaluation_id)
+            .order('id', desc=False)
+            .execute()
+            .data or []
+        )
+
+    with ContextThreadPoolExecutor(max_workers=EVALUATION_READ_MODEL_WORKERS) as pool:
+        futures = {name: pool.submit(fn) for name, fn in loaders.items()}
+        model = {name: fut.result() for name, fut in futures.items()}
+
+        employee_id = (model.get('evaluation') or model.get('workflow') or {}).get('employee_id')
+        criteria_ids = sorted({
+            r.get('criteria_id')
+            for r in (model.get('responses') or [])
+            if r.get('criteria_id') is not None
+        })
+
+        second = {}
+        if employee_id:
+            second['employee'] = pool.submit(lambda: _first_row(
+                supabase.table('employees')
+                .select(EVALUATION_EMPLOYEE_COLUMNS)
+                .eq('id', employee_id)
+            ))
+        if criteria_ids:
+            second['criteria'] = pool.submit(lambda: (
+                supabase.table('evaluation_criteria')
+                .select('id, dimension, type, name, description, weight')
+                .in_('id', criteria_ids)
                 .execute()
+                .data or []
+            ))
+        for name, fut in second.items():
+            model[name] = fut.result()
+
+    model.setdefault('employee', None)
+    model['criteria_by_id'] = {c.get('id'): c for c in (model.pop('criteria', None) or [])}
+    return model
+
+
+def _serialize_evaluation_summary(evaluation_id: int, model: dict):
+    """Documento do /summary; None quando não há avaliação nem workflow."""
+    evaluation = model.get('evaluation')
+    employee = model.get('employee')
+
+    if evaluation:
+        evaluation = {k.strip(): evaluation.get(k.strip()) for k in EVALUATION_SUMMARY_COLUMNS.split(',')}
+    else:
+        workflow_row = model.get('workflow')
+        if not workflow_row:
+            return None
+
+        # Avaliação ainda não gravada: monta o esqueleto a partir do workflow.
+        employee_id = workflow_row.get('employee_id')
+        round_code = workflow_row.get('round_code')
+
+        rating_ctx = {}
+        if round_code:
+            ratings_by_evaluation_id, ratings_by_employee_id = _get_workflow_rating_context_map(round_code)
+            rating_ctx = (
+                ratings_by_evaluation_id.get(evaluation_id)
+                or ratings_by_employee_id.get(employee_id)
+                or {}
             )
-            for row in (r_snap.data or []):
-                d = row.get('data')
-                if d is None:
-                    continue
-                if isinstance(d, str):
-                    try:
-                        d = json.loads(d)
-                    except Exception:
-                        continue
-                if isinstance(d, dict):
-                    d = dict(d)
-                    d['employee_id'] = row.get('employee_id')
-                    if d.get('id') is None:
-                        d['id'] = row.get('employee_id')
-                    snapshot.append(d)
-        except Exception as e:
-            print('[api_employee_history] snapshot:', e)
 
-        # 2) Movimentações: CREATE e UPDATE da competência (ordenado por data)
-        #    Paginação: buscar em lotes de 1000 para não perder nenhum registro
-        movements = []
-        try:
-            page_size = 1000
-            offset = 0
-            while True:
-                r_mov = (
-                    supabase.table('employee_history')
-                    .select('employee_id, action, changed_at, changed_by, data')
-                    .eq('competence', comp_iso)
-                    .in_('action', ['CREATE', 'UPDATE'])
-                    .order('changed_at', desc=False)
-                    .range(offset, offset + page_size - 1)
-                    .execute()
-                )
-                rows = r_mov.data or []
-                if not rows:
-                    break
-                for row in rows:
-                    d = row.get('data')
-                    if isinstance(d, str):
-                        try:
-                            d = json.loads(d) if d else {}
-                        except Exception:
-                            d = {}
-                    movements.append({
-                        'employee_id': row.get('employee_id'),
-                        'action': row.get('action'),
-                        'changed_at': row.get('changed_at'),
-                        'changed_by': row.get('changed_by'),
-                        'data': d if isinstance(d, dict) else {},
-                        'previous_data': None
-                    })
-                offset += page_size
-            # DEBUG: ver no Render Logs se o Pedro (250) está na resposta
-            _pedro = sum(1 for m in movements if m.get('employee_id') == 250)
-            print(f'[api_employee_history] competence={comp_iso} total_movements={len(movements)} employee_250_count={_pedro}')
-        except Exception as e:
-            print('[api_employee_history] movements:', e)
+        evaluation = {k.strip(): None for k in EVALUATION_SUMMARY_COLUMNS.split(',')}
+        evaluation.update({
+            'id': evaluation_id,
+            'employee_id': employee_id,
+            'final_rating': rating_ctx.get('final_rating'),
+            'nine_box_position': rating_ctx.get('nine_box_position'),
+            'performance_rating': rating_ctx.get('performance_rating'),
+            'potential_rating': rating_ctx.get('potential_rating'),
+            'round_code': round_code,
+            'cliente_id': employee.get('cliente_id') if employee else None,
+            'empresa_id': employee.get('empresa_id') if employee else None,
+            'filial_id': employee.get('filial_id') if employee else None,
+        })
 
-        # 3) Só vigentes quando o mês NÃO tem snapshot no DB E tem movimentos.
-        #    Dez = 70 (tem snapshot). Jan = 73 (sem snapshot no DB + tem CREATE/UPDATE). Fev = 0 (sem snapshot, sem movimentos).
-        if not snapshot and movements:
-            try:
-                if comp.month == 1:
-                    comp_prev = comp.replace(year=comp.year - 1, month=12, day=1)
-                else:
-                    comp_prev = comp.replace(month=comp.month - 1, day=1)
-                comp_prev_iso = comp_prev.isoformat()
-
-                r_prev = (
-                    supabase.table('employee_history')
-                    .select('employee_id, data')
-                    .eq('competence', comp_prev_iso)
-                    .eq('action', 'MONTH_SNAPSHOT')
-                    .execute()
-                )
-                base = {}
-                for row in (r_prev.data or []):
-                    d = row.get('data')
-                    if d is None:
-                        continue
-                    if isinstance(d, str):
-                        try:
-                            d = json.loads(d)
-                        except Exception:
-                            continue
-                    if isinstance(d, dict):
-                        eid = row.get('employee_id')
-                        if eid is not None:
-                            d = dict(d)
-                            d['id'] = d.get('id') or eid
-                            d['employee_id'] = eid
-                            base[eid] = d
-
-                for m in movements:
-                    eid = m.get('employee_id')
-                    data = m.get('data') or {}
-                    if eid is None:
-                        continue
-                    if m.get('action') == 'CREATE':
-                        data = dict(data)
-                        data['id'] = data.get('id') or eid
-                        data['employee_id'] = eid
-                        base[eid] = data
-                    else:
-                        if eid in base:
-                            base[eid] = {**base[eid], **{k: v for k, v in data.items() if v is not None}}
-                        else:
-                            data = dict(data)
-                            data['id'] = data.get('id') or eid
-                            data['employee_id'] = eid
-                            base[eid] = data
-
-                snapshot = list(base.values())
-            except Exception as e:
-                print('[api_employee_history] vigentes:', e)
-        # Se não tem movimentos (ex.: fev), snapshot fica o que veio do DB (vazio) = 0.
+    return {
+        'success': True,
+        'evaluation': evaluation,
+        'employee': employee
+    }
+
+
+def _serialize_evaluation_readonly(model: dict):
+    """Documento do /readonly; None quando a avaliação não existe."""
+    evaluation = model.get('evaluation')
+    if not evaluation:
+        return None
+
+    criteria_by_id = model.get('criteria_by_id') or {}
+
+    responses_readonly = []
+    for resp in (model.get('responses') or []):
+        criteria_id = resp.get('criteria_id')
+        crit = criteria_by_id.get(criteria_id) or {}
+        rating = resp.get('rating')
+
+        responses_readonly.append({
+            'response_id': resp.get('id'),
+            'criteria_id': criteria_id,
+            'dimension': crit.get('dimension') or '-',
+            'type': crit.get('type') or '-',
+            'name': crit.get('name') or '',
+            'description': crit.get('description') or '',
+            'weight': crit.get('weight'),
+            'rating': rating,
+            'rating_label': EVALUATION_RATING_LABELS.get(rating, ''),
+            'manager_comment': resp.get('manager_comment') or '',
+            'peso_usado': resp.get('peso_usado'),
+            'eixo_9box_usado': resp.get('eixo_9box_usado')
+        })
+
+    goals_readonly = []
+    for goal in (model.get('goals') or []):
+        goal_rating = goal.get('rating')
+
+        goals_readonly.append({
+            'goal_id': goal.get('id'),
+            'goal_name': goal.get('goal_name') or '',
+            'goal_description': goal.get('goal_description') or '',
+            'weight': goal.get('weight'),
+            'rating': goal_rating,
+            'rating_label': EVALUATION_RATING_LABELS.get(goal_rating, ''),
+            'rating_1_criteria': goal.get('rating_1_criteria') or '',
+            'rating_2_criteria': goal.get('rating_2_criteria') or '',
+            'rating_3_criteria': goal.get('rating_3_criteria') or '',
+            'rating_4_criteria': goal.get('rating_4_criteria') or '',
+            'rating_5_criteria': goal.get('rating_5_criteria') or '',
+            'goal_origem_id': goal.get('goal_origem_id')
+        })
+
+    # Agrupar por dimensão para facilitar o front
+    dimensions = {}
+    for item in responses_readonly:
+        dimensions.setdefault(item.get('dimension') or '-', []).append(item)
+
+    calculation_summary = {
+        'dimension_weights': evaluation.get('dimension_weights'),
+        'dimension_averages': evaluation.get('dimension_averages'),
+        'goals_average': evaluation.get('goals_average'),
+        'metas_avg': evaluation.get('metas_avg'),
+        'final_rating': evaluation.get('final_rating'),
+        'performance_rating': evaluation.get('performance_rating'),
+        'potential_rating': evaluation.get('potential_rating'),
+        'nine_box_position': evaluation.get('nine_box_position')
+    }
 
-        return jsonify({
-            'competence': comp_iso,
-            'snapshot': snapshot,
-            'movements': movements
-        }), 200
+    return {
+        'success': True,
+        'evaluation': evaluation,
+        'employee': model.get('employee'),
+        'workflow': model.get('workflow'),
+        'responses_readonly': responses_readonly,
+        'dimensions': dimensions,
+        'goals_readonly': goals_readonly,
+        'calculation_summary': calculation_summary
+    }
 
-    except Exception as e:
-        return jsonify({'error': 'HISTORY_FAILED', 'details': str(e)}), 500
 
 @app.route('/api/evaluations/<int:evaluation_id>/summary', methods=['GET', 'OPTIONS'])
 def api_get_evaluation_summary(evaluation_id):
@@ -6954,128 +9128,29 @@ def api_get_evaluation_summary(evaluation_id):
         if not access_ok:
             return error_response, error_status
 
-        r_eval = (
-            supabase
-            .table('evaluations')
-            .select(
-                'id, employee_id, evaluator_id, evaluation_year, evaluation_date, status, '
-                'final_rating, nine_box_position, performance_rating, potential_rating, '
-                'round_code, cliente_id, empresa_id, filial_id, modelo_avaliacao_id, '
-                'versao_modelo_id, ciclo_avaliacao_id, evaluation_origem_id, created_at'
-            )
-            .eq('id', evaluation_id)
-            .limit(1)
-            .execute()
-        )
-
-        rows = r_eval.data or []
-
-        if not rows:
-            r_workflow = (
-                supabase
-                .table('evaluation_workflows')
-                .select('evaluation_id, employee_id, round_code')
-                .eq('evaluation_id', evaluation_id)
-                .limit(1)
-                .execute()
-            )
-
-            workflow_rows = r_workflow.data or []
-            if workflow_rows:
-                workflow_row = workflow_rows[0]
-                employee_id = workflow_row.get('employee_id')
-                round_code = workflow_row.get('round_code')
-                employee = None
-
-                if employee_id:
-                    r_emp = (
-                        supabase
-                        .table('employees')
-                        .select(
-                            'id, nome, cargo, empresa, company_name, branch_name, department_name, '
-                            'manager_name, email, emailLider, employee_code, manager_code, '
-                            'holding, business_line, nivel, cliente_id, holding_id, empresa_id, filial_id'
-                        )
-                        .eq('id', employee_id)
-                        .limit(1)
-                        .execute()
-                    )
-
-                    emp_rows = r_emp.data or []
-                    employee = emp_rows[0] if emp_rows else None
+        cached = _immutable_cache_get('evaluation_summary', {'evaluation_id': evaluation_id})
+        if cached is not None:
+            return jsonify(cached), 200
 
-                rating_ctx = {}
-                if round_code:
-                    ratings_by_evaluation_id, ratings_by_employee_id = _get_workflow_rating_context_map(round_code)
-                    rating_ctx = (
-                        ratings_by_evaluation_id.get(evaluation_id)
-                        or ratings_by_employee_id.get(employee_id)
-                        or {}
-                    )
-
-                evaluation = {
-                    'id': evaluation_id,
-                    'employee_id': employee_id,
-                    'evaluator_id': None,
-                    'evaluation_year': None,
-                    'evaluation_date': None,
-                    'status': None,
-                    'final_rating': rating_ctx.get('final_rating'),
-                    'nine_box_position': rating_ctx.get('nine_box_position'),
-                    'performance_rating': rating_ctx.get('performance_rating'),
-                    'potential_rating': rating_ctx.get('potential_rating'),
-                    'round_code': round_code,
-                    'cliente_id': employee.get('cliente_id') if employee else None,
-                    'empresa_id': employee.get('empresa_id') if employee else None,
-                    'filial_id': employee.get('filial_id') if employee else None,
-                    'modelo_avaliacao_id': None,
-                    'versao_modelo_id': None,
-                    'ciclo_avaliacao_id': None,
-                    'evaluation_origem_id': None,
-                    'created_at': None
-                }
-
-                return jsonify({
-                    'success': True,
-                    'evaluation': evaluation,
-                    'employee': employee
-                }), 200
+        model = _load_evaluation_read_model(evaluation_id, include_details=False)
+        result = _serialize_evaluation_summary(evaluation_id, model)
 
-        if not rows:
+        if result is None:
             return jsonify({
                 'success': False,
                 'error': 'avaliacao_nao_encontrada',
                 'message': 'Avaliação não encontrada.'
             }), 404
 
-        evaluation = rows[0]
-
-        # 2) Buscar dados do profissional avaliado
-        employee = None
-        employee_id = evaluation.get('employee_id')
-
-        if employee_id:
-            r_emp = (
-                supabase
-                .table('employees')
-                .select(
-                    'id, nome, cargo, empresa, company_name, branch_name, department_name, '
-                    'manager_name, email, emailLider, employee_code, manager_code, '
-                    'holding, business_line, nivel, cliente_id, holding_id, empresa_id, filial_id'
-                )
-                .eq('id', employee_id)
-                .limit(1)
-                .execute()
+        if model.get('evaluation') and _is_final_workflow(model.get('workflow')):
+            _immutable_cache_set(
+                'evaluation_summary',
+                {'evaluation_id': evaluation_id},
+                result,
+                [f'evaluation:{evaluation_id}', 'evaluation:*']
             )
 
-            emp_rows = r_emp.data or []
-            employee = emp_rows[0] if emp_rows else None
-
-        return jsonify({
-            'success': True,
-            'evaluation': evaluation,
-            'employee': employee
-        }), 200
+        return jsonify(result), 200
 
     except Exception as e:
         print('[api_get_evaluation_summary] erro:', e)
@@ -7097,213 +9172,29 @@ def api_get_evaluation_readonly(evaluation_id):
         return ('', 204)
 
     try:
-        # 1) Buscar avaliação
-        r_eval = (
-            supabase
-            .table('evaluations')
-
+        cached = _immutable_cache_get('evaluation_readonly', {'evaluation_id': evaluation_id})
+        if cached is not None:
+            return jsonify(cached), 200
 
-            
-            .select(
-                'id, employee_id, evaluator_id, evaluation_year, evaluation_date, status, '
-                'final_rating, nine_box_position, performance_rating, potential_rating, '
-                'round_code, cliente_id, empresa_id, filial_id, modelo_avaliacao_id, '
-                'versao_modelo_id, ciclo_avaliacao_id, evaluation_origem_id, created_at, '
-                'dimension_weights, dimension_averages, goals_average, metas_avg'
-            )
-
-            
-            .eq('id', evaluation_id)
-            .limit(1)
-            .execute()
-        )
-
-        eval_rows = r_eval.data or []
+        model = _load_evaluation_read_model(evaluation_id)
+        result = _serialize_evaluation_readonly(model)
 
-        if not eval_rows:
+        if result is None:
             return jsonify({
                 'success': False,
                 'error': 'avaliacao_nao_encontrada',
                 'message': 'Avaliação não encontrada.'
             }), 404
 
-        evaluation = eval_rows[0]
-
-        # 2) Buscar profissional
-        employee = None
-        employee_id = evaluation.get('employee_id')
-
-        if employee_id:
-            r_emp = (
-                supabase
-                .table('employees')
-                .select(
-                    'id, nome, cargo, empresa, company_name, branch_name, department_name, '
-                    'manager_name, email, emailLider, employee_code, manager_code, '
-                    'holding, business_line, nivel, cliente_id, holding_id, empresa_id, filial_id'
-                )
-                .eq('id', employee_id)
-                .limit(1)
-                .execute()
-            )
-
-            emp_rows = r_emp.data or []
-            employee = emp_rows[0] if emp_rows else None
-
-        # 3) Buscar workflow
-        workflow = None
-
-        r_wf = (
-            supabase
-            .table('evaluation_workflows')
-            .select('*')
-            .eq('evaluation_id', evaluation_id)
-            .limit(1)
-            .execute()
-        )
-
-        wf_rows = r_wf.data or []
-        workflow = wf_rows[0] if wf_rows else None
-
-        # 4) Buscar respostas da avaliação
-        r_resp = (
-            supabase
-            .table('evaluation_responses')
-            .select(
-                'id, evaluation_id, criteria_id, rating, goal_id, manager_comment, '
-                'peso_usado, eixo_9box_usado, afirmativa_avaliacao_id'
-            )
-            .eq('evaluation_id', evaluation_id)
-            .order('id', desc=False)
-            .execute()
-        )
-
-        responses = r_resp.data or []
-
-        criteria_ids = [
-            r.get('criteria_id')
-            for r in responses
-            if r.get('criteria_id') is not None
-        ]
-
-        # 5) Buscar critérios/afirmações
-        criteria_by_id = {}
-
-        if criteria_ids:
-            r_criteria = (
-                supabase
-                .table('evaluation_criteria')
-                .select('id, dimension, type, name, description, weight')
-                .in_('id', criteria_ids)
-                .execute()
-            )
-
-            for c in (r_criteria.data or []):
-                criteria_by_id[c.get('id')] = c
-
-        # 6) Montar leitura completa
-        responses_readonly = []
-
-        rating_map = {
-            1: 'Excelente',
-            2: 'Superou',
-            3: 'Atendeu',
-            4: 'Não Atendeu',
-            5: 'Insuficiente'
-        }
-
-        for resp in responses:
-            criteria_id = resp.get('criteria_id')
-            crit = criteria_by_id.get(criteria_id) or {}
-
-            rating = resp.get('rating')
-
-            responses_readonly.append({
-                'response_id': resp.get('id'),
-                'criteria_id': criteria_id,
-                'dimension': crit.get('dimension') or '-',
-                'type': crit.get('type') or '-',
-                'name': crit.get('name') or '',
-                'description': crit.get('description') or '',
-                'weight': crit.get('weight'),
-                'rating': rating,
-                'rating_label': rating_map.get(rating, ''),
-                'manager_comment': resp.get('manager_comment') or '',
-                'peso_usado': resp.get('peso_usado'),
-                'eixo_9box_usado': resp.get('eixo_9box_usado')
-            })
-
-
-
-        # 7) Buscar metas individuais da avaliação
-        goals_readonly = []
-
-        r_goals = (
-            supabase
-            .table('individual_goals')
-            .select(
-                'id, evaluation_id, employee_id, round_code, goal_name, goal_description, '
-                'weight, rating, rating_1_criteria, rating_2_criteria, rating_3_criteria, '
-                'rating_4_criteria, rating_5_criteria, goal_origem_id'
+        if _is_final_workflow(model.get('workflow')):
+            _immutable_cache_set(
+                'evaluation_readonly',
+                {'evaluation_id': evaluation_id},
+                result,
+                [f'evaluation:{evaluation_id}', 'evaluation:*']
             )
-            .eq('evaluation_id', evaluation_id)
-            .order('id', desc=False)
-            .execute()
-        )
 
-        goals = r_goals.data or []
-
-        for goal in goals:
-            goal_rating = goal.get('rating')
-
-            goals_readonly.append({
-                'goal_id': goal.get('id'),
-                'goal_name': goal.get('goal_name') or '',
-                'goal_description': goal.get('goal_description') or '',
-                'weight': goal.get('weight'),
-                'rating': goal_rating,
-                'rating_label': rating_map.get(goal_rating, ''),
-                'rating_1_criteria': goal.get('rating_1_criteria') or '',
-                'rating_2_criteria': goal.get('rating_2_criteria') or '',
-                'rating_3_criteria': goal.get('rating_3_criteria') or '',
-                'rating_4_criteria': goal.get('rating_4_criteria') or '',
-                'rating_5_criteria': goal.get('rating_5_criteria') or '',
-                'goal_origem_id': goal.get('goal_origem_id')
-            })
-
-        
-        # 7) Agrupar por dimensão para facilitar o front
-        dimensions = {}
-
-        for item in responses_readonly:
-            dim = item.get('dimension') or '-'
-
-            if dim not in dimensions:
-                dimensions[dim] = []
-
-            dimensions[dim].append(item)
-
-        calculation_summary = {
-            'dimension_weights': evaluation.get('dimension_weights'),
-            'dimension_averages': evaluation.get('dimension_averages'),
-            'goals_average': evaluation.get('goals_average'),
-            'metas_avg': evaluation.get('metas_avg'),
-            'final_rating': evaluation.get('final_rating'),
-            'performance_rating': evaluation.get('performance_rating'),
-            'potential_rating': evaluation.get('potential_rating'),
-            'nine_box_position': evaluation.get('nine_box_position')
-        }
-
-        return jsonify({
-            'success': True,
-            'evaluation': evaluation,
-            'employee': employee,
-            'workflow': workflow,
-            'responses_readonly': responses_readonly,
-            'dimensions': dimensions,
-            'goals_readonly': goals_readonly,
-            'calculation_summary': calculation_summary
-        }), 200
+        return jsonify(result), 200
 
     except Exception as e:
         print('[api_get_evaluation_readonly] erro:', e)
@@ -7499,7 +9390,272 @@ def _is_top_hierarchy_marker(value):
     return str(value or '').strip().upper() == 'GOD'
 
 
-def _resolve_operational_manager_identity(access_rows, cliente_id='', holding_id='', empresa_id='', filial_id=''):
+# ===== Índice gestor -> equipe =====
+# Por contexto: e-mail do líder (emailLider), manager_code e manager_name
+# normalizados -> ids dos profissionais. Recarregado em escritas de employees.
+MANAGER_TEAM_INDEX_TTL_SECONDS = 300
+MANAGER_TEAM_PAGE_SIZE = 1000
+MANAGER_TEAM_EMPLOYEE_COLUMNS = (
+    'id, nome, cargo, empresa, company_name, branch_name, department_name, '
+    'manager_name, email, emailLider, employee_code, manager_code, '
+    'holding, business_line, nivel, cliente_id, holding_id, empresa_id, filial_id'
+)
+EMPLOYEE_MUTATION_ENDPOINTS = {
+    'create_employee',
+    'bulk_create_employees',
+    'update_employee',
+}
+_MANAGER_TEAM_INDEX = {}
+_MANAGER_TEAM_INDEX_LOCK = threading.Lock()
+
+
+def _manager_key(value):
+    return str(value or '').strip().lower()
+
+
+def _manager_team_index(cliente_id='', holding_id='', empresa_id='', filial_id=''):
+    key = (cliente_id, holding_id, empresa_id, filial_id)
+    now = time.monotonic()
+    with _MANAGER_TEAM_INDEX_LOCK:
+        entry = _MANAGER_TEAM_INDEX.get(key)
+        if entry and (now - entry['loaded_at']) < MANAGER_TEAM_INDEX_TTL_SECONDS:
+            return entry
+
+    employees = {}
+    start = 0
+    while True:
+        q = supabase.table('employees').select(MANAGER_TEAM_EMPLOYEE_COLUMNS)
+        for column, value in zip(('cliente_id', 'holding_id', 'empresa_id', 'filial_id'), key):
+            if value:
+                q = q.eq(column, value)
+        rows = q.order('id').range(start, start + MANAGER_TEAM_PAGE_SIZE - 1).execute().data or []
+        for emp in rows:
+            if emp.get('id') is not None:
+                employees[emp['id']] = emp
+        if len(rows) < MANAGER_TEAM_PAGE_SIZE:
+            break
+        start += MANAGER_TEAM_PAGE_SIZE
+
+    entry = {'loaded_at': now, 'employees': employees, 'email': {}, 'name': {}, 'code': {}}
+    for emp_id, emp in employees.items():
+        for field, column in (('email', 'emailLider'), ('name', 'manager_name'), ('code', 'manager_code')):
+            value = _manager_key(emp.get(column))
+            if value:
+                entry[field].setdefault(value, []).append(emp_id)
+
+    with _MANAGER_TEAM_INDEX_LOCK:
+        _MANAGER_TEAM_INDEX[key] = entry
+    return entry
+
+
+def _manager_team(index, manager_email='', manager_name='', manager_code=''):
+    team_ids = set()
+    for field, value in (('email', manager_email), ('name', manager_name), ('code', manager_code)):
+        value = _manager_key(value)
+        if value:
+            team_ids.update(index[field].get(value, ()))
+    return [index['employees'][emp_id] for emp_id in sorted(team_ids)]
+
+
+def _invalidate_manager_team_index():
+    with _MANAGER_TEAM_INDEX_LOCK:
+        _MANAGER_TEAM_INDEX.clear()
+
+
+# ===== Hierarquia organizacional (multi-nível) =====
+# Uma árvore por cliente (códigos e nomes de gestor se repetem entre
+# clientes). Pai de cada profissional: quem tem employee_code == manager_code;
+# senão email == emailLider; senão nome == manager_name (normalizados).
+# Um DFS atribui intervalos de Euler (tin, tout): x está na subárvore de m
+# sse tin[m] <= tin[x] < tout[m], teste O(1) por linha.
+ORG_HIERARCHY_TTL_SECONDS = 600
+ORG_IN_CHUNK_SIZE = 200
+ORG_HIERARCHY_COLUMNS = 'id, nome, email, emailLider, employee_code, manager_code, manager_name, cliente_id'
+_ORG_HIERARCHY = {}
+_ORG_HIERARCHY_LOCK = threading.Lock()
+
+
+def _build_org_hierarchy(rows):
+    by_code, by_email, by_name = {}, {}, {}
+    for emp in rows:
+        emp_id = emp['id']
+        for bucket, value in ((by_code, emp.get('employee_code')), (by_email, emp.get('email')), (by_name, emp.get('nome'))):
+            value = _manager_key(value)
+            if value:
+                bucket.setdefault(value, emp_id)
+
+    parent = {}
+    children = {}
+    for emp in rows:
+        emp_id = emp['id']
+        manager_id = (
+            by_code.get(_manager_key(emp.get('manager_code')))
+            or by_email.get(_manager_key(emp.get('emailLider')))
+            or by_name.get(_manager_key(emp.get('manager_name')))
+        )
+        if manager_id is not None and manager_id != emp_id:
+            parent[emp_id] = manager_id
+            children.setdefault(manager_id, []).append(emp_id)
+
+    # Raízes primeiro; quem sobrar está num ciclo e vira raiz do próprio ciclo.
+    ids = sorted(emp['id'] for emp in rows)
+    tin, tout, order = {}, {}, []
+    for start in [i for i in ids if i not in parent] + ids:
+        if start in tin:
+            continue
+        stack = [(start, False)]
+        while stack:
+            node, leaving = stack.pop()
+            if leaving:
+                tout[node] = len(order)
+                continue
+            if node in tin:
+                continue
+            tin[node] = len(order)
+            order.append(node)
+            stack.append((node, True))
+            for child in sorted(children.get(node, ()), reverse=True):
+                if child not in tin:
+                    stack.append((child, False))
+
+    return {
+        'parent': parent,
+        'tin': tin,
+        'tout': tout,
+        'order': order,
+        'by_code': by_code,
+        'by_email': by_email,
+        'by_name': by_name,
+    }
+
+
+def _org_hierarchy(cliente_id=''):
+    now = time.monotonic()
+    with _ORG_HIERARCHY_LOCK:
+        entry = _ORG_HIERARCHY.get(cliente_id)
+        if entry and (now - entry['loaded_at']) < ORG_HIERARCHY_TTL_SECONDS:
+            return entry
+
+    rows = []
+    start = 0
+    while True:
+        q = supabase.table('employees').select(ORG_HIERARCHY_COLUMNS)
+        # '' = cadastro legado sem cliente_id; nunca mistura clientes.
+        q = q.eq('cliente_id', cliente_id) if cliente_id else q.is_('cliente_id', 'null')
+        page = q.order('id').range(start, start + MANAGER_TEAM_PAGE_SIZE - 1).execute().data or []
+        rows.extend(emp for emp in page if emp.get('id') is not None)
+        if len(page) < MANAGER_TEAM_PAGE_SIZE:
+            break
+        start += MANAGER_TEAM_PAGE_SIZE
+
+    entry = _build_org_hierarchy(rows)
+    entry['loaded_at'] = now
+    with _ORG_HIERARCHY_LOCK:
+        _ORG_HIERARCHY[cliente_id] = entry
+    return entry
+
+
+def _org_find_manager(hierarchy, manager_code='', manager_email='', manager_name=''):
+    return (
+        hierarchy['by_code'].get(_manager_key(manager_code))
+        or hierarchy['by_email'].get(_manager_key(manager_email))
+        or hierarchy['by_name'].get(_manager_key(manager_name))
+    )
+
+
+def _org_manager_cliente(manager_code='', manager_email='', manager_name=''):
+    """
+    cliente_id do cadastro do gestor quando o request não informa o cliente.
+    '' = cadastro sem cliente_id; None = gestor não encontrado ou presente em
+    mais de um cliente (ambíguo: melhor não filtrar por subárvore).
+    """
+    for column, value, op in (
+        ('employee_code', manager_code, 'eq'),
+        ('email', manager_email, 'ilike'),
+        ('nome', manager_name, 'ilike'),
+    ):
+        value = str(value or '').strip()
+        if not value:
+            continue
+        q = supabase.table('employees').select('cliente_id')
+        rows = (q.eq(column, value) if op == 'eq' else q.ilike(column, value)).limit(1000).execute().data or []
+        clientes = {str(row.get('cliente_id') or '') for row in rows}
+        if len(clientes) == 1:
+            return clientes.pop()
+        if clientes:
+            print(f'[org-hierarchy] gestor {column}={value!r} em {len(clientes)} clientes; informe cliente_id')
+            return None
+    return None
+
+
+def _org_locate_manager(cliente_id='', manager_code='', manager_email='', manager_name=''):
+    """(hierarquia do cliente, id do gestor) ou (None, None) se não der para resolver."""
+    cliente_id = str(cliente_id or '').strip()
+    if not cliente_id:
+        cliente_id = _org_manager_cliente(manager_code, manager_email, manager_name)
+        if cliente_id is None:
+            return None, None
+    hierarchy = _org_hierarchy(cliente_id)
+    return hierarchy, _org_find_manager(hierarchy, manager_code, manager_email, manager_name)
+
+
+def _org_in_subtree(hierarchy, employee_id, manager_id, include_manager=False):
+    position = hierarchy['tin'].get(employee_id)
+    start = hierarchy['tin'].get(manager_id)
+    if position is None or start is None:
+        return False
+    if position == start:
+        return include_manager
+    return start < position < hierarchy['tout'][manager_id]
+
+
+def _org_subtree_ids(hierarchy, manager_id, include_manager=False):
+    start = hierarchy['tin'].get(manager_id)
+    if start is None:
+        return []
+    return hierarchy['order'][(start if include_manager else start + 1):hierarchy['tout'][manager_id]]
+
+
+def _wants_subtree():
+    return str(request.args.get('include_subtree') or '').strip().lower() in ('1', 'true', 'sim')
+
+
+def _org_subtree_predicate(cliente_id='', manager_code='', manager_email='', manager_name=''):
+    """employee_id -> bool para a subárvore do gestor (sem incluir o próprio gestor)."""
+    hierarchy, manager_id = _org_locate_manager(cliente_id, manager_code, manager_email, manager_name)
+    if manager_id is None:
+        return lambda employee_id: False
+    return lambda employee_id: _org_in_subtree(hierarchy, employee_id, manager_id)
+
+
+def _invalidate_org_hierarchy():
+    with _ORG_HIERARCHY_LOCK:
+        _ORG_HIERARCHY.clear()
+
+
+@app.after_request
+def invalidate_employee_indexes_after_change(resp):
+    try:
+        if request.method in ('POST', 'PUT') and request.endpoint in EMPLOYEE_MUTATION_ENDPOINTS and resp.status_code < 400:
+            _invalidate_manager_team_index()
+            _invalidate_org_hierarchy()
+    except Exception as e:
+        print('[manager-team-index] erro invalidacao:', e)
+    return resp
+
+
+@app.after_request
+def checkpoint_employee_state_after_change(resp):
+    """Checkpoint do estado mensal só nos caminhos de escrita (o GET apenas lê)."""
+    try:
+        if request.method in ('POST', 'PUT') and request.endpoint in EMPLOYEE_MUTATION_ENDPOINTS and resp.status_code < 400:
+            _refresh_employee_state_checkpoint(_competence_from_request())
+    except Exception as e:
+        print('[employee-history] erro checkpoint:', e)
+    return resp
+
+
+def _resolve_operational_manager_identity(access_rows, cliente_id='', holding_id='', empresa_id='', filial_id='', known_employees=None):
     """
     Resolve a identidade operacional do gestor.
 
@@ -7556,23 +9712,29 @@ def _resolve_operational_manager_identity(access_rows, cliente_id='', holding_id
         seen_ids.add(employee_id_str)
         employee_ids.append(employee_id)
 
-    employees_by_id = {}
+    known_employees = known_employees or {}
+    employees_by_id = {
+        employee_id: known_employees[employee_id]
+        for employee_id in employee_ids
+        if employee_id in known_employees
+    }
+    missing_ids = [employee_id for employee_id in employee_ids if employee_id not in employees_by_id]
 
-    if employee_ids:
+    if missing_ids:
         try:
             r_emp = (
                 supabase
                 .table('employees')
                 .select('id, nome, email, employee_code, cliente_id, holding_id, empresa_id, filial_id')
-                .in_('id', employee_ids)
+                .in_('id', missing_ids)
                 .execute()
             )
 
-            employees_by_id = {
+            employees_by_id.update({
                 emp.get('id'): emp
                 for emp in (r_emp.data or [])
                 if emp.get('id') is not None
-            }
+            })
         except Exception as e:
             print('[resolve_operational_manager_identity] erro ao buscar employees:', e)
 
@@ -10034,6 +12196,7 @@ def api_workflow_calibration_overview():
         include_demo_rows = _workflow_include_demo_rows()
         user_email = (request.args.get('user_email') or '').strip().lower()
         manager_name_filter = (request.args.get('manager_name') or '').strip().lower()
+        include_subtree = _wants_subtree()
         department_name_filter = (request.args.get('department_name') or '').strip().lower()
         workflow_status_filter = (request.args.get('workflow_status') or '').strip().lower()
         employee_name_filter = (request.args.get('employee_name') or '').strip().lower()
@@ -10259,6 +12422,14 @@ def api_workflow_calibration_overview():
             filial_id=filial_id
         )
 
+        # manager_name + include_subtree: todos os níveis abaixo do gestor
+        subtree_filter = None
+        if include_subtree and manager_name_filter:
+            subtree_filter = _org_subtree_predicate(
+                cliente_id,
+                manager_name=manager_name_filter
+            )
+
         items = []
 
         for ev in evaluations:
@@ -10284,7 +12455,10 @@ def api_workflow_calibration_overview():
             employee_name = str(emp.get('nome') or '').strip()
             workflow_status = str(wf.get('status_workflow') if wf else 'sem_workflow' or '').strip()
 
-            if manager_name_filter and manager_name.lower() != manager_name_filter:
+            if manager_name_filter and subtree_filter:
+                if not subtree_filter(employee_id):
+                    continue
+            elif manager_name_filter and manager_name.lower() != manager_name_filter:
                 continue
 
             if department_name_filter and department_name.lower() != department_name_filter:
@@ -10456,34 +12630,6 @@ def api_list_manager_workflow_evaluations():
             'filial_id': filial_id
         })
 
-        # 1) Buscar profissionais do gestor
-        q_emp = (
-            supabase
-            .table('employees')
-            .select(
-                'id, nome, cargo, empresa, company_name, branch_name, department_name, '
-                'manager_name, email, emailLider, employee_code, manager_code, '
-                'holding, business_line, nivel, cliente_id, holding_id, empresa_id, filial_id'
-            )
-        )
-
-        if cliente_id:
-            q_emp = q_emp.eq('cliente_id', cliente_id)
-
-        if holding_id:
-            q_emp = q_emp.eq('holding_id', holding_id)
-
-        if empresa_id:
-            q_emp = q_emp.eq('empresa_id', empresa_id)
-
-        if filial_id:
-            q_emp = q_emp.eq('filial_id', filial_id)
-
-        # Filtro do gestor.
-        # Primeiro buscamos os profissionais do contexto e depois filtramos em Python,
-        # evitando uso de .or_(), que não está disponível neste cliente Supabase.
-
-        
         if not manager_email and not manager_name and not manager_code:
             return jsonify({
                 'success': False,
@@ -10499,6 +12645,8 @@ def api_list_manager_workflow_evaluations():
                 'message': 'Informe user_email para consultar avaliacoes do gestor.'
             }), 400
 
+        # ilike filtra no banco sem depender da caixa do e-mail gravado;
+        # a comparação exata abaixo continua valendo.
         q_access = (
             supabase
             .table('usuarios_acessos')
@@ -10508,6 +12656,7 @@ def api_list_manager_workflow_evaluations():
                 'pode_ver_gestor_avaliacao, pode_administrar, status'
             )
             .eq('status', 'ativo')
+            .ilike('wp_user_email', user_email)
             .execute()
         )
 
@@ -10520,12 +12669,16 @@ def api_list_manager_workflow_evaluations():
             if row_email == user_email:
                 access_rows.append(access_row)
 
+        # 1) Índice de equipes do contexto (profissionais do gestor em O(1))
+        team_index = _manager_team_index(cliente_id, holding_id, empresa_id, filial_id)
+
         operational_manager = _resolve_operational_manager_identity(
             access_rows,
             cliente_id=cliente_id,
             holding_id=holding_id,
             empresa_id=empresa_id,
-            filial_id=filial_id
+            filial_id=filial_id,
+            known_employees=team_index['employees']
         )
 
         requested_is_top_marker = (
@@ -10612,26 +12765,7 @@ def api_list_manager_workflow_evaluations():
             }), 403
         
         
-        r_emp = q_emp.execute()
-        employees_raw = r_emp.data or []
-        
-        def norm_txt(value):
-            return str(value or '').strip().lower()
-        
-        manager_email_norm = norm_txt(manager_email)
-        manager_name_norm = norm_txt(manager_name)
-        manager_code_norm = norm_txt(manager_code)
-        
-        employees = []
-        
-        for emp in employees_raw:
-            match_email = manager_email_norm and norm_txt(emp.get('emailLider')) == manager_email_norm
-            match_name = manager_name_norm and norm_txt(emp.get('manager_name')) == manager_name_norm
-            match_code = manager_code_norm and norm_txt(emp.get('manager_code')) == manager_code_norm
-        
-            if match_email or match_name or match_code:
-                employees.append(emp)
-        
+        employees = _manager_team(team_index, manager_email, manager_name, manager_code)
 
         
         if not employees:
@@ -0,0 +1,485 @@
+import copy
+import json
+import re
+import threading
+import time
+from datetime import date, datetime
+from urllib.parse import quote
+
+from postgrest.exceptions import APIError
+
+
+# Substituto em memoria do cliente supabase para o benchmark: tabelas como
+# listas de dicts, filtros/ordem/range com a semantica do PostgREST e RPCs
+# registradas em Python. Toda chamada passa por postgrest.session.request,
+# entao a instrumentacao de query_instrumentation conta e cronometra igual
+# ao cliente real.
+FAKE_DEFAULT_MAX_ROWS = 1000  # db-max-rows padrao do Supabase
+FAKE_URL_LIMIT_BYTES = 8192  # limite tipico de URL em proxies na frente do PostgREST
+
+# Chave de conflito do upsert quando on_conflict nao vem (PK da tabela real).
+FAKE_PRIMARY_KEYS = {
+    'system_config': 'config_key',
+    'evaluation_periods': 'period',
+    'evaluation_current_period': 'id',
+    'evaluation_rounds': 'code',
+}
+
+
+def _wire(value):
+    """Ida e volta em JSON, como no transporte HTTP (datas viram string, sem aliasing)."""
+    return json.loads(json.dumps(value, default=_wire_default))
+
+
+def _wire_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+def _norm(value):
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def _ordered(a, b):
+    try:
+        return float(a), float(b)
+    except (TypeError, ValueError):
+        return str(a), str(b)
+
+
+def _like_regex(pattern, flags=0):
+    parts = []
+    for ch in str(pattern):
+        if ch in ('%', '*'):
+            parts.append('.*')
+        elif ch == '_':
+            parts.append('.')
+        else:
+            parts.append(re.escape(ch))
+    return re.compile('^' + ''.join(parts) + '$', flags | re.DOTALL)
+
+
+def _matches(row, column, op, value):
+    current = row.get(column)
+    if op == 'is':
+        target = _norm(value)
+        if target in (None, 'null'):
+            return current is None
+        return _norm(current) == target
+    if current is None:
+        return op == 'neq' and value is not None
+    if op == 'eq':
+        return _norm(current) == _norm(value)
+    if op == 'neq':
+        return _norm(current) != _norm(value)
+    if op == 'in':
+        return _norm(current) in value
+    if op in ('like', 'ilike'):
+        return bool(value.match(str(current)))
+    a, b = _ordered(current, value)
+    if op == 'gt':
+        return a > b
+    if op == 'gte':
+        return a >= b
+    if op == 'lt':
+        return a < b
+    if op == 'lte':
+        return a <= b
+    raise APIError({'message': f'operador nao suportado: {op}', 'code': 'FAKE', 'hint': None, 'details': None})
+
+
+def _split_columns(columns):
+    """'id, nome, alias:col, rel(a,b)' -> [(chave, coluna)]; recursos embutidos ficam de fora."""
+    out = []
+    depth = 0
+    token = ''
+    for ch in f'{columns or "*"},':
+        if ch == '(':
+            depth += 1
+        elif ch == ')':
+            depth -= 1
+        if ch == ',' and depth == 0:
+            token = token.strip()
+            if token and '(' not in token:
+                key, _, column = token.partition(':')
+                out.append((key.strip(), (column or key).strip()))
+            token = ''
+            continue
+        token += ch
+    return out
+
+
+class FakeResponse:
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+
+class _FakeHTTPResponse:
+    def __init__(self, status_code, result=None, error=None):
+        self.status_code = status_code
+        self.result = result
+        self.error = error
+
+
+class FakeSession:
+    """Faz o papel do httpx.Client do postgrest: e aqui que a instrumentacao se pendura."""
+
+    def __init__(self, latency_ms=0.0):
+        self.latency_ms = latency_ms
+
+    def request(self, method, url, run=None, **kwargs):
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        try:
+            return _FakeHTTPResponse(200, result=run())
+        except APIError as e:
+            return _FakeHTTPResponse(400, error=e)
+
+
+class _FakePostgrest:
+    def __init__(self, session):
+        self.session = session
+
+
+class FakeStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests = 0
+            self.rows_returned = 0
+            self.truncated = {}  # tabela -> consultas cortadas pelo max_rows
+            self.oversized_urls = {}  # tabela -> consultas com URL acima do limite
+            self.max_url_bytes = 0
+
+    def record(self, target, rows, truncated, url_bytes, url_limit):
+        with self._lock:
+            self.requests += 1
+            self.rows_returned += rows
+            self.max_url_bytes = max(self.max_url_bytes, url_bytes)
+            if truncated:
+                self.truncated[target] = self.truncated.get(target, 0) + 1
+            if url_bytes > url_limit:
+                self.oversized_urls[target] = self.oversized_urls.get(target, 0) + 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'rows_returned': self.rows_returned,
+                'truncated': dict(self.truncated),
+                'oversized_urls': dict(self.oversized_urls),
+                'max_url_bytes': self.max_url_bytes,
+            }
+
+
+class FakeQuery:
+    def __init__(self, client, table):
+        self._client = client
+        self._table = table
+        self._method = 'GET'
+        self._action = 'select'
+        self._columns = '*'
+        self._count = None
+        self._filters = []
+        self._orders = []
+        self._limit = None
+        self._offset = 0
+        self._single = None
+        self._payload = None
+        self._on_conflict = None
+        self._params = []
+
+    # ---------- verbos ----------
+    def select(self, *columns, count=None, **kwargs):
+        self._columns = ','.join(columns) if columns else '*'
+        self._count = count
+        self._params.append(('select', self._columns))
+        return self
+
+    def insert(self, rows, count=None, returning=None, upsert=False, **kwargs):
+        self._method = 'POST'
+        self._action = 'upsert' if upsert else 'insert'
+        self._payload = rows
+        return self
+
+    def upsert(self, rows, count=None, returning=None, ignore_duplicates=False, on_conflict='', **kwargs):
+        self._method = 'POST'
+        self._action = 'upsert'
+        self._payload = rows
+        self._on_conflict = on_conflict or None
+        return self
+
+    def update(self, data, count=None, returning=None, **kwargs):
+        self._method = 'PATCH'
+        self._action = 'update'
+        self._payload = data
+        return self
+
+    def delete(self, count=None, returning=None, **kwargs):
+        self._method = 'DELETE'
+        self._action = 'delete'
+        return self
+
+    # ---------- filtros ----------
+    def _filter(self, column, op, value, param):
+        self._filters.append((column, op, value))
+        self._params.append((column, f'{op}.{param}'))
+        return self
+
+    def eq(self, column, value):
+        return self._filter(column, 'eq', value, value)
+
+    def neq(self, column, value):
+        return self._filter(column, 'neq', value, value)
+
+    def gt(self, column, value):
+        return self._filter(column, 'gt', value, value)
+
+    def gte(self, column, value):
+        return self._filter(column, 'gte', value, value)
+
+    def lt(self, column, value):
+        return self._filter(column, 'lt', value, value)
+
+    def lte(self, column, value):
+        return self._filter(column, 'lte', value, value)
+
+    def is_(self, column, value):
+        return self._filter(column, 'is', value, value)
+
+    def in_(self, column, values):
+        values = list(values)
+        return self._filter(column, 'in', {_norm(v) for v in values}, '(' + ','.join(str(v) for v in values) + ')')
+
+    def like(self, column, pattern):
+        return self._filter(column, 'like', _like_regex(pattern), pattern)
+
+    def ilike(self, column, pattern):
+        return self._filter(column, 'ilike', _like_regex(pattern, re.IGNORECASE), pattern)
+
+    def filter(self, column, operator, criteria):
+        handler = getattr(self, {'in': 'in_', 'is': 'is_'}.get(operator, operator), None)
+        if handler is None:
+            raise APIError({'message': f'operador nao suportado: {operator}', 'code': 'FAKE', 'hint': None, 'details': None})
+        if operator == 'in':
+            criteria = [v.strip().strip('"') for v in str(criteria).strip('()').split(',') if v.strip()]
+        return handler(column, criteria)
+
+    # ---------- modificadores ----------
+    def order(self, column, desc=False, nullsfirst=False, foreign_table=None):
+        self._orders.append((column, desc, nullsfirst))
+        self._params.append(('order', f'{column}.{"desc" if desc else "asc"}'))
+        return self
+
+    def limit(self, size, foreign_table=None):
+        self._limit = int(size)
+        self._params.append(('limit', self._limit))
+        return self
+
+    def range(self, start, end, foreign_table=None):
+        self._offset = int(start)
+        self._limit = int(end) - int(start) + 1
+        self._params.append(('offset', self._offset))
+        return self
+
+    def single(self):
+        self._single = 'single'
+        return self
+
+    def maybe_single(self):
+        self._single = 'maybe'
+        return self
+
+    # ---------- execucao ----------
+    def _url(self):
+        query = '&'.join(f'{k}={quote(str(v), safe=",.()*:")}' for k, v in self._params)
+        return f'{self._client.url}/rest/v1/{self._table}' + (f'?{query}' if query else '')
+
+    def _sorted(self, rows):
+        for column, desc, nullsfirst in reversed(self._orders):
+            present = [r for r in rows if r.get(column) is not None]
+            missing = [r for r in rows if r.get(column) is None]
+            present.sort(key=lambda r: _ordered(r.get(column), r.get(column))[0], reverse=desc)
+            # PostgREST: nulls por ultimo no asc e primeiro no desc, salvo nullsfirst.
+            rows = missing + present if (nullsfirst or desc) else present + missing
+        return rows
+
+    def _effective_limit(self):
+        max_rows = self._client.max_rows
+        if self._limit is None:
+            return max_rows or None
+        return min(self._limit, max_rows) if max_rows else self._limit
+
+    def _page(self, rows):
+        limit = self._effective_limit()
+        rows = rows[self._offset:]
+        return rows[:limit] if limit is not None else rows
+
+    def _truncated(self, matched):
+        """A consulta pediu mais do que o max_rows devolve (o PostgREST corta sem erro)."""
+        max_rows = self._client.max_rows
+        if not max_rows or (self._limit is not None and self._limit <= max_rows):
+            return False
+        return len(matched) - self._offset > max_rows
+
+    def _project(self, row):
+        columns = _split_columns(self._columns)
+        if any(column == '*' for _, column in columns):
+            return dict(row)
+        return {key: row.get(column) for key, column in columns}
+
+    def _run(self):
+        client = self._client
+        with client.lock:
+            table = client.tables.setdefault(self._table, [])
+            count = None
+            truncated = False
+            if self._action in ('insert', 'upsert'):
+                rows = self._write(table)
+            else:
+                matched = [r for r in table if all(_matches(r, c, op, v) for c, op, v in self._filters)]
+                if self._action == 'update':
+                    patch = _wire(self._payload)
+                    for row in matched:
+                        row.update(patch)
+                    rows = matched
+                elif self._action == 'delete':
+                    ids = {id(r) for r in matched}
+                    table[:] = [r for r in table if id(r) not in ids]
+                    rows = matched
+                else:
+                    rows = self._page(self._sorted(matched) if self._orders else matched)
+                    count = len(matched) if self._count else None
+                    truncated = self._truncated(matched)
+            data = _wire([self._project(r) for r in rows]) if client.wire else [self._project(r) for r in rows]
+
+        client.stats.record(self._table, len(data), truncated, len(self._url()), client.url_limit)
+        if self._single:
+            if len(data) > 1 or (self._single == 'single' and not data):
+                raise APIError({
+                    'message': 'JSON object requested, multiple (or no) rows returned',
+                    'code': 'PGRST116',
+                    'hint': None,
+                    'details': f'Results contain {len(data)} rows',
+                })
+            return FakeResponse(data[0] if data else None, count)
+        return FakeResponse(data, count)
+
+    def _write(self, table):
+        client = self._client
+        payload = self._payload if isinstance(self._payload, list) else [self._payload]
+        key_columns = [c.strip() for c in (self._on_conflict or FAKE_PRIMARY_KEYS.get(self._table, 'id')).split(',')]
+        written = []
+        for item in _wire(payload):
+            existing = None
+            if self._action == 'upsert' and all(item.get(c) is not None for c in key_columns):
+                key = tuple(_norm(item.get(c)) for c in key_columns)
+                existing = next((r for r in table if tuple(_norm(r.get(c)) for c in key_columns) == key), None)
+            if existing is not None:
+                existing.update(item)
+                written.append(existing)
+                continue
+            if item.get('id') is None:
+                item['id'] = client.next_id(self._table)
+            table.append(item)
+            written.append(item)
+        return written
+
+    def execute(self):
+        response = self._client.postgrest.session.request(self._method, self._url(), run=self._run)
+        if response.status_code >= 400:
+            error = response.error
+            if self._single == 'maybe' and error.details and 'Results contain 0 rows' in error.details:
+                return None
+            raise error
+        return response.result
+
+
+class FakeRpc:
+    def __init__(self, client, name, params):
+        self._client = client
+        self._name = name
+        self._params = params or {}
+
+    def _run(self):
+        handler = self._client.rpcs.get(self._name)
+        if handler is None:
+            handler = next(
+                (fn for prefix, fn in self._client.rpc_prefixes.items() if self._name.startswith(prefix)),
+                None,
+            )
+        if handler is None:
+            raise APIError({
+                'message': f'Could not find the function public.{self._name}',
+                'code': 'PGRST202',
+                'hint': None,
+                'details': None,
+            })
+        with self._client.lock:
+            rows = handler(self._client.tables, dict(self._params), self._name)
+            data = _wire(rows) if self._client.wire else copy.deepcopy(rows)
+        self._client.stats.record('rpc:' + self._name, len(data or []), False, 0, self._client.url_limit)
+        return FakeResponse(data)
+
+    def execute(self):
+        url = f'{self._client.url}/rest/v1/rpc/{self._name}'
+        response = self._client.postgrest.session.request('POST', url, run=self._run)
+        if response.status_code >= 400:
+            raise response.error
+        return response.result
+
+
+class FakeSupabase:
+    """
+    Mesmo recorte da API do supabase-py usado pelo app: table/from_ com
+    select/insert/update/upsert/delete, filtros, order, limit, range,
+    single/maybe_single, e rpc. max_rows reproduz o corte do PostgREST.
+    """
+
+    def __init__(self, tables=None, rpcs=None, rpc_prefixes=None, max_rows=FAKE_DEFAULT_MAX_ROWS,
+                 latency_ms=0.0, wire=True, url='http://fake-supabase.local', url_limit=FAKE_URL_LIMIT_BYTES):
+        self.tables = tables if tables is not None else {}
+        self.rpcs = dict(rpcs or {})
+        self.rpc_prefixes = dict(rpc_prefixes or {})
+        self.max_rows = max_rows
+        self.wire = wire
+        self.url = url.rstrip('/')
+        self.url_limit = url_limit
+        self.lock = threading.RLock()
+        self.stats = FakeStats()
+        self.postgrest = _FakePostgrest(FakeSession(latency_ms))
+        self._ids = {}
+
+    def next_id(self, table):
+        with self.lock:
+            if table not in self._ids:
+                self._ids[table] = max(
+                    (r['id'] for r in self.tables.get(table, []) if isinstance(r.get('id'), int)),
+                    default=0,
+                )
+            self._ids[table] += 1
+            return self._ids[table]
+
+    def register_rpc(self, name, handler, prefix=False):
+        """handler(tables, params, name) -> lista de linhas."""
+        (self.rpc_prefixes if prefix else self.rpcs)[name] = handler
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+    def from_(self, name):
+        return FakeQuery(self, name)
+
+    def rpc(self, fn, params=None):
+        return FakeRpc(self, fn, params)
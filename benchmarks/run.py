@@ -0,0 +1,321 @@
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import platform
+import re
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from benchmarks.fake_supabase import FAKE_DEFAULT_MAX_ROWS, FakeSupabase  # noqa: E402
+from benchmarks.seed import register_rpcs, seed_dataset  # noqa: E402
+
+
+# Benchmark dos endpoints quentes contra o FakeSupabase (massa de seed.py).
+# Uso (da raiz do repo):
+#   python -m benchmarks.run --employees 10000
+#   python -m benchmarks.run --employees 50000 --baseline benchmarks/results/<anterior>.json
+# Grava um JSON por execucao em benchmarks/results/; com --baseline compara
+# p50/cold/queries/memoria e sai com codigo 1 se algum cenario regrediu.
+BENCH_RESULTS_DIR = os.path.join(REPO_ROOT, 'benchmarks', 'results')
+BENCH_ADMIN_WINDOW_CODE = 'bench-window-code'
+BENCH_DEFAULT_THRESHOLD = 0.2
+BENCH_MIN_REGRESSION_MS = 2.0
+
+_SERVER_TIMING_DB_RE = re.compile(r'(?:^|,\s*)db;dur=([\d.]+);desc="(\d+) queries"')
+
+
+def _scenarios(meta):
+    admin = meta['admin_email']
+    active_round = meta['active_round_code']
+    state = {'next_employee': 0}
+
+    def evaluation_payload():
+        # Cada chamada grava a avaliacao de um colaborador diferente na rodada ativa.
+        state['next_employee'] += 1
+        return {
+            'employee_id': state['next_employee'],
+            'round_code': active_round,
+            'code': BENCH_ADMIN_WINDOW_CODE,
+            'responses': {str(cid): (cid % 5) + 1 for cid in range(1, 13)},
+            'dimension_weights': {'INSTITUCIONAL': 25, 'FUNCIONAL': 25, 'INDIVIDUAL': 25, 'METAS': 25},
+            'goals': [
+                {'name': 'Meta 1', 'description': 'Entrega', 'weight': 60, 'rating': 2},
+                {'name': 'Meta 2', 'description': 'Qualidade', 'weight': 40, 'rating': 3},
+            ],
+        }
+
+    return {
+        'game_scoreboard': {
+            'method': 'GET',
+            'path': f"/api/leadertrack/game-scoreboard?codrodada={meta['leadertrack_round']}",
+        },
+        'calibration_overview': {
+            'method': 'GET',
+            'path': f'/api/workflow/calibration-overview?user_email={admin}&round_code={active_round}',
+        },
+        'pdi_eligibility': {
+            'method': 'GET',
+            'path': f'/api/pdi/eligibility?user_email={admin}&round_code={active_round}',
+        },
+        'merit_simulation': {
+            'method': 'GET',
+            'path': '/api/merit-simulation',
+            'skip': (
+                None if os.getenv('DATABASE_URL')
+                else 'merito le via psycopg2 (SQL direto); informe --database-url de um Postgres com o schema'
+            ),
+        },
+        'employee_history': {
+            'method': 'GET',
+            'path': f"/api/employee-history?competence={meta['open_competence']}",
+        },
+        'turnover_timeseries': {
+            'method': 'GET',
+            'path': (
+                f"/api/turnover/timeseries?start_month={meta['competences'][0]}"
+                f"&end_month={meta['competences'][-1]}"
+            ),
+        },
+        # Escrita por ultimo: muda a massa que os outros cenarios leem.
+        'evaluation_save': {
+            'method': 'POST',
+            'path': '/api/evaluations',
+            'json': evaluation_payload,
+        },
+    }
+
+
+def _percentile(values, p):
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p * len(ordered)) - 1)]
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return None
+
+
+def _call(client, fake, scenario, quiet):
+    payload = scenario.get('json')
+    kwargs = {'json': payload()} if callable(payload) else {}
+    fake.stats.reset()
+    sink = io.StringIO()
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(sink) if quiet else contextlib.nullcontext():
+        resp = client.open(scenario['path'], method=scenario['method'], **kwargs)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    match = _SERVER_TIMING_DB_RE.search(resp.headers.get('Server-Timing') or '')
+    return {
+        'ms': elapsed_ms,
+        'status': resp.status_code,
+        'bytes': len(resp.get_data()),
+        'queries': int(match.group(2)) if match else None,
+        'db_ms': float(match.group(1)) if match else None,
+        'fake': fake.stats.snapshot(),
+    }
+
+
+def run_scenario(client, fake, scenario, repeat, quiet):
+    if scenario.get('skip'):
+        return {'skipped': scenario['skip']}
+
+    cold = _call(client, fake, scenario, quiet)
+    warm = [_call(client, fake, scenario, quiet) for _ in range(repeat)]
+
+    # Memoria num request a parte: o tracemalloc distorce a latencia.
+    tracemalloc.start()
+    try:
+        measured = _call(client, fake, scenario, quiet)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    latencies = [c['ms'] for c in warm] or [cold['ms']]
+    statuses = sorted({c['status'] for c in [cold] + warm + [measured]})
+    return {
+        'status': statuses,
+        'cold_ms': round(cold['ms'], 2),
+        'p50_ms': round(_percentile(latencies, 0.5), 2),
+        'p95_ms': round(_percentile(latencies, 0.95), 2),
+        'mean_ms': round(sum(latencies) / len(latencies), 2),
+        'runs': len(latencies),
+        'queries_cold': cold['queries'],
+        'queries_warm': warm[-1]['queries'] if warm else cold['queries'],
+        'db_ms_cold': cold['db_ms'],
+        'db_ms_warm': round(sum(c['db_ms'] or 0 for c in warm) / len(warm), 2) if warm else cold['db_ms'],
+        'response_bytes': measured['bytes'],
+        'peak_alloc_kb': round(peak / 1024, 1),
+        'rows_returned_cold': cold['fake']['rows_returned'],
+        'truncated_queries': cold['fake']['truncated'],
+        'oversized_urls': cold['fake']['oversized_urls'],
+        'max_url_bytes': cold['fake']['max_url_bytes'],
+    }
+
+
+def compare(current, baseline, threshold):
+    """Lista de regressoes (cenario, metrica, antes, depois) entre duas execucoes."""
+    regressions = []
+    for name, now in current['scenarios'].items():
+        before = baseline.get('scenarios', {}).get(name)
+        if not before or 'skipped' in now or 'skipped' in before:
+            continue
+        for metric in ('p50_ms', 'p95_ms', 'cold_ms'):
+            a, b = before.get(metric), now.get(metric)
+            if a is not None and b is not None and b > a * (1 + threshold) and b - a > BENCH_MIN_REGRESSION_MS:
+                regressions.append((name, metric, a, b))
+        for metric in ('queries_cold', 'queries_warm'):
+            a, b = before.get(metric), now.get(metric)
+            if a is not None and b is not None and b > a:
+                regressions.append((name, metric, a, b))
+        a, b = before.get('peak_alloc_kb'), now.get('peak_alloc_kb')
+        if a and b and b > a * (1 + threshold):
+            regressions.append((name, 'peak_alloc_kb', a, b))
+    return regressions
+
+
+def _print_table(result):
+    header = f"{'cenario':<22}{'cold':>10}{'p50':>10}{'p95':>10}{'q cold':>8}{'q warm':>8}{'db ms':>9}{'KB':>10}{'bytes':>11}"
+    print(header)
+    print('-' * len(header))
+    for name, r in result['scenarios'].items():
+        if 'skipped' in r:
+            print(f'{name:<22}  (pulado) {r["skipped"]}')
+            continue
+        print(
+            f"{name:<22}{r['cold_ms']:>10.1f}{r['p50_ms']:>10.1f}{r['p95_ms']:>10.1f}"
+            f"{str(r['queries_cold']):>8}{str(r['queries_warm']):>8}{str(r['db_ms_warm']):>9}"
+            f"{r['peak_alloc_kb']:>10.0f}{r['response_bytes']:>11}"
+        )
+        notes = []
+        if r['status'] != [200]:
+            notes.append(f"status {r['status']}")
+        if r['truncated_queries']:
+            notes.append(f"cortadas pelo max_rows: {r['truncated_queries']}")
+        if r['oversized_urls']:
+            notes.append(f"URL acima do limite: {r['oversized_urls']} (max {r['max_url_bytes']} bytes)")
+        for note in notes:
+            print(f"{'':<22}  ! {note}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark dos endpoints quentes contra um Supabase em memoria.')
+    parser.add_argument('--employees', type=int, default=10000)
+    parser.add_argument('--tenants', type=int, default=2)
+    parser.add_argument('--rounds', type=int, default=4)
+    parser.add_argument('--months', type=int, default=6)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeat', type=int, default=5, help='chamadas quentes por cenario')
+    parser.add_argument('--max-rows', type=int, default=FAKE_DEFAULT_MAX_ROWS, help='db-max-rows do PostgREST (0 = sem corte)')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='latencia simulada por chamada ao Supabase')
+    parser.add_argument('--scenarios', default='', help='lista separada por virgula (padrao: todos)')
+    parser.add_argument('--database-url', default='', help='Postgres para os cenarios de merito (psycopg2)')
+    parser.add_argument('--output', default='', help='arquivo JSON de saida')
+    parser.add_argument('--baseline', default='', help='JSON de uma execucao anterior para comparar')
+    parser.add_argument('--threshold', type=float, default=BENCH_DEFAULT_THRESHOLD)
+    parser.add_argument('--verbose', action='store_true', help='mostra o stdout do app durante os requests')
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault('SUPABASE_URL', 'http://fake-supabase.local')
+    os.environ.setdefault('SUPABASE_KEY', 'bench')
+    os.environ['ADMIN_WINDOW_CODE'] = BENCH_ADMIN_WINDOW_CODE
+    os.environ['QUERY_TIMING_LOG'] = 'off'
+    if args.database_url:
+        os.environ['DATABASE_URL'] = args.database_url
+
+    started = time.perf_counter()
+    dataset = seed_dataset(
+        employees=args.employees, tenants=args.tenants, rounds=args.rounds, months=args.months, seed=args.seed,
+    )
+    seed_s = time.perf_counter() - started
+    fake = register_rpcs(FakeSupabase(
+        dataset['tables'], max_rows=args.max_rows or None, latency_ms=args.latency_ms,
+    ))
+    meta = dataset['meta']
+    print(f"[bench] massa: {meta['employees']} colaboradores, {sum(meta['rows'].values())} linhas em {seed_s:.1f}s")
+
+    # O app cria o cliente no import: troca o create_client antes.
+    import supabase as supabase_pkg
+    supabase_pkg.create_client = lambda *a, **kw: fake
+    with contextlib.redirect_stdout(io.StringIO()) if not args.verbose else contextlib.nullcontext():
+        import app as app_module
+    client = app_module.app.test_client()
+
+    scenarios = _scenarios(meta)
+    selected = [s.strip() for s in args.scenarios.split(',') if s.strip()] or list(scenarios)
+    unknown = [s for s in selected if s not in scenarios]
+    if unknown:
+        parser.error(f"cenarios desconhecidos: {', '.join(unknown)} (disponiveis: {', '.join(scenarios)})")
+
+    result = {
+        'meta': {
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'git_commit': _git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'params': {
+                'employees': args.employees,
+                'tenants': args.tenants,
+                'rounds': args.rounds,
+                'months': args.months,
+                'seed': args.seed,
+                'repeat': args.repeat,
+                'max_rows': args.max_rows,
+                'latency_ms': args.latency_ms,
+                'scenarios': selected,
+            },
+            'dataset': meta,
+            'seed_seconds': round(seed_s, 2),
+        },
+        'scenarios': {},
+    }
+    for name in selected:
+        print(f'[bench] {name}...', flush=True)
+        result['scenarios'][name] = run_scenario(client, fake, scenarios[name], args.repeat, not args.verbose)
+    result['meta']['max_rss_kb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    output = args.output
+    if not output:
+        os.makedirs(BENCH_RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+        output = os.path.join(BENCH_RESULTS_DIR, f"bench-{stamp}-{result['meta']['git_commit'] or 'nogit'}.json")
+    with open(output, 'w', encoding='utf-8') as fh:
+        json.dump(result, fh, ensure_ascii=False, indent=2, sort_keys=True)
+
+    print()
+    _print_table(result)
+    print(f'\n[bench] resultado: {output}')
+
+    if not args.baseline:
+        return 0
+
+    with open(args.baseline, encoding='utf-8') as fh:
+        baseline = json.load(fh)
+    if baseline.get('meta', {}).get('params') != result['meta']['params']:
+        print('[bench] aviso: parametros diferentes da baseline; a comparacao pode nao ser justa')
+    regressions = compare(result, baseline, args.threshold)
+    if not regressions:
+        print(f"[bench] sem regressoes contra {baseline.get('meta', {}).get('git_commit')}")
+        return 0
+    print(f"[bench] regressoes contra {baseline.get('meta', {}).get('git_commit')}:")
+    for name, metric, before, after in regressions:
+        print(f'  {name}.{metric}: {before} -> {after}')
+    return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
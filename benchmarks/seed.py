@@ -0,0 +1,440 @@
+import random
+from datetime import date, datetime, timedelta, timezone
+
+
+# Massa sintetica do benchmark: N clientes (tenants) com holding/empresas/
+# filiais, colaboradores numa arvore de gestao, varias rodadas de avaliacao
+# (com workflow, 9Box e PDI), historico mensal de colaboradores e respostas
+# do LeaderTrack. Gerada com random.Random(seed): mesma semente, mesma massa.
+BENCH_ADMIN_EMAIL = 'rh.benchmark@example.com'
+BENCH_WINDOW_PERIOD = 'BENCH'
+BENCH_LEADERTRACK_ROUND = 'LT2026'
+BENCH_MANAGER_SPAN = 8
+BENCH_COMPANIES_PER_TENANT = 4
+BENCH_BRANCHES_PER_COMPANY = 3
+BENCH_EVALUATION_COVERAGE = 0.9
+BENCH_PDI_PLAN_SHARE = 0.15
+BENCH_MONTHLY_UPDATE_SHARE = 0.03
+BENCH_MONTHLY_CREATE_SHARE = 0.01
+BENCH_LEADERTRACK_RESPONSE_SHARE = 0.7
+
+BENCH_DIMENSIONS = ('INSTITUCIONAL', 'FUNCIONAL', 'INDIVIDUAL')
+BENCH_CRITERIA_PER_DIMENSION = 4
+BENCH_DEPARTMENTS = ('Operacoes', 'Comercial', 'Financeiro', 'Pessoas', 'Tecnologia', 'Logistica')
+BENCH_ROLES = ('Analista', 'Assistente', 'Coordenador', 'Especialista', 'Supervisor', 'Tecnico')
+BENCH_PERIODS = ('Manha', 'Tarde', 'Noite', 'Integral')
+
+
+def round_codes(rounds, last_year=None):
+    """['Start2025', 'YE2025', 'Start2026', 'YE2026'] para rounds=4 (a ultima e a ativa)."""
+    last_year = last_year or date.today().year
+    codes = []
+    year = last_year
+    while len(codes) < rounds:
+        codes[:0] = [(f'Start{year}', year), (f'YE{year}', year)]
+        year -= 1
+    return codes[-rounds:]
+
+
+def competences(months, today=None):
+    """Ultimos `months` meses fechados (1o dia), do mais antigo ao mais recente."""
+    month = (today or date.today()).replace(day=1)
+    out = []
+    for _ in range(months):
+        month = (month - timedelta(days=1)).replace(day=1)
+        out.append(month)
+    return list(reversed(out))
+
+
+def _rating(rng, low=1.0, high=5.0):
+    return round(rng.uniform(low, high), 2)
+
+
+def _nine_box(performance, potential):
+    col = 0 if performance < 4 else (1 if performance < 7 else 2)
+    row = 0 if potential < 4 else (1 if potential < 7 else 2)
+    return row * 3 + col + 1
+
+
+def _employee_snapshot(emp):
+    return {
+        k: emp.get(k)
+        for k in (
+            'id', 'employee_code', 'nome', 'cargo', 'empresa', 'company_name', 'branch_name',
+            'department_name', 'manager_name', 'manager_code', 'employment_status',
+            'admission_date', 'holding', 'salario',
+        )
+    }
+
+
+def seed_dataset(employees=10000, tenants=2, rounds=4, months=6, seed=42):
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc)
+    codes = round_codes(rounds)
+    active_round = codes[-1][0]
+    comps = competences(months)
+
+    tables = {name: [] for name in (
+        'employees', 'evaluations', 'evaluation_workflows', 'evaluation_rounds', 'evaluation_criteria',
+        'evaluation_responses', 'individual_goals', 'v_desempenho_contexto', 'pdi_plans', 'system_config',
+        'usuarios_acessos', 'evaluation_current_period', 'evaluation_periods', 'employee_history',
+        'competence_locks', 'leadertrack_scoreboard_targets', 'leadertrack_scoreboard_token_targets',
+        'relatorios_microambiente', 'relatorios_arquetipos',
+    )}
+
+    # ---------- colaboradores (arvore por tenant) ----------
+    per_tenant = max(1, employees // tenants)
+    emp_id = 0
+    for t in range(1, tenants + 1):
+        cliente_id = f'bench-cliente-{t}'
+        holding_id = f'bench-holding-{t}'
+        tenant_rows = []
+        for i in range(per_tenant):
+            emp_id += 1
+            company = (i % BENCH_COMPANIES_PER_TENANT) + 1
+            branch = (i // BENCH_COMPANIES_PER_TENANT) % BENCH_BRANCHES_PER_COMPANY + 1
+            manager = tenant_rows[(i - 1) // BENCH_MANAGER_SPAN] if i else None
+            code = f'T{t}E{i + 1:06d}'
+            tenant_rows.append({
+                'id': emp_id,
+                'employee_code': code,
+                'nome': f'COLABORADOR {t}-{i + 1:06d}',
+                'cargo': rng.choice(BENCH_ROLES),
+                'nivel': rng.randint(1, 6),
+                'email': f'{code.lower()}@bench{t}.example.com',
+                'emailLider': manager['email'] if manager else None,
+                'manager_code': manager['employee_code'] if manager else None,
+                'manager_name': manager['nome'] if manager else None,
+                'empresa': f'Empresa {t}.{company}',
+                'company_name': f'Empresa {t}.{company}',
+                'branch_name': f'Filial {t}.{company}.{branch}',
+                'department_name': rng.choice(BENCH_DEPARTMENTS),
+                'holding': f'Holding {t}',
+                'business_line': f'Linha {company}',
+                'periodo': rng.choice(BENCH_PERIODS),
+                'employment_status': 'Ativo',
+                'admission_date': (date(2015, 1, 1) + timedelta(days=rng.randint(0, 3500))).isoformat(),
+                'salario': round(rng.uniform(2500, 25000), 2),
+                'cliente_id': cliente_id,
+                'holding_id': holding_id,
+                'empresa_id': f'bench-empresa-{t}-{company}',
+                'filial_id': f'bench-filial-{t}-{company}-{branch}',
+            })
+        tables['employees'].extend(tenant_rows)
+
+        # LeaderTrack: meta por unidade, token por colaborador e respostas.
+        units = sorted({row['empresa'] for row in tenant_rows})
+        for unit in units:
+            unit_rows = [row for row in tenant_rows if row['empresa'] == unit]
+            tables['leadertrack_scoreboard_targets'].append({
+                'id': len(tables['leadertrack_scoreboard_targets']) + 1,
+                'cliente_id': cliente_id,
+                'holding_id': holding_id,
+                'holding_nome': f'Holding {t}',
+                'codrodada': BENCH_LEADERTRACK_ROUND,
+                'unidade': unit,
+                'total_tokens': len(unit_rows) * 2,
+                'active': True,
+            })
+        for row in tenant_rows:
+            for modulo, table_name in (
+                ('microambiente', 'relatorios_microambiente'),
+                ('arquetipos', 'relatorios_arquetipos'),
+            ):
+                tipo = 'autoavaliacao' if row['manager_code'] is None or rng.random() < 0.2 else 'equipe'
+                tables['leadertrack_scoreboard_token_targets'].append({
+                    'id': len(tables['leadertrack_scoreboard_token_targets']) + 1,
+                    'cliente_id': cliente_id,
+                    'holding_id': holding_id,
+                    'empresa_id': row['empresa_id'],
+                    'filial_id': row['filial_id'],
+                    'codrodada': BENCH_LEADERTRACK_ROUND,
+                    'unidade': row['empresa'],
+                    'email': row['email'],
+                    'modulo': modulo,
+                    'tipo': tipo,
+                    'active': True,
+                })
+                if rng.random() < BENCH_LEADERTRACK_RESPONSE_SHARE:
+                    tables[table_name].append({
+                        'id': len(tables[table_name]) + 1,
+                        'empresa': row['empresa'],
+                        'codrodada': BENCH_LEADERTRACK_ROUND,
+                        'tipo': tipo,
+                        'email': row['email'],
+                        'emailLider': row['emailLider'],
+                        'data_criacao': (now - timedelta(minutes=rng.randint(0, 60 * 24 * 20))).isoformat(),
+                    })
+
+    all_employees = tables['employees']
+
+    # ---------- acesso, janela e rodadas ----------
+    tables['usuarios_acessos'].append({
+        'id': 1,
+        'wp_user_email': BENCH_ADMIN_EMAIL,
+        'perfil': 'admin',
+        'cliente_id': None,
+        'holding_id': None,
+        'empresa_id': None,
+        'filial_id': None,
+        'pode_ver_comite_avaliacao': True,
+        'pode_administrar': True,
+        'status': 'ativo',
+    })
+    tables['evaluation_current_period'].append({'id': 1, 'period': BENCH_WINDOW_PERIOD})
+    tables['evaluation_periods'].append({
+        'id': 1,
+        'period': BENCH_WINDOW_PERIOD,
+        'start_at': (now - timedelta(days=30)).isoformat(),
+        'end_at': (now + timedelta(days=30)).isoformat(),
+    })
+    tables['system_config'].append({'id': 1, 'config_key': 'active_round_code', 'config_value': active_round})
+    for idx, (code, _year) in enumerate(codes, start=1):
+        tables['evaluation_rounds'].append({
+            'id': idx,
+            'code': code,
+            'status': 'open' if code == active_round else 'closed',
+            'opened_at': now.isoformat(),
+            'closed_at': None if code == active_round else now.isoformat(),
+        })
+
+    criteria_id = 0
+    for dimension in BENCH_DIMENSIONS:
+        for n in range(1, BENCH_CRITERIA_PER_DIMENSION + 1):
+            criteria_id += 1
+            tables['evaluation_criteria'].append({
+                'id': criteria_id,
+                'dimension': dimension,
+                'type': dimension.lower(),
+                'name': f'{dimension.title()} {n}',
+                'description': f'Criterio {n} da dimensao {dimension.lower()}',
+                'weight': 1,
+            })
+
+    # ---------- avaliacoes, workflow, 9Box e PDI ----------
+    evaluation_id = 0
+    for code, year in codes:
+        for emp in all_employees:
+            if rng.random() > BENCH_EVALUATION_COVERAGE:
+                continue
+            evaluation_id += 1
+            averages = {dim: _rating(rng) for dim in ('institucional_avg', 'funcional_avg', 'individual_avg', 'metas_avg')}
+            final_rating = round(sum(averages.values()) / len(averages), 2)
+            performance = _rating(rng, 1, 10)
+            potential = _rating(rng, 1, 10)
+            nine_box = _nine_box(performance, potential)
+            created_at = (now - timedelta(days=rng.randint(0, 365))).isoformat()
+            tables['evaluations'].append({
+                'id': evaluation_id,
+                'employee_id': emp['id'],
+                'evaluator_id': 1,
+                'evaluation_year': year,
+                'evaluation_date': created_at[:10],
+                'status': 'concluida',
+                **averages,
+                'final_rating': final_rating,
+                'performance_rating': performance,
+                'potential_rating': potential,
+                'nine_box_position': nine_box,
+                'round_code': code,
+                'cliente_id': emp['cliente_id'],
+                'empresa_id': emp['empresa_id'],
+                'filial_id': emp['filial_id'],
+                'created_at': created_at,
+            })
+            tables['evaluation_workflows'].append({
+                'id': evaluation_id,
+                'evaluation_id': evaluation_id,
+                'employee_id': emp['id'],
+                'round_code': code,
+                'workflow_status': rng.choice((
+                    'enviada_ao_comite', 'em_calibracao_no_comite', 'aprovada_pelo_comite', 'feedback_realizado',
+                )),
+                'committee_comment': None,
+                'updated_at': created_at,
+            })
+            tables['v_desempenho_contexto'].append({
+                'evaluation_id': evaluation_id,
+                'employee_id': emp['id'],
+                'employee_name': emp['nome'],
+                'cargo': emp['cargo'],
+                'cliente_id': emp['cliente_id'],
+                'holding_id': emp['holding_id'],
+                'holding_nome': emp['holding'],
+                'empresa_id': emp['empresa_id'],
+                'empresa_nome': emp['company_name'],
+                'filial_id': emp['filial_id'],
+                'filial_nome': emp['branch_name'],
+                'department_name': emp['department_name'],
+                'manager_name': emp['manager_name'],
+                'round_code': code,
+                'ciclo_codigo': code,
+                'evaluation_year': year,
+                'ano_referencia': year,
+                'final_rating': final_rating,
+                'performance_rating': performance,
+                'potential_rating': potential,
+                'nine_box_position': nine_box,
+            })
+            if rng.random() < BENCH_PDI_PLAN_SHARE:
+                tables['pdi_plans'].append({
+                    'id': len(tables['pdi_plans']) + 1,
+                    'employee_id': emp['id'],
+                    'cycle_code': code,
+                    'origin_type': rng.choice(('obrigatorio_desempenho', 'proativo_9box')),
+                    'status': 'em_andamento',
+                    'cliente_id': emp['cliente_id'],
+                    'holding_id': emp['holding_id'],
+                    'empresa_id': emp['empresa_id'],
+                    'filial_id': emp['filial_id'],
+                    'created_at': created_at,
+                })
+
+    # ---------- historico mensal ----------
+    # Meses fechados tem MONTH_SNAPSHOT; o mais recente so tem movimentos
+    # (CREATE/UPDATE), entao /api/employee-history remonta por replay.
+    history = tables['employee_history']
+    snapshot_rows = [_employee_snapshot(emp) for emp in all_employees]
+    for idx, comp in enumerate(comps):
+        comp_iso = comp.isoformat()
+        changed_at = datetime(comp.year, comp.month, 1, 12, tzinfo=timezone.utc)
+        is_open = idx == len(comps) - 1
+        if not is_open:
+            tables['competence_locks'].append({'id': idx + 1, 'competence': comp_iso, 'status': 'CLOSED'})
+            for row in snapshot_rows:
+                history.append({
+                    'id': len(history) + 1,
+                    'employee_id': row['id'],
+                    'competence': comp_iso,
+                    'round_code': None,
+                    'action': 'MONTH_SNAPSHOT',
+                    'changed_at': changed_at.isoformat(),
+                    'changed_by': 'system',
+                    'data': dict(row),
+                })
+        for row in rng.sample(snapshot_rows, int(len(snapshot_rows) * BENCH_MONTHLY_UPDATE_SHARE)):
+            history.append({
+                'id': len(history) + 1,
+                'employee_id': row['id'],
+                'competence': comp_iso,
+                'round_code': None,
+                'action': 'UPDATE',
+                'changed_at': (changed_at + timedelta(minutes=rng.randint(1, 40000))).isoformat(),
+                'changed_by': BENCH_ADMIN_EMAIL,
+                'data': {'salario': round(row['salario'] * 1.05, 2), 'cargo': rng.choice(BENCH_ROLES)},
+            })
+        for n in range(int(len(snapshot_rows) * BENCH_MONTHLY_CREATE_SHARE)):
+            base = rng.choice(snapshot_rows)
+            new_id = emp_id + len(history) + 1
+            history.append({
+                'id': len(history) + 1,
+                'employee_id': new_id,
+                'competence': comp_iso,
+                'round_code': None,
+                'action': 'CREATE',
+                'changed_at': (changed_at + timedelta(minutes=rng.randint(1, 40000))).isoformat(),
+                'changed_by': BENCH_ADMIN_EMAIL,
+                'data': {**base, 'id': new_id, 'nome': f'ADMITIDO {comp_iso} {n + 1:05d}', 'admission_date': comp_iso},
+            })
+
+    return {
+        'tables': tables,
+        'meta': {
+            'employees': len(all_employees),
+            'tenants': tenants,
+            'rounds': [code for code, _ in codes],
+            'active_round_code': active_round,
+            'competences': [c.isoformat() for c in comps],
+            'open_competence': comps[-1].isoformat() if comps else None,
+            'leadertrack_round': BENCH_LEADERTRACK_ROUND,
+            'admin_email': BENCH_ADMIN_EMAIL,
+            'rows': {name: len(rows) for name, rows in tables.items()},
+        },
+    }
+
+
+# ---------- RPCs (mesma assinatura e formato de linha das funcoes SQL) ----------
+def _rpc_hc_month_rows(tables, params, name):
+    competence = str(params.get('p_competence') or '')[:10]
+    out = []
+    for emp in tables.get('employees', []):
+        if str(emp.get('admission_date') or '') > competence:
+            continue
+        out.append({
+            'registro_tipo': 'HC',
+            'employee_id': emp.get('id'),
+            'employee_code': emp.get('employee_code'),
+            'nome': emp.get('nome'),
+            'cargo': emp.get('cargo'),
+            'company_name': emp.get('company_name'),
+            'department_name': emp.get('department_name'),
+            'employment_status': emp.get('employment_status'),
+            'admission_date': emp.get('admission_date'),
+            'manager_name': emp.get('manager_name'),
+            'holding': emp.get('holding'),
+            'salario': emp.get('salario'),
+        })
+    return out
+
+
+def _rpc_active_model(tables, params, name):
+    employee_id = params.get('p_employee_id')
+    emp = next((e for e in tables.get('employees', []) if e.get('id') == employee_id), None)
+    if not emp:
+        return []
+    return [{
+        'modelo_avaliacao_id': 1,
+        'versao_modelo_id': 1,
+        'cliente_id': emp.get('cliente_id'),
+        'holding_id': emp.get('holding_id'),
+        'empresa_id': emp.get('empresa_id'),
+        'filial_id': emp.get('filial_id'),
+    }]
+
+
+def _rpc_active_criteria(tables, params, name):
+    return [
+        {
+            'criterio_id': c['id'],
+            'afirmativa_avaliacao_id': c['id'],
+            'dimensao': c['dimension'],
+            'afirmativa': c['name'],
+            'eixo_9box': 'desempenho' if c['dimension'] != 'INDIVIDUAL' else 'potencial',
+            'peso_usado': c['weight'],
+            'versao_modelo_id': 1,
+        }
+        for c in tables.get('evaluation_criteria', [])
+    ]
+
+
+def _rpc_turnover(tables, params, name):
+    """hrkey_turnover_*: uma linha por mes com ativos, saidas e base de calculo."""
+    start = str(params.get('p_start_month') or '')[:7]
+    end = str(params.get('p_end_month') or '')[:7]
+    active = sum(
+        1 for e in tables.get('employees', [])
+        if not params.get('p_cliente_id') or e.get('cliente_id') == params.get('p_cliente_id')
+    )
+    months = sorted({str(r.get('competence'))[:7] for r in tables.get('competence_locks', [])})
+    out = []
+    for month in months:
+        if (start and month < start) or (end and month > end):
+            continue
+        saidas = max(1, active // 60)
+        out.append({
+            'month': f'{month}-01',
+            'ativos_fim_mes': active,
+            'saidas': saidas,
+            'base_calculo': active + saidas,
+            'turnover': round(saidas / (active + saidas), 6),
+        })
+    return out
+
+
+def register_rpcs(client):
+    client.register_rpc('hc_month_rows', _rpc_hc_month_rows)
+    client.register_rpc('get_active_evaluation_model_for_employee', _rpc_active_model)
+    client.register_rpc('get_active_evaluation_criteria_for_employee', _rpc_active_criteria)
+    client.register_rpc('hrkey_turnover_', _rpc_turnover, prefix=True)
+    client.register_rpc('hrkey_selection_success', lambda tables, params, name: [])
+    return client
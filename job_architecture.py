@@ -1,9 +1,18 @@
+import csv
+import heapq
+import io
+import json
+import math
 import re
+import threading
+import time
 import unicodedata
 from datetime import date, datetime, timezone
 
 from flask import jsonify, request
 
+from query_instrumentation import ContextThreadPoolExecutor
+
 
 WEIGHTS = {
     "conhecimento": 0.22,
@@ -275,69 +284,177 @@ def _consistency_status(alerts, missing):
     }
 
 
-def calculate_score(answers):
-    pillar_values = {pillar: [] for pillar in WEIGHTS.keys()}
-    answer_rows = []
-    missing = []
+PILLAR_ORDER = list(WEIGHTS.keys())
+PILLAR_QUESTION_INDEXES = [
+    [index for index, question in enumerate(QUESTIONS) if question["pillar"] == pillar]
+    for pillar in PILLAR_ORDER
+]
 
-    for question in QUESTIONS:
-        value = _option_value((answers or {}).get(question["id"]))
-        if value is None:
-            missing.append(question["id"])
-            continue
-        pillar_values[question["pillar"]].append(value)
-        answer_rows.append({
-            "question_id": question["id"],
-            "pillar": question["pillar"],
-            "label": question["label"],
-            "value": value,
-            "answer_label": question["options"][value - 1],
-        })
 
+def _answer_matrix(answer_sets):
+    """Matriz cargos x perguntas (ordem de QUESTIONS) com valores 1..5 ou None."""
+    matrix = []
+    for position, answers in enumerate(answer_sets):
+        if isinstance(answers, (list, tuple)):
+            padded = list(answers[:len(QUESTIONS)]) + [None] * (len(QUESTIONS) - len(answers))
+            matrix.append([_option_value(value) for value in padded])
+        elif answers is None or isinstance(answers, dict):
+            answers = answers or {}
+            matrix.append([_option_value(answers.get(question["id"])) for question in QUESTIONS])
+        else:
+            raise ValueError(f"items[{position}].answers deve ser um objeto ou uma lista.")
+    return matrix
+
+
+def _pillar_average_matrix(matrix):
+    """Matriz cargos x pilares (ordem de WEIGHTS) com (media, respondidas)."""
+    out = []
+    for values in matrix:
+        row = []
+        for indexes in PILLAR_QUESTION_INDEXES:
+            answered = [values[index] for index in indexes if values[index] is not None]
+            row.append((sum(answered) / len(answered), len(answered)) if answered else (None, 0))
+        out.append(row)
+    return out
+
+
+def _weighted_scores(pillar_averages, weights):
+    weight_vector = [weights.get(pillar, 0) for pillar in PILLAR_ORDER]
+    scores = []
+    for row in pillar_averages:
+        weighted_average = 0.0
+        total_weight_used = 0.0
+        for (avg, _answered), weight in zip(row, weight_vector):
+            if avg is None:
+                continue
+            weighted_average += avg * weight
+            total_weight_used += weight
+        score = 0
+        if total_weight_used:
+            avg = weighted_average / total_weight_used
+            score = max(0, min(1000, int(round(((avg - 1) / 4) * 1000))))
+        scores.append(score)
+    return scores
+
+
+def _pillar_scores_from_averages(row):
     pillar_scores = {}
-    weighted_average = 0.0
-    total_weight_used = 0.0
-    for pillar, weight in WEIGHTS.items():
-        values = pillar_values.get(pillar) or []
-        if not values:
+    for pillar, (avg, answered) in zip(PILLAR_ORDER, row):
+        if avg is None:
             pillar_scores[pillar] = {"average_raw": None, "score_0_100": None, "answered": 0}
             continue
-        avg = sum(values) / len(values)
         pillar_scores[pillar] = {
             "average_raw": round(avg, 2),
             "score_0_100": round(((avg - 1) / 4) * 100, 1),
-            "answered": len(values),
+            "answered": answered,
         }
-        weighted_average += avg * weight
-        total_weight_used += weight
-
-    score = 0
-    if total_weight_used:
-        avg = weighted_average / total_weight_used
-        score = max(0, min(1000, int(round(((avg - 1) / 4) * 1000))))
-
-    sorted_pillars = sorted(
-        [{"pillar": pillar, **data} for pillar, data in pillar_scores.items() if data.get("score_0_100") is not None],
-        key=lambda row: row["score_0_100"],
-        reverse=True,
-    )
+    return pillar_scores
+
+
+def calculate_scores_batch(answer_sets, weights=None, include_details=True):
+    """
+    Calcula varias avaliacoes de uma vez. Com include_details=True cada item e
+    identico ao retorno de calculate_score; com False devolve apenas score,
+    classe, pilares, dimensoes, alertas e consistencia.
+    """
+    weights = weights or WEIGHTS
+    matrix = _answer_matrix(answer_sets)
+    pillar_averages = _pillar_average_matrix(matrix)
+    scores = _weighted_scores(pillar_averages, weights)
+
+    results = []
+    for values, averages, score in zip(matrix, pillar_averages, scores):
+        missing = [QUESTIONS[index]["id"] for index, value in enumerate(values) if value is None]
+        if include_details:
+            answer_rows = [{
+                "question_id": question["id"],
+                "pillar": question["pillar"],
+                "label": question["label"],
+                "value": value,
+                "answer_label": question["options"][value - 1],
+            } for question, value in zip(QUESTIONS, values) if value is not None]
+        else:
+            answer_rows = [
+                {"question_id": question["id"], "value": value}
+                for question, value in zip(QUESTIONS, values)
+                if value is not None
+            ]
+
+        pillar_scores = _pillar_scores_from_averages(averages)
+        methodology_scores = _methodology_dimension_scores(answer_rows)
+        alerts = _alerts(answer_rows, pillar_scores, methodology_scores)
+        result = {
+            "score": score,
+            "job_class": _class_for_score(score),
+            "pillar_scores": pillar_scores,
+            "methodology_dimensions": methodology_scores,
+            "missing_questions": missing,
+            "alerts": alerts,
+            "consistency": _consistency_status(alerts, missing),
+        }
+        if include_details:
+            sorted_pillars = sorted(
+                [{"pillar": pillar, **data} for pillar, data in pillar_scores.items() if data.get("score_0_100") is not None],
+                key=lambda row: row["score_0_100"],
+                reverse=True,
+            )
+            result = {
+                "score": score,
+                "job_class": result["job_class"],
+                "pillar_scores": pillar_scores,
+                "methodology_dimensions": methodology_scores,
+                "methodology_model": METHODOLOGY_DIMENSIONS,
+                "strongest_pillars": sorted_pillars[:2],
+                "weakest_pillars": sorted_pillars[-2:],
+                "answers": answer_rows,
+                "missing_questions": missing,
+                "completion": {"answered": len(answer_rows), "total": len(QUESTIONS), "percent": round((len(answer_rows) / len(QUESTIONS)) * 100, 1)},
+                "alerts": alerts,
+                "consistency": result["consistency"],
+            }
+        results.append(result)
+    return results
+
+
+def calculate_weight_sensitivity(answer_sets, weight_sets):
+    """
+    Recalcula score e classe de cada cargo para cada cenario de pesos. As
+    medias por pilar sao calculadas uma unica vez; cada cenario e so uma
+    combinacao ponderada sobre essa matriz.
+    """
+    pillar_averages = _pillar_average_matrix(_answer_matrix(answer_sets))
+    scenarios = []
+    for weights in weight_sets:
+        scores = _weighted_scores(pillar_averages, weights)
+        scenarios.append({
+            "weights": weights,
+            "results": [
+                {"score": score, "class_code": _class_for_score(score)["class_code"]}
+                for score in scores
+            ],
+        })
+    return scenarios
+
+
+def _weights_from_payload(raw_weights):
+    if not raw_weights:
+        return dict(WEIGHTS)
+    if not isinstance(raw_weights, dict):
+        raise ValueError("weights deve ser um objeto pilar -> peso.")
+    unknown = [key for key in raw_weights if key not in WEIGHTS]
+    if unknown:
+        raise ValueError(f"Pilares desconhecidos em weights: {', '.join(unknown)}.")
+    weights = dict(WEIGHTS)
+    for pillar, raw_value in raw_weights.items():
+        value = float(raw_value)
+        if value < 0:
+            raise ValueError("Pesos nao podem ser negativos.")
+        weights[pillar] = value
+    return weights
 
-    methodology_scores = _methodology_dimension_scores(answer_rows)
-    alerts = _alerts(answer_rows, pillar_scores, methodology_scores)
-    return {
-        "score": score,
-        "job_class": _class_for_score(score),
-        "pillar_scores": pillar_scores,
-        "methodology_dimensions": methodology_scores,
-        "methodology_model": METHODOLOGY_DIMENSIONS,
-        "strongest_pillars": sorted_pillars[:2],
-        "weakest_pillars": sorted_pillars[-2:],
-        "answers": answer_rows,
-        "missing_questions": missing,
-        "completion": {"answered": len(answer_rows), "total": len(QUESTIONS), "percent": round((len(answer_rows) / len(QUESTIONS)) * 100, 1)},
-        "alerts": alerts,
-        "consistency": _consistency_status(alerts, missing),
-    }
+
+def calculate_score(answers, weights=None):
+    return calculate_scores_batch([answers], weights)[0]
 
 
 def _table_error(error):
@@ -368,6 +485,57 @@ def _safe_select(supabase, table_name, select_fields="*", filters=None, order_by
         return {"ok": False, "table": table_name, "error": str(exc), "data": []}
 
 
+IN_FILTER_CHUNK_SIZE = 200
+IN_FILTER_PAGE_SIZE = 1000
+COHORT_MAX_EMPLOYEES = 2000
+COHORT_LOADER_WORKERS = 6
+
+
+def _safe_select_in(supabase, table_name, select_fields, column, values, order_by=None, desc=True, ctx=None):
+    """
+    Como _safe_select, mas filtrando `column IN values` em blocos para nao estourar a URL.
+    Cada bloco e paginado com range() ate vir uma pagina curta (db-max-rows corta em 1000).
+    Com ctx, cada bloco tambem fica restrito ao contexto (cliente/holding/empresa/filial).
+    """
+    values = sorted({value for value in values if value not in [None, ""]}, key=str)
+    rows = []
+    try:
+        for start in range(0, len(values), IN_FILTER_CHUNK_SIZE):
+            offset = 0
+            while True:
+                query = supabase.table(table_name).select(select_fields).in_(column, values[start:start + IN_FILTER_CHUNK_SIZE])
+                if ctx:
+                    query = _apply_context(query, ctx)
+                if order_by:
+                    query = query.order(order_by, desc=desc)
+                page = query.order("id", desc=False).range(offset, offset + IN_FILTER_PAGE_SIZE - 1).execute().data or []
+                rows.extend(page)
+                if len(page) < IN_FILTER_PAGE_SIZE:
+                    break
+                offset += IN_FILTER_PAGE_SIZE
+        if order_by:
+            rows.sort(key=lambda row: str(row.get(order_by) or ""), reverse=desc)
+        return {"ok": True, "table": table_name, "data": rows}
+    except Exception as exc:
+        return {"ok": False, "table": table_name, "error": str(exc), "data": rows}
+
+
+def _group_rows(rows, key, limit=None):
+    grouped = {}
+    for row in rows:
+        bucket = grouped.setdefault(str(row.get(key)), [])
+        if limit is None or len(bucket) < limit:
+            bucket.append(row)
+    return grouped
+
+
+def _source_slice(result, rows):
+    sliced = {"ok": result.get("ok"), "table": result.get("table"), "data": rows}
+    if result.get("error"):
+        sliced["error"] = result["error"]
+    return sliced
+
+
 def _normalize_job_title(title):
     raw = str(title or "").strip()
     if not raw:
@@ -412,6 +580,99 @@ def _similarity(left, right):
     return len(left_tokens & right_tokens) / len(left_tokens | right_tokens)
 
 
+HAY_TITLE_INDEX_TTL_SECONDS = 600
+HAY_TITLE_INDEX_PAGE_SIZE = 1000
+_HAY_TITLE_INDEXES = {}
+_HAY_TITLE_INDEX_LOCK = threading.Lock()
+
+
+def _context_key(ctx):
+    return tuple(ctx.get(key) or "" for key in ["cliente_id", "holding_id", "empresa_id", "filial_id"])
+
+
+def _build_hay_title_index(rows):
+    # Indice invertido token -> ids de benchmark. A similaridade continua sendo
+    # Jaccard sobre _title_tokens, igual a _similarity, mas so para candidatos
+    # que compartilham ao menos um token com o titulo buscado.
+    entries = {}
+    postings = {}
+    for row in rows:
+        row_id = row.get("id")
+        normalized = _clean(row.get("normalized_title")) or _normalize_job_title(row.get("original_title"))
+        tokens = _title_tokens(normalized or "")
+        if row_id is None or not tokens:
+            continue
+        entries[row_id] = {"row": row, "normalized_title": normalized, "tokens": tokens}
+        for token in tokens:
+            postings.setdefault(token, set()).add(row_id)
+    return {"entries": entries, "postings": postings, "built_at": time.monotonic()}
+
+
+def _load_hay_benchmark_rows(supabase, ctx):
+    rows = []
+    offset = 0
+    while True:
+        result = (
+            _apply_context(supabase.table("job_hay_benchmark_imports").select("*"), ctx)
+            .order("id", desc=False)
+            .range(offset, offset + HAY_TITLE_INDEX_PAGE_SIZE - 1)
+            .execute()
+        )
+        page = result.data or []
+        rows.extend(page)
+        if len(page) < HAY_TITLE_INDEX_PAGE_SIZE:
+            break
+        offset += HAY_TITLE_INDEX_PAGE_SIZE
+    return rows
+
+
+def _get_hay_title_index(supabase, ctx, refresh=False):
+    key = _context_key(ctx)
+    with _HAY_TITLE_INDEX_LOCK:
+        index = _HAY_TITLE_INDEXES.get(key)
+    if index and not refresh and time.monotonic() - index["built_at"] < HAY_TITLE_INDEX_TTL_SECONDS:
+        return index
+    index = _build_hay_title_index(_load_hay_benchmark_rows(supabase, ctx))
+    with _HAY_TITLE_INDEX_LOCK:
+        _HAY_TITLE_INDEXES[key] = index
+    return index
+
+
+def _invalidate_hay_title_indexes(cliente_id):
+    # Um import afeta qualquer contexto do mesmo cliente (holding/empresa/filial
+    # sao filtros mais estreitos sobre as mesmas linhas). O matcher de
+    # documentos fonte usa os mesmos benchmarks e os cargos do cliente.
+    with _HAY_TITLE_INDEX_LOCK:
+        for key in [key for key in _HAY_TITLE_INDEXES if key[0] == (cliente_id or "")]:
+            _HAY_TITLE_INDEXES.pop(key, None)
+    with _POSITION_MATCH_INDEX_LOCK:
+        for key in [key for key in _POSITION_MATCH_INDEXES if key[0] == (cliente_id or "")]:
+            _POSITION_MATCH_INDEXES.pop(key, None)
+
+
+def _search_hay_title_index(index, title, top_k=5, min_score=0.0):
+    normalized = _normalize_job_title(title)
+    tokens = _title_tokens(normalized)
+    shared_by_id = {}
+    for token in tokens:
+        for row_id in index["postings"].get(token, ()):
+            shared_by_id[row_id] = shared_by_id.get(row_id, 0) + 1
+
+    matches = []
+    for row_id, shared in shared_by_id.items():
+        entry = index["entries"][row_id]
+        score = shared / (len(tokens) + len(entry["tokens"]) - shared)
+        if entry["normalized_title"] == normalized:
+            score = 1.0
+        if score < min_score:
+            continue
+        matches.append({**entry["row"], "similarity": round(score, 4)})
+
+    matches.sort(key=lambda row: str(row.get("imported_at") or ""), reverse=True)
+    matches.sort(key=lambda row: row["similarity"], reverse=True)
+    return matches[:top_k]
+
+
 def _first_clean(row, keys):
     for key in keys:
         value = _clean((row or {}).get(key))
@@ -444,6 +705,580 @@ def _sort_context_options(options):
     return sorted(options.values(), key=lambda row: (row.get("label") or "").lower())
 
 
+HAY_IMPORT_BATCH_SIZE = 500
+# holding/empresa/filial costumam vir nulos: os indices unicos precisam de
+# NULLS NOT DISTINCT para o upsert reconhecer o conflito.
+HAY_BENCHMARK_UPSERT_KEY = "cliente_id,holding_id,empresa_id,filial_id,source_file_name,normalized_title"
+HAY_FACTOR_UPSERT_KEY = "hay_benchmark_import_id,factor_name,source_row,source_column"
+HAY_FACTOR_POSITION_KEYS = ("source_row", "source_column")
+
+
+def _is_dry_run(value):
+    return False if str(value).lower() in ["false", "0", "nao", "não"] else bool(value)
+
+
+def _batched(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _dedupe_by_key(rows, keys):
+    # Upsert no PostgREST falha se o mesmo conflito aparece duas vezes no lote.
+    by_key = {}
+    for row in rows:
+        by_key[tuple(row.get(key) for key in keys)] = row
+    return list(by_key.values())
+
+
+def _has_factor_position(row):
+    # Fator sem linha/coluna de origem nao tem identidade para upsert: dois
+    # fatores iguais sem posicao sao pontos distintos e nao podem colapsar.
+    return any(row.get(key) is not None for key in HAY_FACTOR_POSITION_KEYS)
+
+
+def _iter_upload_rows(file_storage):
+    """Le CSV ou NDJSON linha a linha a partir do upload (spool em disco do werkzeug)."""
+    file_name = str(file_storage.filename or "").lower()
+    file_storage.stream.seek(0)
+    stream = io.TextIOWrapper(file_storage.stream, encoding="utf-8-sig", newline="")
+    try:
+        if file_name.endswith(".csv") or "csv" in str(file_storage.mimetype or ""):
+            for row in csv.DictReader(stream):
+                yield {
+                    str(key or "").strip(): (value if value not in [None, ""] else None)
+                    for key, value in row.items()
+                    if key
+                }
+            return
+
+        for line_number, line in enumerate(stream, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                raise ValueError(f"Linha {line_number} invalida no NDJSON.")
+            if isinstance(row, dict):
+                yield row
+    finally:
+        # solta o upload sem fechar: a gravacao rele o arquivo depois da validacao
+        stream.detach()
+
+
+def _hay_benchmark_row(ctx, source_file_name, row):
+    title = str(row.get("cargo") or row.get("original_title") or "").strip()
+    if not title:
+        return None
+    profile_value = _profile_value(row.get("profile_value")) if row.get("profile_value") not in [None, ""] else None
+    return {
+        **ctx,
+        "source_file_name": source_file_name,
+        "original_title": title,
+        "normalized_title": _normalize_job_title(title),
+        "hay_points": row.get("total_points") or row.get("hay_points"),
+        "hay_grade": row.get("grade") or row.get("hay_grade"),
+        "hay_profile_value": profile_value,
+        "hay_factor_data": {
+            "know_how_level": row.get("know_how_level"),
+            "know_how_points": row.get("know_how_points"),
+            "problem_solving_level": row.get("problem_solving_level"),
+            "problem_solving_points": row.get("problem_solving_points"),
+            "accountability_level": row.get("accountability_level"),
+            "accountability_points": row.get("accountability_points"),
+            "long_profile": row.get("long_profile"),
+            "source_sheet": row.get("source_sheet"),
+            "source_row": row.get("source_row"),
+        },
+        "calibration_notes": row.get("remarks"),
+    }
+
+
+def _hay_position_candidate(ctx, benchmark, position_candidate_status):
+    now_iso = datetime.now(timezone.utc).isoformat()
+    return {
+        **ctx,
+        "title": benchmark["original_title"],
+        "normalized_title": benchmark["normalized_title"],
+        "current_grade_code": _clean(benchmark.get("hay_grade")),
+        "current_profile_value": benchmark.get("hay_profile_value"),
+        "status": position_candidate_status,
+        "source": "hay_benchmark_import",
+        "approval_notes": "Cargo aprovado historicamente na metodologia Hay. Requer revisao para aprovacao The HR Key.",
+        "created_at": now_iso,
+        "updated_at": now_iso,
+    }
+
+
+def _hay_factor_row(hay_benchmark_import_id, factor):
+    return {
+        "hay_benchmark_import_id": hay_benchmark_import_id,
+        "factor_name": factor.get("factor_name"),
+        "factor_level": factor.get("factor_level"),
+        "factor_profile": factor.get("factor_profile"),
+        "points": factor.get("points"),
+        "source_sheet": factor.get("source_sheet"),
+        "source_row": factor.get("source_row"),
+        "source_column": factor.get("source_column"),
+        "raw_label": factor.get("cargo"),
+    }
+
+
+def _import_hay_benchmark_stream(
+    supabase,
+    ctx,
+    records,
+    factor_records,
+    source_file_name,
+    dry_run=True,
+    create_position_candidates=False,
+    position_candidate_status="aprovado_hay",
+    batch_size=HAY_IMPORT_BATCH_SIZE,
+    progress=None,
+):
+    """
+    Pipeline de importacao Hay em lotes. `records` e `factor_records` sao
+    iteraveis (listas do JSON ou geradores de upload); nada alem do mapa
+    titulo -> id importado fica em memoria entre lotes. `progress`, se vier,
+    e o dict de contadores (fica com o parcial se um lote falhar).
+    """
+    stats = progress if progress is not None else {}
+    stats.update({
+        "batches": 0,
+        "benchmark_rows": 0,
+        "benchmark_rows_skipped": 0,
+        "factor_rows_received": 0,
+        "factor_rows": 0,
+        "factor_rows_unmatched": 0,
+        "position_candidates_received": 0,
+        "position_candidates_created": 0,
+        "position_candidates_already_existing": 0,
+    })
+
+    existing_position_norms = set()
+    if create_position_candidates:
+        existing_rows = _apply_context(
+            supabase.table("job_positions").select("id,normalized_title"),
+            ctx,
+        ).execute().data or []
+        existing_position_norms = {
+            _clean(row.get("normalized_title"))
+            for row in existing_rows
+            if _clean(row.get("normalized_title"))
+        }
+
+    seen_candidate_titles = set()
+    imported_ids_by_title = {}
+    for batch in _batched(records, batch_size):
+        benchmark_rows = []
+        candidates = []
+        for row in batch:
+            benchmark = _hay_benchmark_row(ctx, source_file_name, row)
+            if not benchmark:
+                stats["benchmark_rows_skipped"] += 1
+                continue
+            benchmark_rows.append(benchmark)
+            normalized_title = benchmark["normalized_title"]
+            if create_position_candidates and normalized_title and normalized_title not in seen_candidate_titles:
+                seen_candidate_titles.add(normalized_title)
+                stats["position_candidates_received"] += 1
+                if normalized_title in existing_position_norms:
+                    stats["position_candidates_already_existing"] += 1
+                else:
+                    candidates.append(_hay_position_candidate(ctx, benchmark, position_candidate_status))
+
+        if dry_run:
+            stats["batches"] += 1
+            stats["benchmark_rows"] += len(benchmark_rows)
+            stats["position_candidates_created"] += len(candidates)
+            for benchmark in benchmark_rows:
+                imported_ids_by_title[benchmark["normalized_title"]] = None
+            continue
+
+        benchmark_rows = _dedupe_by_key(benchmark_rows, HAY_BENCHMARK_UPSERT_KEY.split(","))
+        upserted = supabase.table("job_hay_benchmark_imports").upsert(
+            benchmark_rows,
+            on_conflict=HAY_BENCHMARK_UPSERT_KEY,
+        ).execute().data or []
+        stats["benchmark_rows"] += len(upserted)
+        for row in upserted:
+            if row.get("id"):
+                imported_ids_by_title[_normalize_job_title(row.get("original_title"))] = row["id"]
+
+        if candidates:
+            inserted_positions = supabase.table("job_positions").insert(candidates).execute().data or []
+            stats["position_candidates_created"] += len(inserted_positions)
+        stats["batches"] += 1
+
+    for batch in _batched(factor_records, batch_size):
+        factor_payload = []
+        for factor in batch:
+            stats["factor_rows_received"] += 1
+            title_key = _normalize_job_title(factor.get("cargo"))
+            if title_key not in imported_ids_by_title:
+                stats["factor_rows_unmatched"] += 1
+                continue
+            if dry_run:
+                stats["factor_rows"] += 1
+                continue
+            factor_payload.append(_hay_factor_row(imported_ids_by_title[title_key], factor))
+
+        positioned = _dedupe_by_key(
+            [row for row in factor_payload if _has_factor_position(row)],
+            HAY_FACTOR_UPSERT_KEY.split(","),
+        )
+        unpositioned = [row for row in factor_payload if not _has_factor_position(row)]
+        if positioned:
+            upserted_factors = supabase.table("job_hay_benchmark_factor_points").upsert(
+                positioned,
+                on_conflict=HAY_FACTOR_UPSERT_KEY,
+            ).execute().data or []
+            stats["factor_rows"] += len(upserted_factors)
+        if unpositioned:
+            inserted_factors = supabase.table("job_hay_benchmark_factor_points").insert(unpositioned).execute().data or []
+            stats["factor_rows"] += len(inserted_factors)
+
+    return stats
+
+
+def _validate_and_import_hay_benchmark(
+    supabase,
+    ctx,
+    open_records,
+    open_factor_records,
+    source_file_name,
+    dry_run=True,
+    **options,
+):
+    """
+    Valida o arquivo inteiro (passada dry-run) antes de gravar qualquer lote.
+    `open_records`/`open_factor_records` devolvem um iteravel novo a cada
+    chamada. Se um lote falhar na gravacao, o retorno traz partial_import com
+    o que ja foi gravado em vez de esconder a importacao parcial.
+    """
+    stats = _import_hay_benchmark_stream(
+        supabase, ctx, open_records(), open_factor_records(), source_file_name, dry_run=True, **options
+    )
+    if dry_run:
+        return stats
+
+    written = {}
+    try:
+        return _import_hay_benchmark_stream(
+            supabase, ctx, open_records(), open_factor_records(), source_file_name,
+            dry_run=False, progress=written, **options
+        )
+    except Exception as exc:
+        return {**stats, **written, "partial_import": True, "error": str(exc)}
+
+
+# Matcher documento fonte -> cargo/benchmark Hay. TF-IDF sobre titulo (com
+# peso extra) e texto, com indice invertido token -> [(candidato, peso)]
+# montado uma vez por contexto. A consulta usa so os termos mais pesados do
+# documento, entao milhares de documentos contra milhares de candidatos
+# rodam em segundos.
+TEXT_STOPWORDS = {
+    "a", "o", "as", "os", "de", "da", "do", "das", "dos", "e", "em", "no", "na", "nos", "nas",
+    "um", "uma", "para", "por", "com", "sem", "que", "se", "ao", "aos", "ou", "sua", "seu",
+    "suas", "seus", "pelo", "pela", "como", "mais", "entre", "sobre",
+}
+MATCH_TITLE_BOOST = 3
+MATCH_QUERY_MAX_TERMS = 40
+MATCH_TITLE_WEIGHT = 0.6
+MATCH_STRONG_THRESHOLD = 0.75
+MATCH_INDEX_TTL_SECONDS = 600
+MATCH_WRITE_WORKERS = 4
+# match_confidence gravado com 2 casas: documentos com o mesmo par
+# (confianca, status) vao num UPDATE so, filtrado por id.
+MATCH_CONFIDENCE_DECIMALS = 2
+_POSITION_MATCH_INDEXES = {}
+_POSITION_MATCH_INDEX_LOCK = threading.Lock()
+
+
+def _text_tokens(text):
+    normalized = _normalize_job_title(text)
+    return [token for token in normalized.split() if len(token) > 1 and token not in TEXT_STOPWORDS]
+
+
+def _flatten_text(value):
+    if value in [None, ""]:
+        return ""
+    if isinstance(value, dict):
+        return " ".join(_flatten_text(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return " ".join(_flatten_text(v) for v in value)
+    return str(value)
+
+
+def _term_counts(title, body):
+    counts = {}
+    for token in _text_tokens(body):
+        counts[token] = counts.get(token, 0) + 1
+    for token in _text_tokens(title):
+        counts[token] = counts.get(token, 0) + MATCH_TITLE_BOOST
+    return counts
+
+
+def _tfidf_vector(counts, idf):
+    vector = {token: (1 + math.log(count)) * idf.get(token, 0.0) for token, count in counts.items()}
+    norm = math.sqrt(sum(weight * weight for weight in vector.values()))
+    if not norm:
+        return {}
+    return {token: weight / norm for token, weight in vector.items() if weight}
+
+
+def _build_tfidf_index(documents):
+    """documents: [(key, title, body, row)] -> indice com idf, postings e titulos normalizados."""
+    counts_by_key = {}
+    document_frequency = {}
+    for key, title, body, row in documents:
+        counts = _term_counts(title, body)
+        if not counts:
+            continue
+        counts_by_key[key] = (counts, _normalize_job_title(title), row)
+        for token in counts:
+            document_frequency[token] = document_frequency.get(token, 0) + 1
+
+    total = len(counts_by_key)
+    idf = {token: math.log((total + 1) / (df + 1)) + 1 for token, df in document_frequency.items()}
+    postings = {}
+    title_postings = {}
+    entries = {}
+    for key, (counts, normalized_title, row) in counts_by_key.items():
+        for token, weight in _tfidf_vector(counts, idf).items():
+            postings.setdefault(token, []).append((key, weight))
+        title_tokens = _title_tokens(normalized_title)
+        for token in title_tokens:
+            title_postings.setdefault(token, []).append(key)
+        entries[key] = {"row": row, "normalized_title": normalized_title, "title_size": len(title_tokens)}
+    return {
+        "idf": idf,
+        "postings": postings,
+        "title_postings": title_postings,
+        "entries": entries,
+        "built_at": time.monotonic(),
+    }
+
+
+def _rank_tfidf(index, title, body, top_k=5):
+    query = _tfidf_vector(_term_counts(title, body), index["idf"])
+    terms = sorted(query.items(), key=lambda item: item[1], reverse=True)[:MATCH_QUERY_MAX_TERMS]
+    scores = {}
+    for token, weight in terms:
+        for key, doc_weight in index["postings"].get(token, ()):
+            scores[key] = scores.get(key, 0.0) + weight * doc_weight
+
+    # Jaccard de titulo (mesma regra de _similarity) pelos postings de titulo.
+    normalized = _normalize_job_title(title)
+    query_title_tokens = _title_tokens(normalized)
+    shared_by_key = {}
+    for token in query_title_tokens:
+        for key in index["title_postings"].get(token, ()):
+            shared_by_key[key] = shared_by_key.get(key, 0) + 1
+
+    ranked = []
+    for key in set(scores) | set(shared_by_key):
+        entry = index["entries"][key]
+        shared = shared_by_key.get(key, 0)
+        if normalized and entry["normalized_title"] == normalized:
+            title_score = 1.0
+        elif shared:
+            title_score = shared / (len(query_title_tokens) + entry["title_size"] - shared)
+        else:
+            title_score = 0.0
+        cosine = scores.get(key, 0.0)
+        score = MATCH_TITLE_WEIGHT * title_score + (1 - MATCH_TITLE_WEIGHT) * min(cosine, 1.0)
+        ranked.append((score, title_score, cosine, key))
+    ranked = heapq.nlargest(top_k, ranked, key=lambda item: item[0])
+    return [
+        {
+            "candidate_type": key[0],
+            "candidate_id": key[1],
+            "title": index["entries"][key]["row"].get("title"),
+            "similarity": round(score, 4),
+            "title_similarity": round(title_score, 4),
+            "text_similarity": round(cosine, 4),
+        }
+        for score, title_score, cosine, key in ranked
+    ]
+
+
+def _position_match_documents(positions, hay_rows):
+    documents = []
+    for row in positions:
+        title = _clean(row.get("title")) or ""
+        body = _flatten_text([row.get("mission"), row.get("responsibilities"), row.get("deliverables"), row.get("job_family"), row.get("area")])
+        documents.append((("job_position", row.get("id")), title, body, {"id": row.get("id"), "title": title}))
+    for row in hay_rows:
+        title = _first_clean(row, ["original_title", "title", "normalized_title"]) or ""
+        body = _flatten_text([row.get("job_family"), row.get("function"), row.get("description")])
+        documents.append((("hay_benchmark", row.get("id")), title, body, {"id": row.get("id"), "title": title}))
+    return [doc for doc in documents if doc[0][1] is not None]
+
+
+def _load_context_rows(supabase, table_name, ctx, select_fields="*", page_size=HAY_TITLE_INDEX_PAGE_SIZE):
+    rows = []
+    offset = 0
+    while True:
+        page = (
+            _apply_context(supabase.table(table_name).select(select_fields), ctx)
+            .order("id", desc=False)
+            .range(offset, offset + page_size - 1)
+            .execute()
+        ).data or []
+        rows.extend(page)
+        if len(page) < page_size:
+            return rows
+        offset += page_size
+
+
+def _get_position_match_index(supabase, ctx, refresh=False):
+    key = _context_key(ctx)
+    with _POSITION_MATCH_INDEX_LOCK:
+        index = _POSITION_MATCH_INDEXES.get(key)
+    if index and not refresh and time.monotonic() - index["built_at"] < MATCH_INDEX_TTL_SECONDS:
+        return index
+    positions = _load_context_rows(
+        supabase,
+        "job_positions",
+        ctx,
+        "id,title,normalized_title,mission,responsibilities,deliverables,job_family,area",
+    )
+    index = _build_tfidf_index(_position_match_documents(positions, _load_hay_benchmark_rows(supabase, ctx)))
+    with _POSITION_MATCH_INDEX_LOCK:
+        _POSITION_MATCH_INDEXES[key] = index
+    return index
+
+
+def _source_document_match_text(document):
+    title = _clean(document.get("extracted_title")) or _clean(document.get("normalized_title")) or ""
+    body = _flatten_text([document.get("extracted_text"), document.get("sections_detected")])
+    return title, body
+
+
+def _source_quality_status(similarity):
+    if similarity is not None and similarity >= MATCH_STRONG_THRESHOLD:
+        return "match_forte_nao_revisado"
+    return "referencia_nao_revisada"
+
+
+# Busca textual nos documentos fonte de descricao de cargo. Indice invertido
+# local por contexto (BM25 com peso por campo), com o texto guardado so para
+# montar trechos; a listagem deixa de trafegar extracted_text por padrao.
+SOURCE_DOCUMENT_LIGHT_FIELDS = (
+    "id,cliente_id,holding_id,empresa_id,filial_id,source_file_name,source_relative_path,"
+    "source_folder,extracted_title,normalized_title,match_confidence,source_quality_status,"
+    "manual_review_required,notes,imported_at"
+)
+SOURCE_DOCUMENT_FIELD_BOOSTS = {"extracted_title": 3.0, "sections_detected": 1.5, "extracted_text": 1.0}
+SEARCH_BM25_K1 = 1.2
+SEARCH_BM25_B = 0.75
+SEARCH_SNIPPET_WORDS = 30
+SEARCH_INDEX_TTL_SECONDS = 600
+_SOURCE_DOCUMENT_INDEXES = {}
+_SOURCE_DOCUMENT_INDEX_LOCK = threading.Lock()
+
+
+def _fold_word(word):
+    text = unicodedata.normalize("NFKD", str(word or ""))
+    return "".join(ch for ch in text if not unicodedata.combining(ch)).lower()
+
+
+def _build_source_document_index(documents):
+    postings = {}
+    lengths = {}
+    entries = {}
+    light_fields = SOURCE_DOCUMENT_LIGHT_FIELDS.split(",")
+    for document in documents:
+        doc_id = document.get("id")
+        if doc_id is None:
+            continue
+        weighted = {}
+        for field, boost in SOURCE_DOCUMENT_FIELD_BOOSTS.items():
+            for token in _text_tokens(_flatten_text(document.get(field))):
+                weighted[token] = weighted.get(token, 0.0) + boost
+        if not weighted:
+            continue
+        for token, tf in weighted.items():
+            postings.setdefault(token, {})[doc_id] = tf
+        lengths[doc_id] = sum(weighted.values())
+        entries[doc_id] = {
+            "row": {field: document.get(field) for field in light_fields},
+            "text": str(document.get("extracted_text") or ""),
+        }
+    average = (sum(lengths.values()) / len(lengths)) if lengths else 0.0
+    return {"postings": postings, "lengths": lengths, "average_length": average, "entries": entries, "built_at": time.monotonic()}
+
+
+def _get_source_document_index(supabase, ctx, refresh=False):
+    key = _context_key(ctx)
+    with _SOURCE_DOCUMENT_INDEX_LOCK:
+        index = _SOURCE_DOCUMENT_INDEXES.get(key)
+    if index and not refresh and time.monotonic() - index["built_at"] < SEARCH_INDEX_TTL_SECONDS:
+        return index
+    index = _build_source_document_index(_load_context_rows(supabase, "job_position_description_source_documents", ctx))
+    with _SOURCE_DOCUMENT_INDEX_LOCK:
+        _SOURCE_DOCUMENT_INDEXES[key] = index
+    return index
+
+
+def _invalidate_source_document_indexes(cliente_id):
+    with _SOURCE_DOCUMENT_INDEX_LOCK:
+        for key in [key for key in _SOURCE_DOCUMENT_INDEXES if key[0] == (cliente_id or "")]:
+            _SOURCE_DOCUMENT_INDEXES.pop(key, None)
+
+
+def _snippet(text, terms, size=SEARCH_SNIPPET_WORDS):
+    """Janela de `size` palavras com mais ocorrencias dos termos buscados."""
+    words = text.split()
+    if not words:
+        return ""
+    hits = [i for i, word in enumerate(words) if _fold_word(re.sub(r"\W+", "", word)) in terms]
+    if not hits:
+        return " ".join(words[:size]) + (" ..." if len(words) > size else "")
+
+    best_start, best_count = hits[0], 0
+    right = 0
+    for left, start in enumerate(hits):
+        while right < len(hits) and hits[right] < start + size:
+            right += 1
+        if right - left > best_count:
+            best_start, best_count = start, right - left
+    start = max(0, best_start - size // 4)
+    end = min(len(words), start + size)
+    return ("... " if start else "") + " ".join(words[start:end]) + (" ..." if end < len(words) else "")
+
+
+def _search_source_documents(index, query, limit=20, status=None):
+    tokens = list(dict.fromkeys(_text_tokens(query)))
+    total = len(index["entries"])
+    scores = {}
+    for token in tokens:
+        docs = index["postings"].get(token)
+        if not docs:
+            continue
+        idf = math.log(1 + (total - len(docs) + 0.5) / (len(docs) + 0.5))
+        for doc_id, tf in docs.items():
+            norm = 1 - SEARCH_BM25_B + SEARCH_BM25_B * index["lengths"][doc_id] / (index["average_length"] or 1.0)
+            scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (SEARCH_BM25_K1 + 1) / (tf + SEARCH_BM25_K1 * norm)
+
+    if status:
+        scores = {doc_id: score for doc_id, score in scores.items() if index["entries"][doc_id]["row"].get("source_quality_status") == status}
+
+    terms = set(tokens) | {_fold_word(word) for word in re.findall(r"\w+", str(query or ""))}
+    results = []
+    for doc_id, score in heapq.nlargest(limit, scores.items(), key=lambda item: item[1]):
+        entry = index["entries"][doc_id]
+        results.append({**entry["row"], "score": round(score, 4), "snippet": _snippet(entry["text"], terms)})
+    return {"total_matches": len(scores), "terms": tokens, "results": results}
+
+
 def register_job_architecture_routes(app, supabase, require_rh_code):
     @app.route("/api/job-architecture/questions", methods=["GET", "OPTIONS"])
     def api_job_architecture_questions():
@@ -600,6 +1435,50 @@ def register_job_architecture_routes(app, supabase, require_rh_code):
             },
         }), 200
 
+    @app.route("/api/job-architecture/evaluate-batch", methods=["POST", "OPTIONS"])
+    def api_job_architecture_evaluate_batch():
+        if request.method == "OPTIONS":
+            return ("", 204)
+        try:
+            data = request.get_json(silent=True) or {}
+            items = data.get("items") or []
+            if not isinstance(items, list) or not items:
+                return jsonify({"success": False, "error": "items_obrigatorio"}), 400
+
+            for position, item in enumerate(items):
+                if item is not None and not isinstance(item, dict):
+                    return jsonify({
+                        "success": False,
+                        "error": "item_invalido",
+                        "index": position,
+                        "detail": f"items[{position}] deve ser um objeto.",
+                    }), 400
+
+            answer_sets = [(item or {}).get("answers") or {} for item in items]
+            weights = _weights_from_payload(data.get("weights"))
+            include_details = bool(data.get("include_details"))
+            results = calculate_scores_batch(answer_sets, weights, include_details=include_details)
+
+            scenarios = []
+            if data.get("weight_scenarios"):
+                scenarios = calculate_weight_sensitivity(
+                    answer_sets,
+                    [_weights_from_payload(raw) for raw in data.get("weight_scenarios") or []],
+                )
+
+            return jsonify({
+                "success": True,
+                "status": "calculated_without_persistence",
+                "weights": weights,
+                "results": [
+                    {"job_position_id": (item or {}).get("job_position_id"), "result": result}
+                    for item, result in zip(items, results)
+                ],
+                "weight_scenarios": scenarios,
+            }), 200
+        except (TypeError, ValueError) as exc:
+            return jsonify({"success": False, "error": "valor_invalido", "detail": str(exc)}), 400
+
     @app.route("/api/job-architecture/positions", methods=["GET", "POST", "OPTIONS"])
     def api_job_architecture_positions():
         if request.method == "OPTIONS":
@@ -650,6 +1529,7 @@ def register_job_architecture_routes(app, supabase, require_rh_code):
                 "updated_at": now_iso,
             }
             result = supabase.table("job_positions").insert(payload).execute()
+            _invalidate_hay_title_indexes(ctx.get("cliente_id"))
             return jsonify({"success": True, "position": (result.data or [payload])[0]}), 201
         except Exception as exc:
             return _table_error(exc)
@@ -764,12 +1644,10 @@ def register_job_architecture_routes(app, supabase, require_rh_code):
 
             ctx = _context(position)
             normalized_title = _clean(position.get("normalized_title")) or _normalize_job_title(position.get("title"))
-            query = _apply_context(
-                supabase.table("job_hay_benchmark_imports").select("*"),
-                ctx,
-            ).eq("normalized_title", normalized_title)
-            result = query.order("imported_at", desc=True).limit(5).execute()
-            rows = result.data or []
+            top_k = max(1, min(50, int(request.args.get("top_k") or 5)))
+            min_score = float(request.args.get("min_score") or 0.3)
+            index = _get_hay_title_index(supabase, ctx)
+            rows = _search_hay_title_index(index, normalized_title, top_k, min_score)
 
             factors = []
             if rows and rows[0].get("id"):
@@ -790,9 +1668,41 @@ def register_job_architecture_routes(app, supabase, require_rh_code):
                 "normalized_title": normalized_title,
                 "benchmarks": rows,
                 "best_match": rows[0] if rows else None,
+                "exact_match": bool(rows and rows[0].get("similarity") == 1.0),
                 "factors": factors,
                 "message": "Benchmark historico Hay. Usar como referencia de calibracao, nao como regra automatica The HR Key.",
             }), 200
+        except ValueError as exc:
+            return jsonify({"success": False, "error": "valor_invalido", "detail": str(exc)}), 400
+        except Exception as exc:
+            return _table_error(exc)
+
+    @app.route("/api/job-architecture/benchmarks/hay/search", methods=["GET", "OPTIONS"])
+    def api_job_architecture_search_hay_benchmark():
+        if request.method == "OPTIONS":
+            return ("", 204)
+        try:
+            ctx = _context(request.args)
+            title = _clean(request.args.get("title") or request.args.get("cargo"))
+            if not ctx.get("cliente_id"):
+                return jsonify({"success": False, "error": "cliente_id_obrigatorio"}), 400
+            if not title:
+                return jsonify({"success": False, "error": "title_obrigatorio"}), 400
+
+            top_k = max(1, min(50, int(request.args.get("top_k") or 10)))
+            min_score = float(request.args.get("min_score") or 0.3)
+            refresh = str(request.args.get("refresh", "false")).lower() == "true"
+            index = _get_hay_title_index(supabase, ctx, refresh=refresh)
+            return jsonify({
+                "success": True,
+                "title": title,
+                "normalized_title": _normalize_job_title(title),
+                "matches": _search_hay_title_index(index, title, top_k, min_score),
+                "indexed_benchmarks": len(index["entries"]),
+                "scope": ctx,
+            }), 200
+        except ValueError as exc:
+            return jsonify({"success": False, "error": "valor_invalido", "detail": str(exc)}), 400
         except Exception as exc:
             return _table_error(exc)
 
@@ -864,6 +1774,40 @@ def register_job_architecture_routes(app, supabase, require_rh_code):
         except Exception as exc:
             return jsonify({"success": False, "error": "cargo_variant_audit_failed", "detail": str(exc)}), 500
 
+    def _hay_import_response(ctx, source_file_name, dry_run, create_position_candidates, position_candidate_status, stats):
+        if dry_run:
+            return jsonify({
+                "success": True,
+                "status": "dry_run_no_data_change",
+                "message": "Importacao validada sem gravar dados.",
+                **stats,
+                "position_candidates_would_create": stats["position_candidates_created"],
+                "create_position_candidates": create_position_candidates,
+                "position_candidate_status": position_candidate_status,
+                "source_file_name": source_file_name,
+                "scope": ctx,
+            }), 200
+
+        _invalidate_hay_title_indexes(ctx.get("cliente_id"))
+        _get_hay_title_index(supabase, ctx, refresh=True)
+        if stats.get("partial_import"):
+            return jsonify({
+                "success": False,
+                "status": "partial_import",
+                "message": "Arquivo validado, mas a gravacao parou no meio: os contadores mostram o que foi gravado.",
+                **stats,
+                "source_file_name": source_file_name,
+                "scope": ctx,
+            }), 207
+        return jsonify({
+            "success": True,
+            "status": "imported",
+            **stats,
+            "position_candidates_skipped_existing": stats["position_candidates_already_existing"],
+            "source_file_name": source_file_name,
+            "scope": ctx,
+        }), 201
+
     @app.route("/api/job-architecture/benchmarks/hay/import", methods=["POST", "OPTIONS"])
     def api_job_architecture_import_hay_benchmark():
         if request.method == "OPTIONS":
@@ -878,8 +1822,7 @@ def register_job_architecture_routes(app, supabase, require_rh_code):
             if not ctx.get("cliente_id"):
                 return jsonify({"success": False, "error": "cliente_id_obrigatorio"}), 400
 
-            dry_run = data.get("dry_run", True)
-            dry_run = False if str(dry_run).lower() in ["false", "0", "nao", "não"] else bool(dry_run)
+            dry_run = _is_dry_run(data.get("dry_run", True))
             source_file_name = _clean(data.get("source_file_name")) or "hay_benchmark_import"
             records = data.get("records") or []
             factor_records = data.get("factor_records") or []
@@ -889,131 +1832,63 @@ def register_job_architecture_routes(app, supabase, require_rh_code):
             if not isinstance(records, list) or not records:
                 return jsonify({"success": False, "error": "records_obrigatorio"}), 400
 
-            benchmark_rows = []
-            candidate_rows_by_title = {}
-            factor_rows_by_title = {}
-            for factor in factor_records:
-                title_key = _normalize_job_title(factor.get("cargo"))
-                factor_rows_by_title.setdefault(title_key, []).append(factor)
-
-            for row in records:
-                title = str(row.get("cargo") or row.get("original_title") or "").strip()
-                if not title:
-                    continue
-                profile_value = _profile_value(row.get("profile_value")) if row.get("profile_value") not in [None, ""] else None
-                normalized_title = _normalize_job_title(title)
-                benchmark_rows.append({
-                    **ctx,
-                    "source_file_name": source_file_name,
-                    "original_title": title,
-                    "normalized_title": normalized_title,
-                    "hay_points": row.get("total_points") or row.get("hay_points"),
-                    "hay_grade": row.get("grade") or row.get("hay_grade"),
-                    "hay_profile_value": profile_value,
-                    "hay_factor_data": {
-                        "know_how_level": row.get("know_how_level"),
-                        "know_how_points": row.get("know_how_points"),
-                        "problem_solving_level": row.get("problem_solving_level"),
-                        "problem_solving_points": row.get("problem_solving_points"),
-                        "accountability_level": row.get("accountability_level"),
-                        "accountability_points": row.get("accountability_points"),
-                        "long_profile": row.get("long_profile"),
-                        "source_sheet": row.get("source_sheet"),
-                        "source_row": row.get("source_row"),
-                    },
-                    "calibration_notes": row.get("remarks"),
-                })
-                if create_position_candidates and normalized_title and normalized_title not in candidate_rows_by_title:
-                    candidate_rows_by_title[normalized_title] = {
-                        **ctx,
-                        "title": title,
-                        "normalized_title": normalized_title,
-                        "current_grade_code": _clean(row.get("grade") or row.get("hay_grade")),
-                        "current_profile_value": profile_value,
-                        "status": position_candidate_status,
-                        "source": "hay_benchmark_import",
-                        "approval_notes": "Cargo aprovado historicamente na metodologia Hay. Requer revisao para aprovacao The HR Key.",
-                        "created_at": datetime.now(timezone.utc).isoformat(),
-                        "updated_at": datetime.now(timezone.utc).isoformat(),
-                    }
-
-            existing_position_norms = set()
-            if create_position_candidates:
-                existing_query = _apply_context(
-                    supabase.table("job_positions").select("id,normalized_title"),
-                    ctx,
-                )
-                existing_rows = existing_query.execute().data or []
-                existing_position_norms = {
-                    _clean(row.get("normalized_title"))
-                    for row in existing_rows
-                    if _clean(row.get("normalized_title"))
-                }
-            position_candidates_to_create = [
-                row for key, row in candidate_rows_by_title.items()
-                if key not in existing_position_norms
-            ]
-
-            if dry_run:
-                return jsonify({
-                    "success": True,
-                    "status": "dry_run_no_data_change",
-                    "message": "Importacao validada sem gravar dados.",
-                    "benchmark_rows": len(benchmark_rows),
-                    "factor_rows_received": len(factor_records),
-                    "create_position_candidates": create_position_candidates,
-                    "position_candidate_status": position_candidate_status,
-                    "position_candidates_received": len(candidate_rows_by_title),
-                    "position_candidates_would_create": len(position_candidates_to_create),
-                    "position_candidates_already_existing": len(candidate_rows_by_title) - len(position_candidates_to_create),
-                    "source_file_name": source_file_name,
-                    "scope": ctx,
-                }), 200
+            stats = _validate_and_import_hay_benchmark(
+                supabase,
+                ctx,
+                lambda: records,
+                lambda: factor_records,
+                source_file_name,
+                dry_run=dry_run,
+                create_position_candidates=create_position_candidates,
+                position_candidate_status=position_candidate_status,
+            )
+            return _hay_import_response(ctx, source_file_name, dry_run, create_position_candidates, position_candidate_status, stats)
+        except ValueError as exc:
+            return jsonify({"success": False, "error": "valor_invalido", "detail": str(exc)}), 400
+        except Exception as exc:
+            return _table_error(exc)
 
-            inserted = supabase.table("job_hay_benchmark_imports").insert(benchmark_rows).execute()
-            inserted_rows = inserted.data or []
-            inserted_by_title = {
-                _normalize_job_title(row.get("original_title")): row
-                for row in inserted_rows
-                if row.get("id")
-            }
+    @app.route("/api/job-architecture/benchmarks/hay/import-stream", methods=["POST", "OPTIONS"])
+    def api_job_architecture_import_hay_benchmark_stream():
+        """
+        multipart/form-data com `records` (CSV ou NDJSON) e, opcionalmente,
+        `factor_records` no mesmo formato. Demais campos vem no form.
+        """
+        if request.method == "OPTIONS":
+            return ("", 204)
+        try:
+            data = request.form.to_dict()
+            ok, err, status = require_rh_code(data)
+            if not ok:
+                return jsonify(err), status
 
-            factor_payload = []
-            for title_key, factors in factor_rows_by_title.items():
-                imported_row = inserted_by_title.get(title_key)
-                if not imported_row:
-                    continue
-                for factor in factors:
-                    factor_payload.append({
-                        "hay_benchmark_import_id": imported_row["id"],
-                        "factor_name": factor.get("factor_name"),
-                        "factor_level": factor.get("factor_level"),
-                        "factor_profile": factor.get("factor_profile"),
-                        "points": factor.get("points"),
-                        "source_sheet": factor.get("source_sheet"),
-                        "source_row": factor.get("source_row"),
-                        "source_column": factor.get("source_column"),
-                        "raw_label": factor.get("cargo"),
-                    })
+            ctx = _context(data)
+            if not ctx.get("cliente_id"):
+                return jsonify({"success": False, "error": "cliente_id_obrigatorio"}), 400
 
-            inserted_factors = []
-            if factor_payload:
-                inserted_factors = supabase.table("job_hay_benchmark_factor_points").insert(factor_payload).execute().data or []
+            records_file = request.files.get("records")
+            if not records_file:
+                return jsonify({"success": False, "error": "records_obrigatorio"}), 400
+            factor_file = request.files.get("factor_records")
 
-            inserted_positions = []
-            if position_candidates_to_create:
-                inserted_positions = supabase.table("job_positions").insert(position_candidates_to_create).execute().data or []
+            dry_run = _is_dry_run(data.get("dry_run", True))
+            source_file_name = _clean(data.get("source_file_name")) or _clean(records_file.filename) or "hay_benchmark_import"
+            create_position_candidates = _clean(data.get("create_position_candidates")) in ["true", "1", "sim"]
+            position_candidate_status = _clean(data.get("position_candidate_status")) or "aprovado_hay"
+            batch_size = max(1, min(2000, int(data.get("batch_size") or HAY_IMPORT_BATCH_SIZE)))
 
-            return jsonify({
-                "success": True,
-                "status": "imported",
-                "benchmark_rows": len(inserted_rows),
-                "factor_rows": len(inserted_factors),
-                "position_candidates_created": len(inserted_positions),
-                "position_candidates_skipped_existing": len(candidate_rows_by_title) - len(position_candidates_to_create),
-                "source_file_name": source_file_name,
-                "scope": ctx,
-            }), 201
+            stats = _validate_and_import_hay_benchmark(
+                supabase,
+                ctx,
+                lambda: _iter_upload_rows(records_file),
+                lambda: _iter_upload_rows(factor_file) if factor_file else [],
+                source_file_name,
+                dry_run=dry_run,
+                create_position_candidates=create_position_candidates,
+                position_candidate_status=position_candidate_status,
+                batch_size=batch_size,
+            )
+            return _hay_import_response(ctx, source_file_name, dry_run, create_position_candidates, position_candidate_status, stats)
         except ValueError as exc:
             return jsonify({"success": False, "error": "valor_invalido", "detail": str(exc)}), 400
         except Exception as exc:
@@ -1025,7 +1900,9 @@ def register_job_architecture_routes(app, supabase, require_rh_code):
             return ("", 204)
         try:
             ctx = _context(request.args)
-            query = supabase.table("job_position_description_source_documents").select("*")
+            include_text = str(request.args.get("include_text", "false")).lower() in ["true", "1", "sim"]
+            select_fields = "*" if include_text else SOURCE_DOCUMENT_LIGHT_FIELDS
+            query = supabase.table("job_position_description_source_documents").select(select_fields)
             query = _apply_context(query, ctx)
             status = _clean(request.args.get("source_quality_status"))
             if status:
@@ -1035,6 +1912,31 @@ def register_job_architecture_routes(app, supabase, require_rh_code):
         except Exception as exc:
             return _table_error(exc)
 
+    @app.route("/api/job-architecture/descriptions/source-documents/search", methods=["GET", "OPTIONS"])
+    def api_job_architecture_search_source_documents():
+        if request.method == "OPTIONS":
+            return ("", 204)
+        try:
+            ctx = _context(request.args)
+            query = _clean(request.args.get("q"))
+            if not query:
+                return jsonify({"success": False, "error": "q_obrigatorio"}), 400
+            limit = max(1, min(int(request.args.get("limit") or 20), 100))
+            refresh = str(request.args.get("refresh", "false")).lower() in ["true", "1", "sim"]
+
+            index = _get_source_document_index(supabase, ctx, refresh=refresh)
+            found = _search_source_documents(index, query, limit, _clean(request.args.get("source_quality_status")))
+            return jsonify({
+                "success": True,
+                "query": query,
+                "indexed_documents": len(index["entries"]),
+                **found,
+            }), 200
+        except ValueError as exc:
+            return jsonify({"success": False, "error": "valor_invalido", "detail": str(exc)}), 400
+        except Exception as exc:
+            return _table_error(exc)
+
     @app.route("/api/job-architecture/descriptions/source-documents/import", methods=["POST", "OPTIONS"])
     def api_job_architecture_import_source_documents():
         if request.method == "OPTIONS":
@@ -1055,17 +1957,29 @@ def register_job_architecture_routes(app, supabase, require_rh_code):
             if not isinstance(records, list) or not records:
                 return jsonify({"success": False, "error": "records_obrigatorio"}), 400
 
+            match_index = _get_position_match_index(supabase, ctx)
             rows = []
             for record in records:
                 file_name = _clean(record.get("file_name"))
                 if not file_name:
                     continue
-                match = record.get("best_hay_match") or {}
-                similarity = match.get("similarity")
-                try:
-                    similarity = float(similarity) if similarity not in [None, ""] else None
-                except Exception:
-                    similarity = None
+                # A similaridade vem do matcher do servidor; a do cliente so
+                # vale quando o contexto ainda nao tem cargos/benchmarks.
+                similarity = None
+                if match_index["entries"]:
+                    ranked = _rank_tfidf(
+                        match_index,
+                        _clean(record.get("title_from_file")) or _clean(record.get("normalized_title")) or "",
+                        _flatten_text([record.get("text_preview") or record.get("extracted_text"), record.get("sections_detected")]),
+                        top_k=1,
+                    )
+                    similarity = ranked[0]["similarity"] if ranked else 0.0
+                else:
+                    similarity = (record.get("best_hay_match") or {}).get("similarity")
+                    try:
+                        similarity = float(similarity) if similarity not in [None, ""] else None
+                    except Exception:
+                        similarity = None
                 rows.append({
                     **ctx,
                     "source_file_name": file_name,
@@ -1076,11 +1990,7 @@ def register_job_architecture_routes(app, supabase, require_rh_code):
                     "extracted_text": record.get("text_preview") or record.get("extracted_text"),
                     "sections_detected": record.get("sections_detected") or {},
                     "match_confidence": similarity,
-                    "source_quality_status": (
-                        "match_forte_nao_revisado"
-                        if similarity is not None and similarity >= 0.75
-                        else "referencia_nao_revisada"
-                    ),
+                    "source_quality_status": _source_quality_status(similarity),
                     "manual_review_required": True,
                     "notes": record.get("notes"),
                 })
@@ -1095,6 +2005,7 @@ def register_job_architecture_routes(app, supabase, require_rh_code):
                 }), 200
 
             inserted = supabase.table("job_position_description_source_documents").insert(rows).execute()
+            _invalidate_source_document_indexes(ctx.get("cliente_id"))
             return jsonify({
                 "success": True,
                 "status": "imported",
@@ -1104,6 +2015,93 @@ def register_job_architecture_routes(app, supabase, require_rh_code):
         except Exception as exc:
             return _table_error(exc)
 
+    @app.route("/api/job-architecture/descriptions/source-documents/match", methods=["POST", "OPTIONS"])
+    def api_job_architecture_match_source_documents():
+        if request.method == "OPTIONS":
+            return ("", 204)
+        try:
+            data = request.get_json(silent=True) or {}
+            ok, err, status = require_rh_code(data)
+            if not ok:
+                return jsonify(err), status
+
+            ctx = _context(data)
+            if not ctx.get("cliente_id"):
+                return jsonify({"success": False, "error": "cliente_id_obrigatorio"}), 400
+
+            dry_run = _is_dry_run(data.get("dry_run", True))
+            top_k = max(1, min(int(data.get("top_k") or 3), 20))
+            document_ids = [int(value) for value in (data.get("document_ids") or []) if str(value).strip()]
+            only_unmatched = str(data.get("only_unmatched", "false")).lower() in ["true", "1", "sim"]
+
+            index = _get_position_match_index(supabase, ctx, refresh=bool(data.get("refresh_index")))
+            if not index["entries"]:
+                return jsonify({"success": False, "error": "sem_candidatos", "message": "Contexto sem cargos ou benchmarks Hay para comparar."}), 404
+
+            if document_ids:
+                # Ids de outro cliente/contexto ficam de fora.
+                documents = _safe_select_in(
+                    supabase, "job_position_description_source_documents", "*", "id", document_ids, "id", False, ctx=ctx,
+                )
+                if not documents.get("ok"):
+                    raise RuntimeError(documents.get("error"))
+                documents = documents["data"]
+            else:
+                documents = _load_context_rows(supabase, "job_position_description_source_documents", ctx)
+            if only_unmatched:
+                documents = [doc for doc in documents if doc.get("match_confidence") is None]
+
+            results = []
+            ids_by_values = {}
+            for document in documents:
+                title, body = _source_document_match_text(document)
+                ranked = _rank_tfidf(index, title, body, top_k=top_k)
+                similarity = ranked[0]["similarity"] if ranked else 0.0
+                results.append({"source_document_id": document.get("id"), "source_file_name": document.get("source_file_name"), "matches": ranked})
+                if document.get("id") is None:
+                    continue
+                confidence = round(similarity, MATCH_CONFIDENCE_DECIMALS)
+                # Documento ja revisado mantem o status dado pelo RH.
+                reviewed = document.get("manual_review_required") is False
+                status = document.get("source_quality_status") if reviewed else _source_quality_status(confidence)
+                ids_by_values.setdefault((confidence, status), []).append(document["id"])
+
+            batches = [
+                (confidence, status, ids[start:start + IN_FILTER_CHUNK_SIZE])
+                for (confidence, status), ids in ids_by_values.items()
+                for start in range(0, len(ids), IN_FILTER_CHUNK_SIZE)
+            ]
+
+            def write_match(batch):
+                # So as colunas do match, e sempre dentro do contexto do chamador.
+                confidence, status, ids = batch
+                query = (
+                    supabase.table("job_position_description_source_documents")
+                    .update({"match_confidence": confidence, "source_quality_status": status})
+                    .in_("id", ids)
+                )
+                return len(_apply_context(query, ctx).execute().data or [])
+
+            written = 0
+            if not dry_run and batches:
+                with ContextThreadPoolExecutor(max_workers=min(MATCH_WRITE_WORKERS, len(batches))) as executor:
+                    written = sum(executor.map(write_match, batches))
+                _invalidate_source_document_indexes(ctx.get("cliente_id"))
+
+            return jsonify({
+                "success": True,
+                "status": "dry_run_no_data_change" if dry_run else "matched",
+                "documents": len(documents),
+                "candidates": len(index["entries"]),
+                "updated_rows": written,
+                "results": results,
+                "scope": ctx,
+            }), 200 if dry_run else 201
+        except ValueError as exc:
+            return jsonify({"success": False, "error": "valor_invalido", "detail": str(exc)}), 400
+        except Exception as exc:
+            return _table_error(exc)
+
     @app.route("/api/job-architecture/positions/<int:position_id>/evaluation", methods=["POST", "OPTIONS"])
     def api_job_architecture_position_evaluation(position_id):
         if request.method == "OPTIONS":
@@ -1236,3 +2234,116 @@ def register_job_architecture_routes(app, supabase, require_rh_code):
                 "perspectiva_de_carreira",
             ],
         }), 200
+
+    @app.route("/api/job-architecture/retention-risk-context/cohort", methods=["GET", "POST", "OPTIONS"])
+    def api_job_architecture_retention_risk_context_cohort():
+        """
+        Versao em lote do retention-risk-context: recebe employee_ids (lista ou
+        CSV) ou um contexto cliente/holding/empresa/filial e carrega cada tabela
+        fonte uma unica vez, em paralelo, devolvendo um bundle por colaborador.
+        """
+        if request.method == "OPTIONS":
+            return ("", 204)
+        source = (request.get_json(silent=True) or {}) if request.method == "POST" else request.args
+        if not isinstance(source, dict):
+            return jsonify({"success": False, "error": "payload_invalido", "detail": "O corpo deve ser um objeto JSON."}), 400
+        raw_ids = source.get("employee_ids") or []
+        if isinstance(raw_ids, str):
+            raw_ids = [value.strip() for value in raw_ids.split(",")]
+        if not isinstance(raw_ids, list) or any(isinstance(value, (dict, list, bool)) for value in raw_ids):
+            return jsonify({
+                "success": False,
+                "error": "employee_ids_invalido",
+                "detail": "employee_ids deve ser uma lista de ids ou um CSV.",
+            }), 400
+        employee_ids = [value for value in raw_ids if value not in [None, ""]]
+        ctx = _context(source)
+
+        if employee_ids:
+            if len(employee_ids) > COHORT_MAX_EMPLOYEES:
+                return jsonify({"success": False, "error": "cohort_muito_grande", "max_employees": COHORT_MAX_EMPLOYEES}), 400
+            employee_result = _safe_select_in(supabase, "employees", "*", "id", employee_ids)
+        elif ctx.get("cliente_id"):
+            try:
+                rows = []
+                while len(rows) < COHORT_MAX_EMPLOYEES:
+                    offset = len(rows)
+                    end = min(offset + IN_FILTER_PAGE_SIZE, COHORT_MAX_EMPLOYEES) - 1
+                    page = (
+                        _apply_context(supabase.table("employees").select("*"), ctx)
+                        .order("id", desc=False)
+                        .range(offset, end)
+                        .execute()
+                    ).data or []
+                    rows.extend(page)
+                    if len(page) < end - offset + 1:
+                        break
+                employee_result = {"ok": True, "table": "employees", "data": rows}
+            except Exception as exc:
+                employee_result = {"ok": False, "table": "employees", "error": str(exc), "data": []}
+        else:
+            return jsonify({"success": False, "error": "employee_ids_ou_cliente_id_obrigatorio"}), 400
+
+        employees = employee_result.get("data") or []
+        ids = [employee.get("id") for employee in employees if employee.get("id") is not None]
+        position_ids = [employee.get("job_position_id") for employee in employees if employee.get("job_position_id")]
+
+        loaders = {
+            "job_position": ("job_positions", "id", position_ids, None),
+            "job_evaluation": ("job_evaluation_versions", "job_position_id", position_ids, "created_at"),
+            "performance": ("evaluations", "employee_id", ids, "created_at"),
+            "individual_goals": ("individual_goals", "employee_id", ids, "created_at"),
+            "leadertrack_devolutivas": ("leadertrack_devolutivas", "employee_id", ids, "created_at"),
+            "leadertrack_pdi_acompanhamento": ("leadertrack_pdi_acompanhamento", "employee_id", ids, "created_at"),
+        }
+        with ContextThreadPoolExecutor(max_workers=COHORT_LOADER_WORKERS) as executor:
+            futures = {
+                name: executor.submit(_safe_select_in, supabase, table_name, "*", column, values, order_by, True)
+                for name, (table_name, column, values, order_by) in loaders.items()
+            }
+            results = {name: future.result() for name, future in futures.items()}
+
+        positions_by_id = _group_rows(results["job_position"].get("data") or [], "id", 1)
+        evaluations_by_position = _group_rows(results["job_evaluation"].get("data") or [], "job_position_id", 1)
+        per_employee_limits = {
+            "performance": 3,
+            "individual_goals": 10,
+            "leadertrack_devolutivas": 3,
+            "leadertrack_pdi_acompanhamento": 10,
+        }
+        grouped = {
+            name: _group_rows(results[name].get("data") or [], "employee_id", limit)
+            for name, limit in per_employee_limits.items()
+        }
+
+        bundles = []
+        for employee in employees:
+            employee_key = str(employee.get("id"))
+            position_key = str(employee.get("job_position_id"))
+            sources = {
+                "employee": _source_slice(employee_result, [employee]),
+                "job_position": _source_slice(results["job_position"], positions_by_id.get(position_key, [])),
+                "job_evaluation": _source_slice(results["job_evaluation"], evaluations_by_position.get(position_key, [])),
+            }
+            for name in per_employee_limits:
+                sources[name] = _source_slice(results[name], grouped[name].get(employee_key, []))
+            bundles.append({
+                "employee_id": employee.get("id"),
+                "job_position_id": employee.get("job_position_id"),
+                "sources": sources,
+            })
+
+        return jsonify({
+            "success": True,
+            "status": "context_only_no_risk_score",
+            "message": "Conector inicial preparado. O IRP final ainda depende de modelo validado e fontes completas.",
+            "scope": ctx,
+            "requested_employee_ids": employee_ids,
+            "total_employees": len(bundles),
+            "source_errors": {
+                result["table"]: result["error"]
+                for result in [employee_result, *results.values()]
+                if result.get("error")
+            },
+            "employees": bundles,
+        }), 200
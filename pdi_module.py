@@ -1,7 +1,11 @@
+import threading
+import time
 from datetime import datetime, timezone
 
 from flask import jsonify, request
 
+from query_instrumentation import ContextThreadPoolExecutor
+
 
 PDI_DIMENSION_LABELS = {
     'FUNCIONAL': 'Funcional',
@@ -11,6 +15,46 @@ PDI_DIMENSION_LABELS = {
 }
 
 
+PDI_PLANS_DEFAULT_PAGE_SIZE = 100
+PDI_PLANS_MAX_PAGE_SIZE = 500
+PDI_PLANS_FETCH_PAGE_SIZE = 1000
+PDI_IN_CHUNK_SIZE = 200
+PDI_CHILD_PAGE_SIZE = 1000
+PDI_CHILD_LOAD_WORKERS = 4
+PDI_NINEBOX_PAGE_SIZE = 1000
+
+# include= -> (tabela filha, chave no item do plano)
+PDI_PLAN_CHILDREN = {
+    'dimensions': ('pdi_plan_dimensions', 'dimensions'),
+    'actions': ('pdi_actions', 'actions'),
+    'trainings': ('training_assignments', 'training_assignments'),
+    'checkins': ('pdi_monthly_checkins', 'monthly_checkins'),
+}
+
+# Snapshot de elegibilidade por (rodada, contexto). Materializado na primeira
+# leitura apos uma invalidacao (avaliacao salva, workflow, criacao de PDI) e
+# guardado compacto: dimensoes e fontes sao reconstruidas so para a pagina.
+PDI_ELIGIBILITY_TTL_SECONDS = 900
+PDI_ELIGIBILITY_DEFAULT_PAGE_SIZE = 200
+PDI_ELIGIBILITY_MAX_PAGE_SIZE = 1000
+PDI_ELIGIBILITY_BASE_FIELDS = (
+    'employee_id', 'employee_name', 'cargo', 'department_name', 'manager_name', 'manager_code',
+    'cliente_id', 'holding_id', 'empresa_id', 'empresa_nome', 'filial_id', 'filial_nome',
+    'round_code', 'evaluation_id', 'final_rating',
+)
+_ELIGIBILITY_SNAPSHOTS = {}
+_ELIGIBILITY_LOCK = threading.Lock()
+
+
+def invalidate_pdi_eligibility(round_code=None):
+    with _ELIGIBILITY_LOCK:
+        if round_code:
+            for key in [key for key in _ELIGIBILITY_SNAPSHOTS if key[0] == round_code]:
+                _ELIGIBILITY_SNAPSHOTS.pop(key, None)
+        else:
+            _ELIGIBILITY_SNAPSHOTS.clear()
+
+
 def _to_float(value):
     try:
         return float(value)
@@ -71,6 +115,120 @@ def _context_matches_access(access_row, cliente_id='', holding_id='', empresa_id
     return True
 
 
+def _parse_plan_includes(raw):
+    if raw is None or not str(raw).strip():
+        return list(PDI_PLAN_CHILDREN.keys())
+    requested = [part.strip().lower() for part in str(raw).split(',') if part.strip()]
+    if 'all' in requested:
+        return list(PDI_PLAN_CHILDREN.keys())
+    return [name for name in PDI_PLAN_CHILDREN if name in requested]
+
+
+def _compact_eligibility_item(item):
+    proactive_source = next(
+        (s for s in item['eligibility_sources'] if s.get('type') == 'proativo_9box'),
+        None,
+    )
+    row = {field: item.get(field) for field in PDI_ELIGIBILITY_BASE_FIELDS}
+    row.update({
+        'ratings': (
+            {d['dimension_code']: d['rating'] for d in item['dimensions']}
+            if item['dimensions'] else None
+        ),
+        'nine_box': [item['nine_box_position'], item['performance_rating'], item['potential_rating']],
+        'proactive_source': (
+            [
+                proactive_source.get('nine_box_position'),
+                proactive_source.get('performance_rating'),
+                proactive_source.get('potential_rating'),
+            ]
+            if proactive_source else None
+        ),
+        'mandatory_pdi': item['mandatory_pdi'],
+        'proactive_pdi': item['proactive_pdi'],
+        'eligible_for_pdi': item['eligible_for_pdi'],
+        'recognition': bool(item['recognition_dimensions'] or item['general_recognition']),
+        'already_has_any_plan': item['already_has_any_plan'],
+    })
+    return row
+
+
+def _expand_eligibility_item(row):
+    item = {field: row.get(field) for field in PDI_ELIGIBILITY_BASE_FIELDS}
+    dimensions = []
+    if row['ratings'] is not None:
+        for dim_code, dim_label in PDI_DIMENSION_LABELS.items():
+            rating = row['ratings'].get(dim_code)
+            classification = _dimension_classification(rating)
+            dimensions.append({
+                'dimension_code': dim_code,
+                'dimension_label': dim_label,
+                'rating': rating,
+                'status': classification['status'],
+                'pdi_required': classification['pdi_required'],
+                'recognition': classification['recognition'],
+            })
+    required_dimensions = [d for d in dimensions if d['pdi_required']]
+
+    sources = []
+    if required_dimensions:
+        sources.append({
+            'type': 'obrigatorio_desempenho',
+            'label': 'PDI obrigatorio por dimensao',
+            'dimensions': [d['dimension_code'] for d in required_dimensions],
+            'evaluation_id': row.get('evaluation_id'),
+        })
+    if row['proactive_source']:
+        box, performance_rating, potential_rating = row['proactive_source']
+        sources.append({
+            'type': 'proativo_9box',
+            'label': 'PDI proativo por 9Box',
+            'nine_box_position': box,
+            'performance_rating': performance_rating,
+            'potential_rating': potential_rating,
+        })
+
+    box, performance_rating, potential_rating = row['nine_box']
+    item.update({
+        'dimensions': dimensions,
+        'pdi_required_dimensions': required_dimensions,
+        'recognition_dimensions': [d for d in dimensions if d['recognition']],
+        'general_recognition': _general_recognition(row.get('final_rating')),
+        'proactive_pdi': row['proactive_pdi'],
+        'nine_box_position': box,
+        'performance_rating': performance_rating,
+        'potential_rating': potential_rating,
+        'eligibility_sources': sources,
+        'mandatory_pdi': row['mandatory_pdi'],
+        'eligible_for_pdi': row['eligible_for_pdi'],
+        'already_has_any_plan': row['already_has_any_plan'],
+    })
+    return item
+
+
+def _filter_eligibility_rows(rows, status_filter='', manager_name='', search=''):
+    flag = {
+        'eligible': 'eligible_for_pdi',
+        'mandatory': 'mandatory_pdi',
+        'proactive': 'proactive_pdi',
+        'recognition': 'recognition',
+    }.get(status_filter)
+    selected = []
+    for row in rows:
+        if flag and not row[flag]:
+            continue
+        if status_filter == 'without_plan' and (row['already_has_any_plan'] or not row['eligible_for_pdi']):
+            continue
+        if status_filter == 'with_plan' and not row['already_has_any_plan']:
+            continue
+        if manager_name and (row.get('manager_name') or '').strip().upper() != manager_name:
+            continue
+        if search and search not in (row.get('employee_name') or '').upper():
+            continue
+        selected.append(row)
+    return selected
+
+
 def _plan_origin_type(item):
     has_mandatory = bool(item.get('mandatory_pdi') or item.get('pdi_required_dimensions'))
     has_proactive = bool(item.get('proactive_pdi'))
@@ -128,7 +286,10 @@ def _leadertrack_week_description(week_payload):
     return "\n".join(parts)
 
 
-def register_pdi_routes(app, supabase, buscar_avaliacoes_brutas, get_active_round_code, require_rh_code):
+def register_pdi_routes(
+    app, supabase, buscar_avaliacoes_brutas, get_active_round_code, require_rh_code,
+    resolve_round_code_for_year=None,
+):
     def resolve_employee_from_leadertrack(payload, actor_email, cliente_id='', holding_id='', empresa_id='', filial_id=''):
         raw_employee_id = payload.get('employee_id')
         if raw_employee_id not in (None, ''):
@@ -249,15 +410,19 @@ def register_pdi_routes(app, supabase, buscar_avaliacoes_brutas, get_active_roun
         if not cycle_code or not employee_ids:
             return keys
         try:
-            r = (
-                supabase
-                .table('pdi_plans')
-                .select('id,employee_id,cycle_code,origin_type,status')
-                .eq('cycle_code', cycle_code)
-                .in_('employee_id', employee_ids)
-                .execute()
-            )
-            for row in (r.data or []):
+            employee_ids = list(employee_ids)
+            rows = []
+            for start in range(0, len(employee_ids), PDI_IN_CHUNK_SIZE):
+                r = (
+                    supabase
+                    .table('pdi_plans')
+                    .select('id,employee_id,cycle_code,origin_type,status')
+                    .eq('cycle_code', cycle_code)
+                    .in_('employee_id', employee_ids[start:start + PDI_IN_CHUNK_SIZE])
+                    .execute()
+                )
+                rows.extend(r.data or [])
+            for row in rows:
                 emp_id = row.get('employee_id')
                 if emp_id is not None:
                     keys.add((str(emp_id), 'any'))
@@ -267,6 +432,223 @@ def register_pdi_routes(app, supabase, buscar_avaliacoes_brutas, get_active_roun
             print('[pdi] pdi_plans indisponivel:', exc)
         return keys
 
+    def build_eligibility_snapshot(round_code, empresa, cliente_id, holding_id, empresa_id, filial_id, nivel_contexto):
+        dimension_rows = buscar_avaliacoes_brutas(
+            round_code=round_code,
+            empresa=empresa,
+            holding_id=holding_id or None,
+            empresa_id=empresa_id or None,
+            filial_id=filial_id or None,
+            nivel_contexto=nivel_contexto,
+        )
+
+        pdi_by_employee = {}
+        all_employee_ids = set()
+
+        for row in dimension_rows:
+            employee_id = row.get('employee_id')
+            if employee_id is None:
+                continue
+            emp_key = str(employee_id)
+            all_employee_ids.add(employee_id)
+            ratings = row.get('ratings') or {}
+            dimensions = []
+            required_dimensions = []
+            recognition_dimensions = []
+
+            for dim_code, dim_label in PDI_DIMENSION_LABELS.items():
+                rating = ratings.get(dim_code)
+                classification = _dimension_classification(rating)
+                dim_payload = {
+                    'dimension_code': dim_code,
+                    'dimension_label': dim_label,
+                    'rating': rating,
+                    'status': classification['status'],
+                    'pdi_required': classification['pdi_required'],
+                    'recognition': classification['recognition'],
+                }
+                dimensions.append(dim_payload)
+                if classification['pdi_required']:
+                    required_dimensions.append(dim_payload)
+                if classification['recognition']:
+                    recognition_dimensions.append(dim_payload)
+
+            pdi_by_employee[emp_key] = {
+                'employee_id': employee_id,
+                'employee_name': row.get('employee_name'),
+                'cargo': row.get('cargo'),
+                'department_name': row.get('department_name'),
+                'manager_name': row.get('manager_name'),
+                'manager_code': row.get('manager_code'),
+                'cliente_id': row.get('cliente_id') or cliente_id or None,
+                'holding_id': row.get('holding_id') or holding_id or None,
+                'empresa_id': row.get('empresa_id') or empresa_id or None,
+                'empresa_nome': row.get('company_name') or row.get('empresa'),
+                'filial_id': row.get('filial_id') or filial_id or None,
+                'filial_nome': row.get('branch_name'),
+                'round_code': row.get('round_code') or round_code,
+                'evaluation_id': row.get('evaluation_id'),
+                'final_rating': row.get('final_rating'),
+                'dimensions': dimensions,
+                'pdi_required_dimensions': required_dimensions,
+                'recognition_dimensions': recognition_dimensions,
+                'general_recognition': _general_recognition(row.get('final_rating')),
+                'proactive_pdi': False,
+                'nine_box_position': None,
+                'performance_rating': None,
+                'potential_rating': None,
+                'eligibility_sources': [],
+            }
+
+            if required_dimensions:
+                pdi_by_employee[emp_key]['eligibility_sources'].append({
+                    'type': 'obrigatorio_desempenho',
+                    'label': 'PDI obrigatorio por dimensao',
+                    'dimensions': [d['dimension_code'] for d in required_dimensions],
+                    'evaluation_id': row.get('evaluation_id'),
+                })
+
+        try:
+            ninebox_rows = []
+            # db-max-rows corta cada resposta em 1000: pagina ate vir pagina curta
+            while True:
+                q9 = (
+                    supabase
+                    .table('v_desempenho_contexto')
+                    .select(
+                        'evaluation_id,employee_id,employee_name,cargo,'
+                        'cliente_id,holding_id,holding_nome,empresa_id,empresa_nome,'
+                        'filial_id,filial_nome,department_name,manager_name,'
+                        'round_code,ciclo_codigo,evaluation_year,ano_referencia,'
+                        'final_rating,performance_rating,potential_rating,nine_box_position'
+                    )
+                )
+                if round_code:
+                    q9 = q9.eq('round_code', round_code)
+                if cliente_id:
+                    q9 = q9.eq('cliente_id', cliente_id)
+                if holding_id:
+                    q9 = q9.eq('holding_id', holding_id)
+                if empresa_id:
+                    q9 = q9.eq('empresa_id', empresa_id)
+                if filial_id:
+                    q9 = q9.eq('filial_id', filial_id)
+                page_rows = (
+                    q9
+                    .order('evaluation_id')
+                    .range(len(ninebox_rows), len(ninebox_rows) + PDI_NINEBOX_PAGE_SIZE - 1)
+                    .execute()
+                ).data or []
+                ninebox_rows.extend(page_rows)
+                if len(page_rows) < PDI_NINEBOX_PAGE_SIZE:
+                    break
+        except Exception as exc:
+            print('[pdi] erro ao buscar 9Box:', exc)
+            ninebox_rows = []
+
+        for row in ninebox_rows:
+            employee_id = row.get('employee_id')
+            if employee_id is None:
+                continue
+            emp_key = str(employee_id)
+            all_employee_ids.add(employee_id)
+            try:
+                box = int(row.get('nine_box_position'))
+            except Exception:
+                box = None
+
+            if emp_key not in pdi_by_employee:
+                pdi_by_employee[emp_key] = {
+                    'employee_id': employee_id,
+                    'employee_name': row.get('employee_name'),
+                    'cargo': row.get('cargo'),
+                    'department_name': row.get('department_name'),
+                    'manager_name': row.get('manager_name'),
+                    'manager_code': None,
+                    'cliente_id': row.get('cliente_id') or cliente_id or None,
+                    'holding_id': row.get('holding_id') or holding_id or None,
+                    'empresa_id': row.get('empresa_id') or empresa_id or None,
+                    'empresa_nome': row.get('empresa_nome'),
+                    'filial_id': row.get('filial_id') or filial_id or None,
+                    'filial_nome': row.get('filial_nome'),
+                    'round_code': row.get('ciclo_codigo') or row.get('round_code') or round_code,
+                    'evaluation_id': row.get('evaluation_id'),
+                    'final_rating': row.get('final_rating'),
+                    'dimensions': [],
+                    'pdi_required_dimensions': [],
+                    'recognition_dimensions': [],
+                    'general_recognition': _general_recognition(row.get('final_rating')),
+                    'proactive_pdi': False,
+                    'nine_box_position': None,
+                    'performance_rating': None,
+                    'potential_rating': None,
+                    'eligibility_sources': [],
+                }
+
+            item = pdi_by_employee[emp_key]
+            item['nine_box_position'] = box
+            item['performance_rating'] = row.get('performance_rating')
+            item['potential_rating'] = row.get('potential_rating')
+
+            if _is_proactive_9box(row.get('performance_rating'), row.get('potential_rating')):
+                item['proactive_pdi'] = True
+                if not any(s.get('type') == 'proativo_9box' for s in item['eligibility_sources']):
+                    item['eligibility_sources'].append({
+                        'type': 'proativo_9box',
+                        'label': 'PDI proativo por 9Box',
+                        'nine_box_position': box,
+                        'performance_rating': row.get('performance_rating'),
+                        'potential_rating': row.get('potential_rating'),
+                    })
+
+        existing_keys = existing_plan_keys(round_code, list(all_employee_ids))
+        items = []
+        totals = {
+            'employees_evaluated': len(pdi_by_employee),
+            'mandatory_pdi_employees': 0,
+            'proactive_pdi_employees': 0,
+            'general_recognition_employees': 0,
+            'dimension_recognition_employees': 0,
+            'eligible_employees': 0,
+            'already_has_plan_employees': 0,
+        }
+
+        for emp_key, item in pdi_by_employee.items():
+            has_mandatory = bool(item['pdi_required_dimensions'])
+            has_proactive = bool(item['proactive_pdi'])
+            has_dimension_recognition = bool(item['recognition_dimensions'])
+            has_general_recognition = bool(item['general_recognition'])
+            item['mandatory_pdi'] = has_mandatory
+            item['eligible_for_pdi'] = has_mandatory or has_proactive
+            item['already_has_any_plan'] = (emp_key, 'any') in existing_keys
+            if has_mandatory:
+                totals['mandatory_pdi_employees'] += 1
+            if has_proactive:
+                totals['proactive_pdi_employees'] += 1
+            if has_general_recognition:
+                totals['general_recognition_employees'] += 1
+            if has_dimension_recognition:
+                totals['dimension_recognition_employees'] += 1
+            if item['eligible_for_pdi']:
+                totals['eligible_employees'] += 1
+            if item['already_has_any_plan']:
+                totals['already_has_plan_employees'] += 1
+            items.append(item)
+
+        items.sort(key=lambda x: (
+            0 if x.get('eligible_for_pdi') else 1,
+            (x.get('manager_name') or '').strip().upper(),
+            (x.get('employee_name') or '').strip().upper(),
+        ))
+
+        return {
+            'round_code': round_code,
+            'generated_at': datetime.now(timezone.utc).isoformat(),
+            'built_at': time.monotonic(),
+            'totals': totals,
+            'rows': [_compact_eligibility_item(item) for item in items],
+        }
+
     @app.route('/api/pdi/eligibility', methods=['GET', 'OPTIONS'])
     def api_pdi_eligibility():
         if request.method == 'OPTIONS':
@@ -297,233 +679,62 @@ def register_pdi_routes(app, supabase, buscar_avaliacoes_brutas, get_active_roun
             if not ok_access:
                 return jsonify(err_access), status_access
 
-            if not round_code and year_param:
+            if not round_code and year_param and resolve_round_code_for_year:
                 try:
                     year = int(year_param)
                 except Exception:
                     year = None
-                if year:
-                    for cod in [f'YE{year}', f'Start{year}']:
-                        try:
-                            r_test = (
-                                supabase.table('evaluations')
-                                .select('id')
-                                .eq('round_code', cod)
-                                .limit(1)
-                                .execute()
-                            )
-                            if r_test.data:
-                                round_code = cod
-                                break
-                        except Exception as exc:
-                            print('[pdi] erro ao testar round_code', cod, exc)
+                round_code = resolve_round_code_for_year(year) or ''
 
             if not round_code:
                 round_code = get_active_round_code()
 
-            dimension_rows = buscar_avaliacoes_brutas(
-                round_code=round_code,
-                empresa=empresa,
-                holding_id=holding_id or None,
-                empresa_id=empresa_id or None,
-                filial_id=filial_id or None,
-                nivel_contexto=nivel_contexto,
+            refresh = str(request.args.get('refresh') or '').strip().lower() in ('1', 'true', 'sim')
+            snapshot_key = (round_code, empresa, cliente_id, holding_id, empresa_id, filial_id, nivel_contexto)
+            with _ELIGIBILITY_LOCK:
+                snapshot = _ELIGIBILITY_SNAPSHOTS.get(snapshot_key)
+            cached = bool(
+                snapshot
+                and not refresh
+                and time.monotonic() - snapshot['built_at'] < PDI_ELIGIBILITY_TTL_SECONDS
             )
-
-            pdi_by_employee = {}
-            all_employee_ids = set()
-
-            for row in dimension_rows:
-                employee_id = row.get('employee_id')
-                if employee_id is None:
-                    continue
-                emp_key = str(employee_id)
-                all_employee_ids.add(employee_id)
-                ratings = row.get('ratings') or {}
-                dimensions = []
-                required_dimensions = []
-                recognition_dimensions = []
-
-                for dim_code, dim_label in PDI_DIMENSION_LABELS.items():
-                    rating = ratings.get(dim_code)
-                    classification = _dimension_classification(rating)
-                    dim_payload = {
-                        'dimension_code': dim_code,
-                        'dimension_label': dim_label,
-                        'rating': rating,
-                        'status': classification['status'],
-                        'pdi_required': classification['pdi_required'],
-                        'recognition': classification['recognition'],
-                    }
-                    dimensions.append(dim_payload)
-                    if classification['pdi_required']:
-                        required_dimensions.append(dim_payload)
-                    if classification['recognition']:
-                        recognition_dimensions.append(dim_payload)
-
-                pdi_by_employee[emp_key] = {
-                    'employee_id': employee_id,
-                    'employee_name': row.get('employee_name'),
-                    'cargo': row.get('cargo'),
-                    'department_name': row.get('department_name'),
-                    'manager_name': row.get('manager_name'),
-                    'manager_code': row.get('manager_code'),
-                    'cliente_id': row.get('cliente_id') or cliente_id or None,
-                    'holding_id': row.get('holding_id') or holding_id or None,
-                    'empresa_id': row.get('empresa_id') or empresa_id or None,
-                    'empresa_nome': row.get('company_name') or row.get('empresa'),
-                    'filial_id': row.get('filial_id') or filial_id or None,
-                    'filial_nome': row.get('branch_name'),
-                    'round_code': row.get('round_code') or round_code,
-                    'evaluation_id': row.get('evaluation_id'),
-                    'final_rating': row.get('final_rating'),
-                    'dimensions': dimensions,
-                    'pdi_required_dimensions': required_dimensions,
-                    'recognition_dimensions': recognition_dimensions,
-                    'general_recognition': _general_recognition(row.get('final_rating')),
-                    'proactive_pdi': False,
-                    'nine_box_position': None,
-                    'performance_rating': None,
-                    'potential_rating': None,
-                    'eligibility_sources': [],
-                }
-
-                if required_dimensions:
-                    pdi_by_employee[emp_key]['eligibility_sources'].append({
-                        'type': 'obrigatorio_desempenho',
-                        'label': 'PDI obrigatorio por dimensao',
-                        'dimensions': [d['dimension_code'] for d in required_dimensions],
-                        'evaluation_id': row.get('evaluation_id'),
-                    })
-
-            try:
-                q9 = (
-                    supabase
-                    .table('v_desempenho_contexto')
-                    .select(
-                        'evaluation_id,employee_id,employee_name,cargo,'
-                        'cliente_id,holding_id,holding_nome,empresa_id,empresa_nome,'
-                        'filial_id,filial_nome,department_name,manager_name,'
-                        'round_code,ciclo_codigo,evaluation_year,ano_referencia,'
-                        'final_rating,performance_rating,potential_rating,nine_box_position'
-                    )
+            if not cached:
+                snapshot = build_eligibility_snapshot(
+                    round_code, empresa, cliente_id, holding_id, empresa_id, filial_id, nivel_contexto,
                 )
-                if round_code:
-                    q9 = q9.eq('round_code', round_code)
-                if cliente_id:
-                    q9 = q9.eq('cliente_id', cliente_id)
-                if holding_id:
-                    q9 = q9.eq('holding_id', holding_id)
-                if empresa_id:
-                    q9 = q9.eq('empresa_id', empresa_id)
-                if filial_id:
-                    q9 = q9.eq('filial_id', filial_id)
-                ninebox_rows = (q9.execute()).data or []
-            except Exception as exc:
-                print('[pdi] erro ao buscar 9Box:', exc)
-                ninebox_rows = []
-
-            for row in ninebox_rows:
-                employee_id = row.get('employee_id')
-                if employee_id is None:
-                    continue
-                emp_key = str(employee_id)
-                all_employee_ids.add(employee_id)
+                with _ELIGIBILITY_LOCK:
+                    _ELIGIBILITY_SNAPSHOTS[snapshot_key] = snapshot
+
+            rows = _filter_eligibility_rows(
+                snapshot['rows'],
+                status_filter=(request.args.get('filter') or '').strip().lower(),
+                manager_name=(request.args.get('manager_name') or '').strip().upper(),
+                search=(request.args.get('q') or '').strip().upper(),
+            )
+            filtered_total = len(rows)
+            page = None
+            page_size = None
+            if request.args.get('page') or request.args.get('page_size'):
                 try:
-                    box = int(row.get('nine_box_position'))
+                    page = max(1, int(request.args.get('page') or 1))
+                    page_size = int(request.args.get('page_size') or PDI_ELIGIBILITY_DEFAULT_PAGE_SIZE)
                 except Exception:
-                    box = None
-
-                if emp_key not in pdi_by_employee:
-                    pdi_by_employee[emp_key] = {
-                        'employee_id': employee_id,
-                        'employee_name': row.get('employee_name'),
-                        'cargo': row.get('cargo'),
-                        'department_name': row.get('department_name'),
-                        'manager_name': row.get('manager_name'),
-                        'manager_code': None,
-                        'cliente_id': row.get('cliente_id') or cliente_id or None,
-                        'holding_id': row.get('holding_id') or holding_id or None,
-                        'empresa_id': row.get('empresa_id') or empresa_id or None,
-                        'empresa_nome': row.get('empresa_nome'),
-                        'filial_id': row.get('filial_id') or filial_id or None,
-                        'filial_nome': row.get('filial_nome'),
-                        'round_code': row.get('ciclo_codigo') or row.get('round_code') or round_code,
-                        'evaluation_id': row.get('evaluation_id'),
-                        'final_rating': row.get('final_rating'),
-                        'dimensions': [],
-                        'pdi_required_dimensions': [],
-                        'recognition_dimensions': [],
-                        'general_recognition': _general_recognition(row.get('final_rating')),
-                        'proactive_pdi': False,
-                        'nine_box_position': None,
-                        'performance_rating': None,
-                        'potential_rating': None,
-                        'eligibility_sources': [],
-                    }
-
-                item = pdi_by_employee[emp_key]
-                item['nine_box_position'] = box
-                item['performance_rating'] = row.get('performance_rating')
-                item['potential_rating'] = row.get('potential_rating')
-
-                if _is_proactive_9box(row.get('performance_rating'), row.get('potential_rating')):
-                    item['proactive_pdi'] = True
-                    if not any(s.get('type') == 'proativo_9box' for s in item['eligibility_sources']):
-                        item['eligibility_sources'].append({
-                            'type': 'proativo_9box',
-                            'label': 'PDI proativo por 9Box',
-                            'nine_box_position': box,
-                            'performance_rating': row.get('performance_rating'),
-                            'potential_rating': row.get('potential_rating'),
-                        })
-
-            existing_keys = existing_plan_keys(round_code, list(all_employee_ids))
-            items = []
-            totals = {
-                'employees_evaluated': len(pdi_by_employee),
-                'mandatory_pdi_employees': 0,
-                'proactive_pdi_employees': 0,
-                'general_recognition_employees': 0,
-                'dimension_recognition_employees': 0,
-                'eligible_employees': 0,
-                'already_has_plan_employees': 0,
-            }
-
-            for emp_key, item in pdi_by_employee.items():
-                has_mandatory = bool(item['pdi_required_dimensions'])
-                has_proactive = bool(item['proactive_pdi'])
-                has_dimension_recognition = bool(item['recognition_dimensions'])
-                has_general_recognition = bool(item['general_recognition'])
-                item['mandatory_pdi'] = has_mandatory
-                item['eligible_for_pdi'] = has_mandatory or has_proactive
-                item['already_has_any_plan'] = (emp_key, 'any') in existing_keys
-                if has_mandatory:
-                    totals['mandatory_pdi_employees'] += 1
-                if has_proactive:
-                    totals['proactive_pdi_employees'] += 1
-                if has_general_recognition:
-                    totals['general_recognition_employees'] += 1
-                if has_dimension_recognition:
-                    totals['dimension_recognition_employees'] += 1
-                if item['eligible_for_pdi']:
-                    totals['eligible_employees'] += 1
-                if item['already_has_any_plan']:
-                    totals['already_has_plan_employees'] += 1
-                items.append(item)
-
-            items.sort(key=lambda x: (
-                0 if x.get('eligible_for_pdi') else 1,
-                (x.get('manager_name') or '').strip().upper(),
-                (x.get('employee_name') or '').strip().upper(),
-            ))
+                    return jsonify({'error': 'INVALID_PAGINATION'}), 400
+                page_size = max(1, min(page_size, PDI_ELIGIBILITY_MAX_PAGE_SIZE))
+                rows = rows[(page - 1) * page_size:page * page_size]
+            items = [_expand_eligibility_item(row) for row in rows]
+            totals = snapshot['totals']
 
             return jsonify({
                 'source': 'supabase',
                 'module': 'pdi',
                 'round_code': round_code,
                 'year': year_param or None,
-                'generated_at': datetime.now(timezone.utc).isoformat(),
+                'generated_at': snapshot['generated_at'],
+                'snapshot_cached': cached,
+                'filtered_total': filtered_total,
+                'page': page,
+                'page_size': page_size,
                 'context': {
                     'nivel_contexto': nivel_contexto,
                     'cliente_id': cliente_id or None,
@@ -573,60 +784,121 @@ def register_pdi_routes(app, supabase, buscar_avaliacoes_brutas, get_active_roun
             if not ok_access:
                 return jsonify(err_access), status_access
 
-            q = supabase.table('pdi_plans').select('*').order('created_at', desc=True)
-            if cycle_code:
-                q = q.eq('cycle_code', cycle_code)
-            if cliente_id:
-                q = q.eq('cliente_id', cliente_id)
-            if holding_id:
-                q = q.eq('holding_id', holding_id)
-            if empresa_id:
-                q = q.eq('empresa_id', empresa_id)
-            if filial_id:
-                q = q.eq('filial_id', filial_id)
+            # Paginacao so quando pedida (page/page_size); sem ela vem a lista inteira.
+            page = None
+            page_size = None
+            if request.args.get('page') or request.args.get('page_size'):
+                try:
+                    page = max(1, int(request.args.get('page') or 1))
+                    page_size = int(request.args.get('page_size') or PDI_PLANS_DEFAULT_PAGE_SIZE)
+                except Exception:
+                    return jsonify({'error': 'INVALID_PAGINATION'}), 400
+                page_size = max(1, min(page_size, PDI_PLANS_MAX_PAGE_SIZE))
+            summary_only = str(request.args.get('summary') or '').strip().lower() in ('1', 'true', 'sim')
+            includes = _parse_plan_includes(request.args.get('include'))
 
-            plans = (q.execute()).data or []
+            def plans_query(count=None):
+                q = (
+                    supabase.table('pdi_plans')
+                    .select('*', count=count)
+                    .order('created_at', desc=True)
+                    .order('id', desc=True)
+                )
+                if cycle_code:
+                    q = q.eq('cycle_code', cycle_code)
+                if cliente_id:
+                    q = q.eq('cliente_id', cliente_id)
+                if holding_id:
+                    q = q.eq('holding_id', holding_id)
+                if empresa_id:
+                    q = q.eq('empresa_id', empresa_id)
+                if filial_id:
+                    q = q.eq('filial_id', filial_id)
+                return q
+
+            if page_size:
+                offset = (page - 1) * page_size
+                result = plans_query(count='exact').range(offset, offset + page_size - 1).execute()
+                plans = result.data or []
+                total = result.count if result.count is not None else offset + len(plans)
+            else:
+                # db-max-rows corta cada resposta em 1000: pagina ate vir pagina curta
+                offset = 0
+                plans = []
+                while True:
+                    page_rows = (
+                        plans_query()
+                        .range(len(plans), len(plans) + PDI_PLANS_FETCH_PAGE_SIZE - 1)
+                        .execute()
+                    ).data or []
+                    plans.extend(page_rows)
+                    if len(page_rows) < PDI_PLANS_FETCH_PAGE_SIZE:
+                        break
+                total = len(plans)
             plan_ids = [p.get('id') for p in plans if p.get('id') is not None]
-            dimensions_by_plan = {}
-            actions_by_plan = {}
-            trainings_by_plan = {}
-            checkins_by_plan = {}
-
-            if plan_ids:
-                for table_name, bucket in [
-                    ('pdi_plan_dimensions', dimensions_by_plan),
-                    ('pdi_actions', actions_by_plan),
-                    ('training_assignments', trainings_by_plan),
-                    ('pdi_monthly_checkins', checkins_by_plan),
-                ]:
-                    try:
-                        rows = (
+
+            # Cada (tabela, lote de ids) vira uma consulta independente; em
+            # modo resumo so a coluna pdi_plan_id trafega, para contagem.
+            children_by_plan = {name: {} for name in includes}
+            tasks = []
+            for name in includes:
+                for start in range(0, len(plan_ids), PDI_IN_CHUNK_SIZE):
+                    tasks.append((name, plan_ids[start:start + PDI_IN_CHUNK_SIZE]))
+
+            def load_child_chunk(task):
+                name, chunk = task
+                table_name = PDI_PLAN_CHILDREN[name][0]
+                rows = []
+                try:
+                    # db-max-rows corta cada resposta em 1000: pagina ate vir pagina curta
+                    while True:
+                        page_rows = (
                             supabase
                             .table(table_name)
-                            .select('*')
-                            .in_('pdi_plan_id', plan_ids)
+                            .select('pdi_plan_id' if summary_only else '*')
+                            .in_('pdi_plan_id', chunk)
+                            .order('id')
+                            .range(len(rows), len(rows) + PDI_CHILD_PAGE_SIZE - 1)
                             .execute()
                         ).data or []
+                        rows.extend(page_rows)
+                        if len(page_rows) < PDI_CHILD_PAGE_SIZE:
+                            return name, rows
+                except Exception as exc:
+                    print(f'[pdi] erro ao buscar {table_name}:', exc)
+                    return name, []
+
+            if tasks:
+                with ContextThreadPoolExecutor(max_workers=min(PDI_CHILD_LOAD_WORKERS, len(tasks))) as executor:
+                    for name, rows in executor.map(load_child_chunk, tasks):
+                        bucket = children_by_plan[name]
                         for row in rows:
                             bucket.setdefault(row.get('pdi_plan_id'), []).append(row)
-                    except Exception as exc:
-                        print(f'[pdi] erro ao buscar {table_name}:', exc)
 
             items = []
             for plan in plans:
                 pid = plan.get('id')
                 item = dict(plan)
-                item['dimensions'] = dimensions_by_plan.get(pid, [])
-                item['actions'] = actions_by_plan.get(pid, [])
-                item['training_assignments'] = trainings_by_plan.get(pid, [])
-                item['monthly_checkins'] = checkins_by_plan.get(pid, [])
+                if summary_only:
+                    item['counts'] = {
+                        name: len(children_by_plan[name].get(pid, []))
+                        for name in includes
+                    }
+                else:
+                    for name in includes:
+                        item[PDI_PLAN_CHILDREN[name][1]] = children_by_plan[name].get(pid, [])
                 items.append(item)
 
             return jsonify({
                 'source': 'supabase',
                 'module': 'pdi',
                 'cycle_code': cycle_code or None,
-                'total': len(items),
+                'total': total,
+                'page': page,
+                'page_size': page_size,
+                'has_more': offset + len(plans) < total,
+                'include': includes,
+                'summary': summary_only,
                 'items': items,
             }), 200
         except Exception as exc:
@@ -760,6 +1032,9 @@ def register_pdi_routes(app, supabase, buscar_avaliacoes_brutas, get_active_roun
                 except Exception as exc:
                     errors.append({'employee_id': employee_id, 'error': 'plan_creation_failed', 'detail': str(exc)})
 
+            if created:
+                invalidate_pdi_eligibility(cycle_code)
+
             return jsonify({
                 'created_count': len(created),
                 'skipped_count': len(skipped),
@@ -910,6 +1185,7 @@ def register_pdi_routes(app, supabase, buscar_avaliacoes_brutas, get_active_roun
                 plan_id = plan.get('id')
                 if not plan_id:
                     return jsonify({'error': 'PDI_PLAN_CREATION_FAILED'}), 500
+                invalidate_pdi_eligibility(cycle_code)
 
                 weekly_actions = []
                 for week in leadertrack_payload.get('plano_12_semanas') or []:
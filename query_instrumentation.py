@@ -0,0 +1,202 @@
+import contextvars
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import psycopg2.extensions
+from flask import g, request
+
+
+# Instrumentacao de consultas por request: cada chamada PostgREST (tabela ou
+# RPC) e cada execute do psycopg2 e contada e cronometrada sob uma tag. O
+# coletor vive num ContextVar para que os workers dos ThreadPoolExecutor
+# (via ContextThreadPoolExecutor) somem no mesmo request.
+QUERY_BUDGET_PER_REQUEST = int(os.getenv('QUERY_BUDGET_PER_REQUEST', '30'))
+QUERY_TIMING_LOG = os.getenv('QUERY_TIMING_LOG', 'all').strip().lower()  # all | budget | off
+QUERY_TIMING_HEADER_TAGS = 8
+
+_current_collector = contextvars.ContextVar('query_collector', default=None)
+_SQL_TABLE_RE = re.compile(r'\bfrom\s+([a-zA-Z_][\w.]*)', re.IGNORECASE)
+_TIMING_TOKEN_RE = re.compile(r'[^A-Za-z0-9_-]+')
+
+
+class QueryCollector:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.count = 0
+        self.total_ms = 0.0
+        self.by_tag = {}
+        self._lock = threading.Lock()
+
+    def record(self, tag, elapsed_ms, failed=False):
+        with self._lock:
+            self.count += 1
+            self.total_ms += elapsed_ms
+            entry = self.by_tag.setdefault(tag, {'count': 0, 'ms': 0.0, 'errors': 0})
+            entry['count'] += 1
+            entry['ms'] += elapsed_ms
+            if failed:
+                entry['errors'] += 1
+
+    def top_tags(self, limit=None):
+        with self._lock:
+            items = sorted(self.by_tag.items(), key=lambda item: (-item[1]['count'], -item[1]['ms']))
+        return items[:limit] if limit else items
+
+
+def _record(tag, started, failed):
+    collector = _current_collector.get()
+    if collector is not None:
+        collector.record(tag, (time.perf_counter() - started) * 1000, failed)
+
+
+class ContextThreadPoolExecutor(ThreadPoolExecutor):
+    """ThreadPoolExecutor que propaga o contexto (coletor do request) para os workers."""
+
+    def submit(self, fn, *args, **kwargs):
+        return super().submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+def _postgrest_tag(method, url):
+    path = str(url).split('?', 1)[0].rstrip('/')
+    if '/rpc/' in path:
+        return 'rpc:' + path.rsplit('/rpc/', 1)[1]
+    return f"{str(method).upper()}:{path.rsplit('/', 1)[-1]}"
+
+
+def instrument_supabase(client):
+    """Envolve a sessao HTTP do PostgREST do cliente supabase (tabelas e RPCs)."""
+    session = client.postgrest.session
+    if getattr(session, '_query_instrumented', False):
+        return client
+    original_request = session.request
+
+    def timed_request(method, url, *args, **kwargs):
+        started = time.perf_counter()
+        failed = True
+        try:
+            response = original_request(method, url, *args, **kwargs)
+            failed = response.status_code >= 400
+            return response
+        finally:
+            _record(_postgrest_tag(method, url), started, failed)
+
+    session.request = timed_request
+    session._query_instrumented = True
+    return client
+
+
+_TIMED_CURSOR_CLASSES = {}
+
+
+def _timed_cursor_class(base):
+    cls = _TIMED_CURSOR_CLASSES.get(base)
+    if cls is not None:
+        return cls
+
+    def execute(self, query, vars=None):
+        started = time.perf_counter()
+        failed = True
+        try:
+            result = base.execute(self, query, vars)
+            failed = False
+            return result
+        finally:
+            match = _SQL_TABLE_RE.search(query if isinstance(query, str) else str(query))
+            _record('sql:' + (match.group(1) if match else 'query'), started, failed)
+
+    def callproc(self, procname, parameters=None):
+        started = time.perf_counter()
+        failed = True
+        try:
+            result = base.callproc(self, procname, parameters)
+            failed = False
+            return result
+        finally:
+            _record('sql:' + procname, started, failed)
+
+    cls = type('Timed' + base.__name__, (base,), {'execute': execute, 'callproc': callproc})
+    _TIMED_CURSOR_CLASSES[base] = cls
+    return cls
+
+
+class InstrumentedConnection(psycopg2.extensions.connection):
+    """connection_factory do psycopg2: cursores (inclusive RealDictCursor) cronometrados."""
+
+    def cursor(self, *args, **kwargs):
+        base = kwargs.pop('cursor_factory', None) or self.cursor_factory or psycopg2.extensions.cursor
+        kwargs['cursor_factory'] = _timed_cursor_class(base)
+        return super().cursor(*args, **kwargs)
+
+
+def _timing_token(tag):
+    return _TIMING_TOKEN_RE.sub('-', tag).strip('-') or 'query'
+
+
+def install_query_instrumentation(app, supabase):
+    """
+    Chamar antes de install_response_layer: o after_request daqui roda por
+    ultimo e inclui no Server-Timing o tempo de serializacao e compressao.
+    """
+    instrument_supabase(supabase)
+
+    @app.before_request
+    def start_query_collector():
+        g.query_collector = QueryCollector()
+        g.query_collector_token = _current_collector.set(g.query_collector)
+
+    @app.after_request
+    def emit_query_timing(resp):
+        collector = getattr(g, 'query_collector', None)
+        if collector is None:
+            return resp
+        try:
+            total_ms = (time.perf_counter() - collector.started) * 1000
+            over_budget = collector.count > QUERY_BUDGET_PER_REQUEST
+
+            metrics = [
+                f'db;dur={collector.total_ms:.1f};desc="{collector.count} queries"',
+                f'app;dur={total_ms:.1f}',
+            ]
+            if getattr(g, 'json_serialize_ms', None) is not None:
+                metrics.append(f'json;dur={g.json_serialize_ms:.1f}')
+            if getattr(g, 'compress_ms', None) is not None:
+                metrics.append(f'compress;dur={g.compress_ms:.1f}')
+            for tag, entry in collector.top_tags(QUERY_TIMING_HEADER_TAGS):
+                metrics.append(f'{_timing_token(tag)};dur={entry["ms"]:.1f};desc="{entry["count"]}x"')
+            resp.headers['Server-Timing'] = ', '.join(metrics)
+            if over_budget:
+                resp.headers['X-Query-Budget-Exceeded'] = f'{collector.count}/{QUERY_BUDGET_PER_REQUEST}'
+
+            if request.method != 'OPTIONS' and (
+                QUERY_TIMING_LOG == 'all' or (QUERY_TIMING_LOG == 'budget' and over_budget)
+            ):
+                print('[query-timing]', json.dumps({
+                    'method': request.method,
+                    'endpoint': request.endpoint,
+                    'path': request.path,
+                    'status': resp.status_code,
+                    'queries': collector.count,
+                    'db_ms': round(collector.total_ms, 1),
+                    'total_ms': round(total_ms, 1),
+                    'over_budget': over_budget,
+                    'tags': {
+                        tag: {'count': entry['count'], 'ms': round(entry['ms'], 1), 'errors': entry['errors']}
+                        for tag, entry in collector.top_tags()
+                    },
+                }, ensure_ascii=False))
+        except Exception as e:
+            print('[query-timing] erro:', e)
+        return resp
+
+    @app.teardown_request
+    def reset_query_collector(exc):
+        token = g.pop('query_collector_token', None)
+        if token is not None:
+            try:
+                _current_collector.reset(token)
+            except ValueError:
+                _current_collector.set(None)
@@ -0,0 +1,179 @@
+import gzip
+import os
+import threading
+import time
+
+from flask import g, jsonify, request
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+# Camada de resposta: serializacao JSON rapida (orjson quando instalado) e
+# compressao gzip/brotli negociada pelo Accept-Encoding acima de um tamanho
+# minimo. Sem orjson/brotli o comportamento cai no json padrao / so gzip.
+RESPONSE_COMPRESS_MIN_BYTES = int(os.getenv('RESPONSE_COMPRESS_MIN_BYTES', '1024'))
+RESPONSE_GZIP_LEVEL = int(os.getenv('RESPONSE_GZIP_LEVEL', '6'))
+RESPONSE_BROTLI_QUALITY = int(os.getenv('RESPONSE_BROTLI_QUALITY', '5'))
+RESPONSE_COMPRESSIBLE_MIMETYPES = {
+    'application/json',
+    'text/html',
+    'text/csv',
+    'text/plain',
+    'application/javascript',
+}
+
+_RESPONSE_METRICS = {
+    'json_responses': 0,
+    'json_serialize_ms': 0.0,
+    'json_bytes': 0,
+    'orjson_fallbacks': 0,
+    'compressed_responses': 0,
+    'bytes_before_compression': 0,
+    'bytes_after_compression': 0,
+    'compress_ms': 0.0,
+    'by_encoding': {},
+}
+_RESPONSE_METRICS_LOCK = threading.Lock()
+
+
+def _record(**values):
+    with _RESPONSE_METRICS_LOCK:
+        for key, value in values.items():
+            if key == 'encoding':
+                by_encoding = _RESPONSE_METRICS['by_encoding']
+                by_encoding[value] = by_encoding.get(value, 0) + 1
+            else:
+                _RESPONSE_METRICS[key] += value
+
+
+def response_metrics():
+    with _RESPONSE_METRICS_LOCK:
+        snapshot = dict(_RESPONSE_METRICS, by_encoding=dict(_RESPONSE_METRICS['by_encoding']))
+    before = snapshot['bytes_before_compression']
+    snapshot['bytes_saved'] = before - snapshot['bytes_after_compression']
+    snapshot['compression_ratio'] = round(snapshot['bytes_after_compression'] / before, 4) if before else None
+    snapshot['json_encoder'] = 'orjson' if orjson else 'json'
+    snapshot['brotli_available'] = brotli is not None
+    return snapshot
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    jsonify/app.json com orjson. Datas e Decimal passam pelo mesmo default do
+    Flask (http_date / str), entao a saida dos RealDictRow do merito nao muda.
+    Qualquer tipo que o orjson recuse cai no json padrao.
+    """
+
+    def _orjson_options(self, indent=False):
+        option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return option
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs:
+            return super().dumps(obj, **kwargs)
+        try:
+            return orjson.dumps(obj, default=self.default, option=self._orjson_options()).decode('utf-8')
+        except (orjson.JSONEncodeError, TypeError):
+            _record(orjson_fallbacks=1)
+            return super().dumps(obj)
+
+    def response(self, *args, **kwargs):
+        started = time.perf_counter()
+        if orjson is None:
+            resp = super().response(*args, **kwargs)
+        else:
+            obj = self._prepare_response_obj(args, kwargs)
+            indent = (self.compact is None and self._app.debug) or self.compact is False
+            try:
+                body = orjson.dumps(obj, default=self.default, option=self._orjson_options(indent)) + b'\n'
+                resp = self._app.response_class(body, mimetype=self.mimetype)
+            except (orjson.JSONEncodeError, TypeError):
+                _record(orjson_fallbacks=1)
+                resp = super().response(*args, **kwargs)
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        try:
+            g.json_serialize_ms = getattr(g, 'json_serialize_ms', 0.0) + elapsed_ms
+        except RuntimeError:
+            pass
+        _record(json_responses=1, json_serialize_ms=elapsed_ms, json_bytes=resp.content_length or 0)
+        return resp
+
+
+def _negotiate_encoding():
+    accepted = request.accept_encodings
+    if brotli is not None and accepted.quality('br') > 0:
+        return 'br'
+    if accepted.quality('gzip') > 0:
+        return 'gzip'
+    return None
+
+
+def compress_response(resp):
+    if (
+        resp.direct_passthrough
+        or resp.is_streamed
+        or resp.status_code < 200
+        or resp.status_code in (204, 206, 304)
+        or 'Content-Encoding' in resp.headers
+        or resp.mimetype not in RESPONSE_COMPRESSIBLE_MIMETYPES
+    ):
+        return resp
+
+    data = resp.get_data()
+    if len(data) < RESPONSE_COMPRESS_MIN_BYTES:
+        return resp
+
+    resp.vary.add('Accept-Encoding')
+    encoding = _negotiate_encoding()
+    if not encoding:
+        return resp
+
+    started = time.perf_counter()
+    if encoding == 'br':
+        body = brotli.compress(data, quality=RESPONSE_BROTLI_QUALITY)
+    else:
+        body = gzip.compress(data, compresslevel=RESPONSE_GZIP_LEVEL)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+
+    resp.set_data(body)
+    resp.headers['Content-Encoding'] = encoding
+    g.compress_ms = elapsed_ms
+    _record(
+        compressed_responses=1,
+        bytes_before_compression=len(data),
+        bytes_after_compression=len(body),
+        compress_ms=elapsed_ms,
+        encoding=encoding,
+    )
+    return resp
+
+
+def install_response_layer(app, require_rh_code):
+    """
+    Deve ser registrado antes dos demais hooks do app: after_request roda em
+    ordem inversa de registro, entao a compressao fica por ultimo (depois do
+    CORS manual, que reescreve o Vary).
+    """
+    app.json = FastJSONProvider(app)
+    app.after_request(compress_response)
+
+    @app.route('/api/internal/response-metrics', methods=['GET'])
+    def api_internal_response_metrics():
+        ok, err, status = require_rh_code(request.args)
+        if not ok:
+            return jsonify(err), status
+        return jsonify(response_metrics()), 200